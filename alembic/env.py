@@ -1,9 +1,13 @@
+import asyncio
 from logging.config import fileConfig
 
-from sqlalchemy import engine_from_config, pool
+from sqlalchemy import pool
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import async_engine_from_config
 
 from alembic import context
 
+from app.core.config import DATABASE_URL
 from app.models import Base
 
 config = context.config
@@ -11,8 +15,30 @@ config = context.config
 if config.config_file_name is not None:
     fileConfig(config.config_file_name)
 
+# Migrate the database the app uses (DATABASE_URL: sqlite+aiosqlite or
+# postgresql+asyncpg), through the same async driver
+config.set_main_option("sqlalchemy.url", DATABASE_URL)
+
 target_metadata = Base.metadata
 
+# Objects the migrations create by hand rather than from the models: the
+# SQLite FTS5 and R*Tree virtual tables (with their shadow tables) and the
+# PostgreSQL geography column and GiST/trigram indexes. Autogenerate must
+# not offer to drop them.
+UNMODELED_TABLES = ("pins_fts", "pins_rtree")
+UNMODELED_COLUMNS = {("pins", "geog")}
+UNMODELED_INDEXES = {"ix_pins_geog", "ix_pins_name_trgm", "ix_pins_category_trgm"}
+
+
+def include_object(obj, name, type_, reflected, compare_to) -> bool:
+    if type_ == "table":
+        return not name.startswith(UNMODELED_TABLES)
+    if type_ == "column":
+        return (obj.table.name, name) not in UNMODELED_COLUMNS
+    if type_ == "index":
+        return name not in UNMODELED_INDEXES
+    return True
+
 
 def run_migrations_offline() -> None:
     url = config.get_main_option("sqlalchemy.url")
@@ -21,24 +47,34 @@ def run_migrations_offline() -> None:
         target_metadata=target_metadata,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
+        include_object=include_object,
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def do_run_migrations(connection: Connection) -> None:
+    context.configure(
+        connection=connection,
+        target_metadata=target_metadata,
+        include_object=include_object,
     )
     with context.begin_transaction():
         context.run_migrations()
 
 
-def run_migrations_online() -> None:
-    connectable = engine_from_config(
+async def run_migrations_online() -> None:
+    connectable = async_engine_from_config(
         config.get_section(config.config_ini_section, {}),
         prefix="sqlalchemy.",
         poolclass=pool.NullPool,
     )
-    with connectable.connect() as connection:
-        context.configure(connection=connection, target_metadata=target_metadata)
-        with context.begin_transaction():
-            context.run_migrations()
+    async with connectable.connect() as connection:
+        await connection.run_sync(do_run_migrations)
+    await connectable.dispose()
 
 
 if context.is_offline_mode():
     run_migrations_offline()
 else:
-    run_migrations_online()
+    asyncio.run(run_migrations_online())
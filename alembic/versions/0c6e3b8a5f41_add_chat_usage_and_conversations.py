@@ -0,0 +1,46 @@
+"""Add LLM usage columns and a conversation id to chat_messages
+
+Revision ID: 0c6e3b8a5f41
+Revises: b9e0f4c2a715
+Create Date: 2026-10-19 19:12:07.518203
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0c6e3b8a5f41'
+down_revision: Union[str, Sequence[str], None] = 'b9e0f4c2a715'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Existing messages belong to conversation 0, the one before any clear
+    op.add_column('chat_messages', sa.Column('conversation_id', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('chat_messages', sa.Column('input_tokens', sa.Integer(), nullable=True))
+    op.add_column('chat_messages', sa.Column('output_tokens', sa.Integer(), nullable=True))
+    op.add_column('chat_messages', sa.Column('cached_tokens', sa.Integer(), nullable=True))
+    op.add_column('chat_messages', sa.Column('latency_ms', sa.Integer(), nullable=True))
+    # History is now read per conversation
+    op.drop_index('ix_chat_messages_created_at_id', table_name='chat_messages')
+    op.create_index(
+        'ix_chat_messages_conversation_created_at_id', 'chat_messages',
+        ['conversation_id', 'created_at', 'id'], unique=False,
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_chat_messages_conversation_created_at_id', table_name='chat_messages')
+    op.create_index('ix_chat_messages_created_at_id', 'chat_messages', ['created_at', 'id'], unique=False)
+    op.drop_column('chat_messages', 'latency_ms')
+    op.drop_column('chat_messages', 'cached_tokens')
+    op.drop_column('chat_messages', 'output_tokens')
+    op.drop_column('chat_messages', 'input_tokens')
+    op.drop_column('chat_messages', 'conversation_id')
+    op.execute("DELETE FROM data_versions WHERE name = 'conversation'")
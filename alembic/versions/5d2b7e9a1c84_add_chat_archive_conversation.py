@@ -0,0 +1,33 @@
+"""Record the conversation of each chat_archives batch
+
+Revision ID: 5d2b7e9a1c84
+Revises: 0c6e3b8a5f41
+Create Date: 2026-10-19 21:04:33.190562
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5d2b7e9a1c84'
+down_revision: Union[str, Sequence[str], None] = '0c6e3b8a5f41'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('chat_archives', sa.Column('conversation_id', sa.Integer(), server_default='0', nullable=False))
+    # Clearing used to delete the archive, so every batch left is from the current conversation
+    op.execute(
+        "UPDATE chat_archives SET conversation_id = COALESCE("
+        "(SELECT version FROM data_versions WHERE name = 'conversation'), 0)"
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('chat_archives', 'conversation_id')
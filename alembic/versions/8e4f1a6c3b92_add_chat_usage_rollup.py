@@ -0,0 +1,42 @@
+"""Add chat_usage, the LLM accounting of archived chat messages
+
+Revision ID: 8e4f1a6c3b92
+Revises: 5d2b7e9a1c84
+Create Date: 2026-10-19 21:47:18.604217
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8e4f1a6c3b92'
+down_revision: Union[str, Sequence[str], None] = '5d2b7e9a1c84'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'chat_usage',
+        sa.Column('conversation_id', sa.Integer(), nullable=False),
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column('messages', sa.Integer(), nullable=False),
+        sa.Column('llm_calls', sa.Integer(), nullable=False),
+        sa.Column('input_tokens', sa.Integer(), nullable=False),
+        sa.Column('output_tokens', sa.Integer(), nullable=False),
+        sa.Column('cached_tokens', sa.Integer(), nullable=False),
+        sa.Column('latency_ms', sa.Integer(), nullable=False),
+        sa.Column('max_latency_ms', sa.Integer(), nullable=True),
+        sa.Column('first_at', sa.DateTime(), nullable=False),
+        sa.Column('last_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('conversation_id', 'day'),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('chat_usage')
@@ -0,0 +1,55 @@
+"""Add full-text search index over pins
+
+Revision ID: b52e8d1c6a93
+Revises: 3f1a9c2b7d40
+Create Date: 2026-10-19 11:40:27.905316
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b52e8d1c6a93'
+down_revision: Union[str, Sequence[str], None] = '3f1a9c2b7d40'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_pins_name_lower', 'pins', [sa.text('lower(name)')], unique=False)
+    if op.get_context().dialect.name != "sqlite":
+        return  # FTS5 is SQLite's; PostgreSQL gets pg_trgm indexes in b9e0f4c2a715
+    op.execute(
+        "CREATE VIRTUAL TABLE pins_fts USING fts5("
+        "name, category, content='pins', content_rowid='id', tokenize='trigram')"
+    )
+    op.execute(
+        "CREATE TRIGGER pins_fts_ai AFTER INSERT ON pins BEGIN "
+        "INSERT INTO pins_fts(rowid, name, category) VALUES (new.id, new.name, new.category); END"
+    )
+    op.execute(
+        "CREATE TRIGGER pins_fts_ad AFTER DELETE ON pins BEGIN "
+        "INSERT INTO pins_fts(pins_fts, rowid, name, category) VALUES ('delete', old.id, old.name, old.category); END"
+    )
+    op.execute(
+        "CREATE TRIGGER pins_fts_au AFTER UPDATE OF name, category ON pins BEGIN "
+        "INSERT INTO pins_fts(pins_fts, rowid, name, category) VALUES ('delete', old.id, old.name, old.category); "
+        "INSERT INTO pins_fts(rowid, name, category) VALUES (new.id, new.name, new.category); END"
+    )
+    # Index the pins that already exist
+    op.execute("INSERT INTO pins_fts(pins_fts) VALUES ('rebuild')")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_pins_name_lower', table_name='pins')
+    if op.get_context().dialect.name != "sqlite":
+        return
+    op.execute("DROP TRIGGER pins_fts_au")
+    op.execute("DROP TRIGGER pins_fts_ad")
+    op.execute("DROP TRIGGER pins_fts_ai")
+    op.execute("DROP TABLE pins_fts")
@@ -0,0 +1,70 @@
+"""Add PostgreSQL search, spatial and pin version objects
+
+Revision ID: b9e0f4c2a715
+Revises: f2d94a7c3e18
+Create Date: 2026-10-19 18:31:07.264019
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b9e0f4c2a715'
+down_revision: Union[str, Sequence[str], None] = 'f2d94a7c3e18'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# The PostgreSQL counterparts of the SQLite FTS5 table, R*Tree and version
+# triggers; SQLite already has those, so on SQLite this does nothing.
+
+BUMP_FUNCTION = (
+    "CREATE OR REPLACE FUNCTION bump_pins_version() RETURNS trigger LANGUAGE plpgsql AS $$ BEGIN "
+    "INSERT INTO data_versions (name, version) "
+    "VALUES ('pins', (extract(epoch FROM clock_timestamp()) * 1000)::bigint) "
+    "ON CONFLICT (name) DO UPDATE SET version = data_versions.version + 1; "
+    "RETURN NULL; END $$"
+)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if op.get_context().dialect.name != "postgresql":
+        return
+    op.execute("CREATE EXTENSION IF NOT EXISTS postgis")
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    # Versions start at epoch milliseconds
+    op.alter_column('data_versions', 'version', type_=sa.BigInteger(), existing_nullable=False)
+    op.execute(
+        "ALTER TABLE pins ADD COLUMN geog geography(Point, 4326) "
+        "GENERATED ALWAYS AS (ST_SetSRID(ST_MakePoint(lng, lat), 4326)::geography) STORED"
+    )
+    op.execute("CREATE INDEX ix_pins_geog ON pins USING gist (geog)")
+    op.execute("CREATE INDEX ix_pins_name_trgm ON pins USING gin (name gin_trgm_ops)")
+    op.execute("CREATE INDEX ix_pins_category_trgm ON pins USING gin (category gin_trgm_ops)")
+    op.execute(BUMP_FUNCTION)
+    for suffix, event, when in (
+        ("ai", "INSERT", ""),
+        ("ad", "DELETE", " WHEN (OLD.deleted_at IS NULL)"),
+        ("au", "UPDATE", ""),
+    ):
+        op.execute(
+            f"CREATE TRIGGER pins_version_{suffix} AFTER {event} ON pins FOR EACH ROW{when} "
+            "EXECUTE FUNCTION bump_pins_version()"
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_context().dialect.name != "postgresql":
+        return
+    for suffix in ("au", "ad", "ai"):
+        op.execute(f"DROP TRIGGER pins_version_{suffix} ON pins")
+    op.execute("DROP FUNCTION bump_pins_version()")
+    op.drop_index('ix_pins_category_trgm', table_name='pins')
+    op.drop_index('ix_pins_name_trgm', table_name='pins')
+    op.drop_index('ix_pins_geog', table_name='pins')
+    op.drop_column('pins', 'geog')
+    op.alter_column('data_versions', 'version', type_=sa.Integer(), existing_nullable=False)
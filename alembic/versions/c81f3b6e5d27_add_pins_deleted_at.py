@@ -0,0 +1,55 @@
+"""Add pins.deleted_at for soft deletion, with partial indexes
+
+Revision ID: c81f3b6e5d27
+Revises: a4c7e2d9b130
+Create Date: 2026-10-19 16:10:12.804115
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c81f3b6e5d27'
+down_revision: Union[str, Sequence[str], None] = 'a4c7e2d9b130'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BUMP = (
+    "INSERT INTO data_versions (name, version) "
+    "VALUES ('pins', CAST((julianday('now') - 2440587.5) * 86400000 AS INTEGER)) "
+    "ON CONFLICT (name) DO UPDATE SET version = version + 1"
+)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('pins', sa.Column('deleted_at', sa.DateTime(), nullable=True))
+    op.drop_index('ix_pins_name_lower', table_name='pins')
+    op.create_index(
+        'ix_pins_name_lower', 'pins', [sa.text('lower(name)')], unique=False,
+        sqlite_where=sa.text('deleted_at IS NULL'), postgresql_where=sa.text('deleted_at IS NULL'),
+    )
+    op.create_index(
+        'ix_pins_deleted_at', 'pins', ['deleted_at'], unique=False,
+        sqlite_where=sa.text('deleted_at IS NOT NULL'), postgresql_where=sa.text('deleted_at IS NOT NULL'),
+    )
+    if op.get_context().dialect.name != "sqlite":
+        return
+    # Purging an already deleted pin changes nothing visible
+    op.execute("DROP TRIGGER pins_version_ad")
+    op.execute(f"CREATE TRIGGER pins_version_ad AFTER DELETE ON pins WHEN old.deleted_at IS NULL BEGIN {BUMP}; END")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DELETE FROM pins WHERE deleted_at IS NOT NULL")
+    if op.get_context().dialect.name == "sqlite":
+        op.execute("DROP TRIGGER pins_version_ad")
+        op.execute(f"CREATE TRIGGER pins_version_ad AFTER DELETE ON pins BEGIN {BUMP}; END")
+    op.drop_index('ix_pins_deleted_at', table_name='pins')
+    op.drop_index('ix_pins_name_lower', table_name='pins')
+    op.create_index('ix_pins_name_lower', 'pins', [sa.text('lower(name)')], unique=False)
+    op.drop_column('pins', 'deleted_at')
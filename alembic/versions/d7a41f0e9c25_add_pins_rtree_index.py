@@ -0,0 +1,49 @@
+"""Add spatial index over pins
+
+Revision ID: d7a41f0e9c25
+Revises: b52e8d1c6a93
+Create Date: 2026-10-19 13:05:51.227804
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd7a41f0e9c25'
+down_revision: Union[str, Sequence[str], None] = 'b52e8d1c6a93'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if op.get_context().dialect.name != "sqlite":
+        return  # PostgreSQL gets a PostGIS geography index in b9e0f4c2a715
+    op.execute("CREATE VIRTUAL TABLE pins_rtree USING rtree(id, min_lat, max_lat, min_lng, max_lng)")
+    op.execute(
+        "CREATE TRIGGER pins_rtree_ai AFTER INSERT ON pins BEGIN "
+        "INSERT INTO pins_rtree VALUES (new.id, new.lat, new.lat, new.lng, new.lng); END"
+    )
+    op.execute(
+        "CREATE TRIGGER pins_rtree_ad AFTER DELETE ON pins BEGIN "
+        "DELETE FROM pins_rtree WHERE id = old.id; END"
+    )
+    op.execute(
+        "CREATE TRIGGER pins_rtree_au AFTER UPDATE OF lat, lng ON pins BEGIN "
+        "UPDATE pins_rtree SET min_lat = new.lat, max_lat = new.lat, min_lng = new.lng, max_lng = new.lng "
+        "WHERE id = new.id; END"
+    )
+    # Index the pins that already exist
+    op.execute("INSERT INTO pins_rtree SELECT id, lat, lat, lng, lng FROM pins")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_context().dialect.name != "sqlite":
+        return
+    op.execute("DROP TRIGGER pins_rtree_au")
+    op.execute("DROP TRIGGER pins_rtree_ad")
+    op.execute("DROP TRIGGER pins_rtree_ai")
+    op.execute("DROP TABLE pins_rtree")
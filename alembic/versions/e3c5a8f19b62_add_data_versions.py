@@ -0,0 +1,45 @@
+"""Add data_versions table and pin version triggers
+
+Revision ID: e3c5a8f19b62
+Revises: d7a41f0e9c25
+Create Date: 2026-10-19 15:22:40.518307
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e3c5a8f19b62'
+down_revision: Union[str, Sequence[str], None] = 'd7a41f0e9c25'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BUMP = (
+    "INSERT INTO data_versions (name, version) "
+    "VALUES ('pins', CAST((julianday('now') - 2440587.5) * 86400000 AS INTEGER)) "
+    "ON CONFLICT (name) DO UPDATE SET version = version + 1"
+)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('data_versions',
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+    if op.get_context().dialect.name != "sqlite":
+        return  # PostgreSQL triggers are created in b9e0f4c2a715
+    for suffix, event in (("ai", "INSERT"), ("ad", "DELETE"), ("au", "UPDATE")):
+        op.execute(f"CREATE TRIGGER pins_version_{suffix} AFTER {event} ON pins BEGIN {BUMP}; END")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_context().dialect.name == "sqlite":
+        for suffix in ("au", "ad", "ai"):
+            op.execute(f"DROP TRIGGER pins_version_{suffix}")
+    op.drop_table('data_versions')
@@ -0,0 +1,35 @@
+"""Index chat_messages on (created_at, id) and backfill microsecond timestamps
+
+Revision ID: f2d94a7c3e18
+Revises: c81f3b6e5d27
+Create Date: 2026-10-19 17:04:55.391642
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f2d94a7c3e18'
+down_revision: Union[str, Sequence[str], None] = 'c81f3b6e5d27'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Rows from the CURRENT_TIMESTAMP default have whole seconds; give them the
+    # same fixed-width microsecond form the app now writes, so every value
+    # compares and sorts alike as text (PostgreSQL timestamps aren't text)
+    if op.get_context().dialect.name == "sqlite":
+        op.execute(
+            "UPDATE chat_messages SET created_at = created_at || '.000000' "
+            "WHERE length(created_at) = 19"
+        )
+    op.create_index('ix_chat_messages_created_at_id', 'chat_messages', ['created_at', 'id'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_chat_messages_created_at_id', table_name='chat_messages')
@@ -15,3 +15,62 @@ LLM_MODEL: str = os.getenv("LLM_MODEL", "gpt-4o-mini")
 LLM_TEMPERATURE: float = float(os.getenv("LLM_TEMPERATURE", "0.3"))
 LLM_BASE_URL: str = os.getenv("LLM_BASE_URL", "")
 LLM_API_KEY: str = os.getenv("LLM_API_KEY", "")
+
+# Pin categories, as the assistant classifies places and the confirm form offers them
+PIN_CATEGORIES = [
+    "school", "health_clinic", "bakery", "supermarket", "pharmacy",
+    "restaurant", "cafe", "bank", "park", "other",
+]
+
+# Background jobs
+JOB_WORKERS: int = int(os.getenv("JOB_WORKERS", "2"))
+JOB_MAX_ATTEMPTS: int = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+# Lease in seconds on a "running" job, renewed by its worker while the handler runs;
+# a job unrenewed this long counts as interrupted and is retried.
+# 0 retries them only at startup (one process); set it with several workers.
+JOB_RECOVER_AFTER: float = float(os.getenv("JOB_RECOVER_AFTER", "0"))
+
+# Server push (/events)
+EVENTS_HEARTBEAT: float = float(os.getenv("EVENTS_HEARTBEAT", "15"))
+# Seconds between checks for pins and messages written by other worker processes; 0 disables
+VERSION_POLL_INTERVAL: float = float(os.getenv("VERSION_POLL_INTERVAL", "0"))
+
+# Observability
+SERVER_TIMING: bool = os.getenv("SERVER_TIMING", "").lower() in ("1", "true", "yes")
+
+# Geocoding
+GEOCODER: str = os.getenv("GEOCODER", "")  # backends to try in order, e.g. "gazetteer,google"
+GAZETTEER_FILE: str = os.getenv("GAZETTEER_FILE", "")
+GEOCODE_QPS: float = float(os.getenv("GEOCODE_QPS", "10"))
+GEOCODE_BURST: int = int(os.getenv("GEOCODE_BURST", "10"))
+GEOCODE_MAX_RETRIES: int = int(os.getenv("GEOCODE_MAX_RETRIES", "4"))
+GEOCODE_BACKOFF: float = float(os.getenv("GEOCODE_BACKOFF", "0.5"))
+GEOCODE_CACHE_SIZE: int = int(os.getenv("GEOCODE_CACHE_SIZE", "10000"))
+GEOCODE_CACHE_TTL: float = float(os.getenv("GEOCODE_CACHE_TTL", "86400"))
+GEOCODE_CACHE_MISS_TTL: float = float(os.getenv("GEOCODE_CACHE_MISS_TTL", "300"))
+GEOCODE_BATCH_CONCURRENCY: int = int(os.getenv("GEOCODE_BATCH_CONCURRENCY", "8"))
+
+# Offline places index for map clicks (CSV: name, category, lat, lng)
+POI_FILE: str = os.getenv("POI_FILE", "")
+POI_MATCH_RADIUS: float = float(os.getenv("POI_MATCH_RADIUS", "25"))  # meters; closer matches skip the LLM
+POI_CONTEXT_RADIUS: float = float(os.getenv("POI_CONTEXT_RADIUS", "250"))  # meters; nearby places sent to the LLM
+
+# Map clustering
+CLUSTER_THRESHOLD: int = int(os.getenv("CLUSTER_THRESHOLD", "1000"))  # more pins than this load as cluster tiles
+CLUSTER_TILE_CACHE_SIZE: int = int(os.getenv("CLUSTER_TILE_CACHE_SIZE", "4096"))
+TILE_CACHE_DIR: str = os.getenv("TILE_CACHE_DIR", ".cache/tiles")  # rendered vector tiles; empty disables
+
+# Templates
+TEMPLATE_CACHE_DIR: str = os.getenv("TEMPLATE_CACHE_DIR", ".cache/templates")  # compiled templates; empty disables
+FRAGMENT_CACHE_SIZE: int = int(os.getenv("FRAGMENT_CACHE_SIZE", "10000"))  # rendered chat messages kept in memory
+CHAT_PAGE_SIZE: int = int(os.getenv("CHAT_PAGE_SIZE", "50"))  # latest messages rendered; older ones load on scroll
+
+# Chat archive
+CHAT_ARCHIVE_AFTER_DAYS: float = float(os.getenv("CHAT_ARCHIVE_AFTER_DAYS", "30"))  # older messages are archived; 0 disables
+CHAT_ARCHIVE_BATCH: int = int(os.getenv("CHAT_ARCHIVE_BATCH", "500"))  # messages per archive row (one transaction)
+CHAT_ARCHIVE_INTERVAL: float = float(os.getenv("CHAT_ARCHIVE_INTERVAL", "600"))  # seconds between archiving rounds
+
+# Deleted pins
+PIN_PURGE_AFTER: float = float(os.getenv("PIN_PURGE_AFTER", "600"))  # seconds a deleted pin can be restored before it is purged
+PIN_PURGE_BATCH: int = int(os.getenv("PIN_PURGE_BATCH", "1000"))  # pins hard-deleted per transaction
+PIN_PURGE_INTERVAL: float = float(os.getenv("PIN_PURGE_INTERVAL", "60"))  # seconds between purge rounds
@@ -1,11 +1,85 @@
 from __future__ import annotations
 
+from collections import OrderedDict
+from collections.abc import Callable, Iterable
 from pathlib import Path
 
 from fastapi.templating import Jinja2Templates
+from jinja2 import FileSystemBytecodeCache
 from markupsafe import Markup, escape
 
+from app.core import config
+
 _dir = Path(__file__).resolve().parent.parent / "templates"
 
 templates = Jinja2Templates(directory=_dir)
 templates.env.filters["nl2br"] = lambda v: Markup(escape(v).replace("\n", Markup("<br>\n")))
+
+# Compiled templates are stored on disk, so a fresh process skips parsing them
+if config.TEMPLATE_CACHE_DIR:
+    Path(config.TEMPLATE_CACHE_DIR).mkdir(parents=True, exist_ok=True)
+    templates.env.bytecode_cache = FileSystemBytecodeCache(config.TEMPLATE_CACHE_DIR)
+
+
+class FragmentCache:
+    """Rendered HTML fragments in an LRU, for content that never changes under its key.
+
+    ``on_lookup``, if set, is called with an outcome ("hit" or "miss") and a
+    count after each render; the app points it at its metrics.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self.on_lookup: Callable[[str, int], None] | None = None
+        self._fragments: OrderedDict[tuple, Markup] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._fragments)
+
+    def get(self, key: tuple) -> Markup | None:
+        fragment = self._fragments.get(key)
+        if fragment is not None:
+            self._fragments.move_to_end(key)
+        return fragment
+
+    def put(self, key: tuple, fragment: Markup) -> None:
+        if self.maxsize <= 0:
+            return
+        self._fragments[key] = fragment
+        if len(self._fragments) > self.maxsize:
+            self._fragments.popitem(last=False)
+
+    def clear(self) -> None:
+        self._fragments.clear()
+
+
+fragments = FragmentCache(config.FRAGMENT_CACHE_SIZE)
+
+
+def render_messages(messages: Iterable) -> Markup:
+    """Chat messages as HTML, each rendered once per (id, role, content).
+
+    Messages are never edited, but ids can be reused after the chat is
+    cleared, so the key includes a hash of the content.
+    """
+    message = templates.get_template("partials/chat_message.html").module.message
+    parts = []
+    misses = 0
+    for msg in messages:
+        key = (msg.id, msg.role, hash(msg.content))
+        fragment = fragments.get(key)
+        if fragment is None:
+            misses += 1
+            fragment = message(msg)
+            fragments.put(key, fragment)
+        parts.append(fragment)
+    if fragments.on_lookup is not None:
+        if misses:
+            fragments.on_lookup("miss", misses)
+        if len(parts) > misses:
+            fragments.on_lookup("hit", len(parts) - misses)
+    return Markup("\n".join(parts))
+
+
+templates.env.globals["render_messages"] = render_messages
+templates.env.globals["pin_categories"] = config.PIN_CATEGORIES
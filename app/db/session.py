@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+from sqlalchemy import event
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 
 from app.core.config import DATABASE_URL
@@ -8,6 +9,22 @@ engine = create_async_engine(DATABASE_URL, echo=False)
 async_session = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
 
 
+@event.listens_for(engine.sync_engine, "connect")
+def _sqlite_pragmas(dbapi_connection, connection_record) -> None:
+    # WAL lets readers carry on while another worker process writes; writers
+    # queue on the lock for up to busy_timeout ms instead of failing
+    if engine.dialect.name == "sqlite":
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA busy_timeout=5000")
+        cursor.close()
+
+
+def is_postgres(db: AsyncSession) -> bool:
+    """Whether the session talks to PostgreSQL (otherwise SQLite)."""
+    return db.get_bind().dialect.name == "postgresql"
+
+
 async def get_db() -> AsyncSession:  # type: ignore[misc]
     async with async_session() as session:
         yield session
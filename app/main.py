@@ -1,46 +1,91 @@
 from __future__ import annotations
 
+import asyncio
+import time
+from contextlib import asynccontextmanager
 from pathlib import Path
 
 from fastapi import Depends, FastAPI, Request
 from fastapi.staticfiles import StaticFiles
-from sqlalchemy import select
+from sqlalchemy import func, select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core import config
-from app.core.templates import templates
-from app.db.session import get_db
-from app.models import ChatMessage, Pin
+from app.core.templates import fragments, templates
+from app.db.session import async_session, get_db
+from app.models import Pin
 from app.routes.chat import router as chat_router
+from app.routes.events import router as events_router
+from app.routes.jobs import router as jobs_router
 from app.routes.map import router as map_router
+from app.routes.metrics import router as metrics_router
 from app.routes.pins import router as pins_router
+from app.services import archive, clusters, geocode, jobs, metrics, pin_store, pin_trash, poi, read_models, watcher
+from app.services import pin_tasks  # noqa: F401  (registers job handlers)
 
 BASE_DIR = Path(__file__).resolve().parent
 
-app = FastAPI(title="Karte")
+# Core can't import the services layer, so the fragment cache reports through a callback
+fragments.on_lookup = lambda outcome, n: metrics.FRAGMENTS.inc(n, outcome=outcome)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await asyncio.to_thread(poi.load_index)
+    await asyncio.to_thread(geocode.configure)
+    async with async_session() as db:
+        await clusters.index.ensure_loaded(db)
+        await pin_store.store.sync(db)
+    await jobs.queue.start()
+    archive.archiver.start()
+    pin_trash.purger.start()
+    watcher.watcher.start()
+    yield
+    await watcher.watcher.stop()
+    await pin_trash.purger.stop()
+    await archive.archiver.stop()
+    await jobs.queue.stop()
+    await geocode.close()
+
+
+app = FastAPI(title="Karte", lifespan=lifespan)
 app.mount("/static", StaticFiles(directory=BASE_DIR / "static"), name="static")
 app.include_router(chat_router)
+app.include_router(events_router)
+app.include_router(jobs_router)
 app.include_router(map_router)
+app.include_router(metrics_router)
 app.include_router(pins_router)
 
 
+@app.middleware("http")
+async def timing_middleware(request: Request, call_next):
+    spans = metrics.start_request()
+    start = time.perf_counter()
+    response = await call_next(request)
+    elapsed = time.perf_counter() - start
+
+    route = request.scope.get("route")
+    metrics.REQUEST_SECONDS.observe(
+        elapsed,
+        method=request.method,
+        route=getattr(route, "path", "unmatched"),
+        status=str(response.status_code),
+    )
+    if config.SERVER_TIMING:
+        response.headers["Server-Timing"] = metrics.server_timing(spans, elapsed)
+    return response
+
+
 @app.get("/")
 async def index(request: Request, db: AsyncSession = Depends(get_db)):
-    pins_result = await db.execute(select(Pin))
-    pins = [
-        {
-            "id": p.id,
-            "lat": p.lat,
-            "lng": p.lng,
-            "name": p.name,
-            "category": p.category,
-            "status": p.status.value,
-        }
-        for p in pins_result.scalars().all()
-    ]
-
-    msgs_result = await db.execute(select(ChatMessage).order_by(ChatMessage.created_at))
-    messages = msgs_result.scalars().all()
+    # Large maps load as cluster tiles instead of one marker per pin
+    pin_count = await db.scalar(select(func.count()).select_from(Pin).where(Pin.deleted_at.is_(None)))
+    if pin_count > config.CLUSTER_THRESHOLD:
+        pins = None
+    else:
+        pins = [p.to_dict() for p in await read_models.pins(db)]
+    messages, has_more = await read_models.message_page(db)
 
     return templates.TemplateResponse(
         "index.html",
@@ -48,6 +93,9 @@ async def index(request: Request, db: AsyncSession = Depends(get_db)):
             "request": request,
             "google_maps_api_key": config.GOOGLE_MAPS_API_KEY,
             "pins": pins,
+            "cluster_threshold": config.CLUSTER_THRESHOLD,
             "messages": messages,
+            "has_more": has_more,
+            "pending_jobs": await jobs.pending_job_ids(db),
         },
     )
@@ -1,4 +1,6 @@
 from app.models.pin import Base, Pin, PinStatus
-from app.models.chat import ChatMessage
+from app.models.chat import ChatArchive, ChatMessage, ChatUsage
+from app.models.job import Job, JobStatus
+from app.models.data_version import DataVersion
 
-__all__ = ["Base", "Pin", "PinStatus", "ChatMessage"]
+__all__ = ["Base", "Pin", "PinStatus", "ChatMessage", "ChatArchive", "ChatUsage", "Job", "JobStatus", "DataVersion"]
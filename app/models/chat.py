@@ -1,12 +1,43 @@
 from __future__ import annotations
 
-from datetime import datetime
+import threading
+from datetime import date, datetime, timedelta, timezone
 
-from sqlalchemy import DateTime, Integer, String, Text, func
+from sqlalchemy import Date, DateTime, Index, Integer, LargeBinary, ScalarSelect, String, Text, func, select
 from sqlalchemy.orm import Mapped, mapped_column
 
+from app.models.data_version import DataVersion
 from app.models.pin import Base
 
+_clock_lock = threading.Lock()
+_last_now = datetime.min
+
+
+def monotonic_utcnow() -> datetime:
+    """Naive UTC now with microseconds, strictly increasing within the process.
+
+    A clock step backwards or two calls in the same microsecond move on by
+    one microsecond instead of repeating or reordering timestamps.
+    """
+    global _last_now
+    with _clock_lock:
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        _last_now = now if now > _last_now else _last_now + timedelta(microseconds=1)
+        return _last_now
+
+
+def current_conversation() -> ScalarSelect[int]:
+    """The conversation new messages join, as a SQL expression.
+
+    Kept in the "conversation" row of ``data_versions`` (0 until the first
+    clear); clearing the chat moves it on, starting a new conversation.
+    """
+    return (
+        select(func.coalesce(func.max(DataVersion.version), 0))
+        .where(DataVersion.name == "conversation")
+        .scalar_subquery()
+    )
+
 
 class ChatMessage(Base):
     __tablename__ = "chat_messages"
@@ -14,6 +45,70 @@ class ChatMessage(Base):
     id: Mapped[int] = mapped_column(Integer, primary_key=True)
     role: Mapped[str] = mapped_column(String, nullable=False)  # user / assistant / system
     content: Mapped[str] = mapped_column(Text, nullable=False)
+    # Set in Python for microsecond resolution; CURRENT_TIMESTAMP only has seconds
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime, default=monotonic_utcnow, server_default=func.now(), nullable=False
+    )
+    conversation_id: Mapped[int] = mapped_column(
+        Integer, default=current_conversation(), server_default="0", nullable=False
+    )
+    # LLM accounting, on assistant messages that came from a model call.
+    # Tokens stay NULL when the provider reports no usage.
+    input_tokens: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    output_tokens: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    cached_tokens: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    latency_ms: Mapped[int | None] = mapped_column(Integer, nullable=True)
+
+    # History is read per conversation in (created_at, id) order; id breaks
+    # ties between equal timestamps
+    __table_args__ = (
+        Index("ix_chat_messages_conversation_created_at_id", "conversation_id", "created_at", "id"),
+    )
+
+
+class ChatArchive(Base):
+    """A batch of old chat messages, moved out of ``chat_messages`` and compressed.
+
+    ``data`` holds the messages as JSON lines compressed with ``codec``;
+    all of them belong to ``conversation_id``. ``summary_message_id`` is
+    the system message left in the chat in their place, while that
+    conversation is current.
+    """
+
+    __tablename__ = "chat_archives"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    conversation_id: Mapped[int] = mapped_column(Integer, server_default="0", nullable=False)
+    first_message_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    last_message_id: Mapped[int] = mapped_column(Integer, nullable=False)
+    first_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    last_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    message_count: Mapped[int] = mapped_column(Integer, nullable=False)
+    codec: Mapped[str] = mapped_column(String, nullable=False, default="gzip")
+    data: Mapped[bytes] = mapped_column(LargeBinary, nullable=False)
+    summary_message_id: Mapped[int | None] = mapped_column(Integer, nullable=True)
     created_at: Mapped[datetime] = mapped_column(
         DateTime, server_default=func.now(), nullable=False
     )
+
+
+class ChatUsage(Base):
+    """LLM accounting of chat messages that have left ``chat_messages``.
+
+    One row per conversation and UTC day, summed from the messages as the
+    archiver removes them, so usage totals outlive the messages.
+    """
+
+    __tablename__ = "chat_usage"
+
+    conversation_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    day: Mapped[date] = mapped_column(Date, primary_key=True)
+    messages: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    llm_calls: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    input_tokens: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    output_tokens: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    cached_tokens: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    latency_ms: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    max_latency_ms: Mapped[int | None] = mapped_column(Integer, nullable=True)
+    first_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    last_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
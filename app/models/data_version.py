@@ -0,0 +1,22 @@
+from __future__ import annotations
+
+from sqlalchemy import BigInteger, Integer, String
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.models.pin import Base
+
+
+class DataVersion(Base):
+    """A change counter per table, bumped by triggers on every write to it.
+
+    The "conversation" row is the app's own counter of chat clears.
+    """
+
+    __tablename__ = "data_versions"
+
+    name: Mapped[str] = mapped_column(String, primary_key=True)
+    # Starts at epoch milliseconds, past 32 bits: BIGINT on PostgreSQL (see
+    # b9e0f4c2a715); SQLite's INTEGER is already 64-bit, as e3c5a8f19b62 made it
+    version: Mapped[int] = mapped_column(
+        BigInteger().with_variant(Integer(), "sqlite"), nullable=False, default=0
+    )
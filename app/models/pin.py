@@ -3,7 +3,7 @@ from __future__ import annotations
 import enum
 from datetime import datetime
 
-from sqlalchemy import DateTime, Enum, Float, Integer, String, func
+from sqlalchemy import DDL, DateTime, Enum, Float, Index, Integer, String, event, func
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
 
 
@@ -34,3 +34,102 @@ class Pin(Base):
     updated_at: Mapped[datetime] = mapped_column(
         DateTime, server_default=func.now(), onupdate=func.now(), nullable=False
     )
+    # Set when the pin is deleted; the row is purged in the background later
+    deleted_at: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
+
+
+# Case-insensitive exact name lookups (resolving names the LLM uses for pins).
+# Partial: deleted pins are never looked up by name.
+Index(
+    "ix_pins_name_lower", func.lower(Pin.name),
+    sqlite_where=Pin.deleted_at.is_(None), postgresql_where=Pin.deleted_at.is_(None),
+)
+# Deleted pins waiting to be purged; partial, so live pins cost it nothing
+Index(
+    "ix_pins_deleted_at", Pin.deleted_at,
+    sqlite_where=Pin.deleted_at.is_not(None), postgresql_where=Pin.deleted_at.is_not(None),
+)
+
+# Trigram full-text index over pin names and categories (SQLite FTS5), kept in
+# sync by triggers. Migrations create the same objects; this covers create_all.
+PIN_SEARCH_DDL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS pins_fts USING fts5("
+    "name, category, content='pins', content_rowid='id', tokenize='trigram')",
+    "CREATE TRIGGER IF NOT EXISTS pins_fts_ai AFTER INSERT ON pins BEGIN "
+    "INSERT INTO pins_fts(rowid, name, category) VALUES (new.id, new.name, new.category); END",
+    "CREATE TRIGGER IF NOT EXISTS pins_fts_ad AFTER DELETE ON pins BEGIN "
+    "INSERT INTO pins_fts(pins_fts, rowid, name, category) VALUES ('delete', old.id, old.name, old.category); END",
+    "CREATE TRIGGER IF NOT EXISTS pins_fts_au AFTER UPDATE OF name, category ON pins BEGIN "
+    "INSERT INTO pins_fts(pins_fts, rowid, name, category) VALUES ('delete', old.id, old.name, old.category); "
+    "INSERT INTO pins_fts(rowid, name, category) VALUES (new.id, new.name, new.category); END",
+)
+
+# R*Tree over pin coordinates for radius and nearest-neighbour queries, kept in
+# sync by triggers (points are stored as zero-size boxes).
+PIN_SPATIAL_DDL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS pins_rtree USING rtree(id, min_lat, max_lat, min_lng, max_lng)",
+    "CREATE TRIGGER IF NOT EXISTS pins_rtree_ai AFTER INSERT ON pins BEGIN "
+    "INSERT INTO pins_rtree VALUES (new.id, new.lat, new.lat, new.lng, new.lng); END",
+    "CREATE TRIGGER IF NOT EXISTS pins_rtree_ad AFTER DELETE ON pins BEGIN "
+    "DELETE FROM pins_rtree WHERE id = old.id; END",
+    "CREATE TRIGGER IF NOT EXISTS pins_rtree_au AFTER UPDATE OF lat, lng ON pins BEGIN "
+    "UPDATE pins_rtree SET min_lat = new.lat, max_lat = new.lat, min_lng = new.lng, max_lng = new.lng "
+    "WHERE id = new.id; END",
+)
+
+# Bump the "pins" row of data_versions on any change, so caches of rendered
+# pin data can tell they are stale without comparing contents. The first
+# version is the current time in ms, so a recreated database doesn't reuse
+# version numbers an old cache may still hold. Purging a pin that was
+# already (soft) deleted changes nothing visible, so it doesn't bump.
+_BUMP_PINS_VERSION = (
+    "INSERT INTO data_versions (name, version) "
+    "VALUES ('pins', CAST((julianday('now') - 2440587.5) * 86400000 AS INTEGER)) "
+    "ON CONFLICT (name) DO UPDATE SET version = version + 1"
+)
+PIN_VERSION_DDL = tuple(
+    f"CREATE TRIGGER IF NOT EXISTS pins_version_{suffix} AFTER {op} ON pins{when} BEGIN {_BUMP_PINS_VERSION}; END"
+    for suffix, op, when in (
+        ("ai", "INSERT", ""),
+        ("ad", "DELETE", " WHEN old.deleted_at IS NULL"),
+        ("au", "UPDATE", ""),
+    )
+)
+
+# PostgreSQL counterparts: pg_trgm GIN indexes for search, a PostGIS
+# geography point kept by a generated column with a GiST index for radius,
+# nearest and duplicate queries, and a row trigger bumping the pin version.
+PG_EXTENSIONS_DDL = (
+    "CREATE EXTENSION IF NOT EXISTS postgis",
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+)
+PIN_POSTGRES_DDL = (
+    "ALTER TABLE pins ADD COLUMN IF NOT EXISTS geog geography(Point, 4326) "
+    "GENERATED ALWAYS AS (ST_SetSRID(ST_MakePoint(lng, lat), 4326)::geography) STORED",
+    "CREATE INDEX IF NOT EXISTS ix_pins_geog ON pins USING gist (geog)",
+    "CREATE INDEX IF NOT EXISTS ix_pins_name_trgm ON pins USING gin (name gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_pins_category_trgm ON pins USING gin (category gin_trgm_ops)",
+    "CREATE OR REPLACE FUNCTION bump_pins_version() RETURNS trigger LANGUAGE plpgsql AS $$ BEGIN "
+    "INSERT INTO data_versions (name, version) "
+    "VALUES ('pins', (extract(epoch FROM clock_timestamp()) * 1000)::bigint) "
+    "ON CONFLICT (name) DO UPDATE SET version = data_versions.version + 1; "
+    "RETURN NULL; END $$",
+    *(
+        f"CREATE OR REPLACE TRIGGER pins_version_{suffix} AFTER {op} ON pins FOR EACH ROW{when} "
+        "EXECUTE FUNCTION bump_pins_version()"
+        for suffix, op, when in (
+            ("ai", "INSERT", ""),
+            ("ad", "DELETE", " WHEN (OLD.deleted_at IS NULL)"),
+            ("au", "UPDATE", ""),
+        )
+    ),
+)
+
+for _statement in (*PIN_SEARCH_DDL, *PIN_SPATIAL_DDL, *PIN_VERSION_DDL):
+    event.listen(Pin.__table__, "after_create", DDL(_statement).execute_if(dialect="sqlite"))
+for _table in ("pins_fts", "pins_rtree"):
+    event.listen(Pin.__table__, "after_drop", DDL(f"DROP TABLE IF EXISTS {_table}").execute_if(dialect="sqlite"))
+for _statement in PG_EXTENSIONS_DDL:
+    event.listen(Base.metadata, "before_create", DDL(_statement).execute_if(dialect="postgresql"))
+for _statement in PIN_POSTGRES_DDL:
+    event.listen(Pin.__table__, "after_create", DDL(_statement).execute_if(dialect="postgresql"))
@@ -1,14 +1,19 @@
 from __future__ import annotations
 
-from fastapi import APIRouter, Depends, Form, Request
-from sqlalchemy import and_, delete, select
+import asyncio
+
+from fastapi import APIRouter, Depends, Form, HTTPException, Query, Request
+from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.core import config
 from app.core.templates import templates
 from app.db.session import get_db
-from app.models import ChatMessage, Pin, PinStatus
+from app.models import ChatArchive, ChatMessage, Pin, PinStatus
+from app.services import archive, conversations, events, jobs, pin_trash, read_models, search, spatial
 from app.services.geocode import geocode
 from app.services.llm import get_assistant_response
+from app.services.pin_tasks import load_llm_context
 
 router = APIRouter(prefix="/chat", tags=["chat"])
 
@@ -19,80 +24,44 @@ async def send_message(
     message: str = Form(...),
     db: AsyncSession = Depends(get_db),
 ):
+    origin = events.client_id(request)
+
     # Save user message
     user_msg = ChatMessage(role="user", content=message)
     db.add(user_msg)
     await db.commit()
+    events.publish_message(user_msg, origin)
 
     # Build conversation history and current map state for LLM
-    result = await db.execute(select(ChatMessage).order_by(ChatMessage.created_at))
-    all_messages = result.scalars().all()
-    history = [{"role": m.role, "content": m.content} for m in all_messages]
-
-    pins_result = await db.execute(select(Pin))
-    pins = [
-        {"lat": p.lat, "lng": p.lng, "name": p.name, "category": p.category, "status": p.status.value}
-        for p in pins_result.scalars().all()
-    ]
-
-    # Get assistant response
-    llm_result = get_assistant_response(history, pins=pins)
-
-    draft_pin = None
-    place_pin = llm_result.get("place_pin")
+    history, map_state = await load_llm_context(db)
 
-    if place_pin and place_pin.get("address"):
-        # Geocode the address and create a draft pin
-        geo = geocode(place_pin["address"])
-        if geo:
-            # Check for duplicate at same location
-            tol = 0.0001  # ~11 meters
-            existing = await db.execute(
-                select(Pin).where(
-                    and_(
-                        Pin.lat.between(geo["lat"] - tol, geo["lat"] + tol),
-                        Pin.lng.between(geo["lng"] - tol, geo["lng"] + tol),
-                    )
-                )
-            )
-            if existing.scalars().first():
-                llm_result["content"] += f"\n\nA pin already exists at that location ({geo['formatted_address']}). No duplicate created."
-            else:
-                pin = Pin(
-                    lat=geo["lat"],
-                    lng=geo["lng"],
-                    name=place_pin.get("name"),
-                    category=place_pin.get("category", "other"),
-                    status=PinStatus.draft,
-                    confidence=place_pin.get("confidence"),
-                )
-                db.add(pin)
-                await db.commit()
-                await db.refresh(pin)
-                draft_pin = pin
-                llm_result["content"] += f"\n\n📍 Found at: {geo['formatted_address']}"
-        else:
-            llm_result["content"] += "\n\nI couldn't find that address. Could you be more specific, or click on the map instead?"
-            llm_result["request_click"] = True
+    # Get assistant response (a blocking call; off the loop so jobs and SSE keep running)
+    llm_result = await asyncio.to_thread(get_assistant_response, history, map_state=map_state)
 
     # Handle delete_pins action
+    # (soft: the pins can be restored until the purger removes them)
     delete_action = llm_result.get("delete_pins")
+    deleted_ids: list[int] = []
     if delete_action:
         which = delete_action.get("which", "all")
+        criteria = None
         if which == "all":
-            await db.execute(delete(Pin))
+            criteria = ()
         elif which == "drafts":
-            await db.execute(delete(Pin).where(Pin.status == PinStatus.draft))
+            criteria = (Pin.status == PinStatus.draft,)
         elif which == "named":
-            names = delete_action.get("names", [])
-            if names:
-                await db.execute(delete(Pin).where(Pin.name.in_(names)))
-        await db.commit()
+            ids = await search.resolve_pin_names(db, delete_action.get("names", []))
+            if ids:
+                criteria = (Pin.id.in_(ids),)
+        if criteria is not None:
+            deleted_ids = await pin_trash.soft_delete(db, *criteria)
+            await db.commit()
+            events.publish_pins_deleted(deleted_ids, origin)
 
     # Handle move_map action (geocode location targets server-side)
     move_map = llm_result.get("move_map")
     if move_map and move_map.get("target") == "location" and move_map.get("address"):
-        geo = geocode(move_map["address"])
+        geo = await geocode(move_map["address"])
         if geo:
             move_map["target"] = "center"
             move_map["lat"] = geo["lat"]
@@ -103,9 +72,11 @@ async def send_message(
             move_map = None  # couldn't geocode, skip map move
 
     # Handle clear_chat action
+    # (the cleared conversation stays in the table and its archives, out of the history)
     if llm_result.get("clear_chat"):
-        await db.execute(delete(ChatMessage))
+        await conversations.start_new(db)
         await db.commit()
+        events.publish_messages_cleared(origin)
         return templates.TemplateResponse(
             "partials/chat_messages.html",
             {"request": request, "messages": [], "request_click": False, "draft_pin": None, "move_map": None},
@@ -113,30 +84,128 @@ async def send_message(
 
     # Handle list_pins action — append as plain text
     if llm_result.get("list_pins"):
-        pins_result2 = await db.execute(select(Pin).order_by(Pin.created_at))
-        all_pins = pins_result2.scalars().all()
+        all_pins = await read_models.pins(db)
         if all_pins:
             lines = [f"- {p.name or 'unnamed'} ({p.category.replace('_', ' ')})" for p in all_pins]
             llm_result["content"] += "\n\n" + "\n".join(lines)
         else:
             llm_result["content"] += "\n\nNo pins on the map yet."
 
+    # Handle nearby action — append the closest pins as plain text
+    nearby = llm_result.get("nearby")
+    if nearby:
+        lat, lng = nearby.get("lat"), nearby.get("lng")
+        if (lat is None or lng is None) and nearby.get("address"):
+            geo = await geocode(nearby["address"])
+            if geo:
+                lat, lng = geo["lat"], geo["lng"]
+        try:
+            point = (float(lat), float(lng))
+            radius = float(nearby["radius"]) if nearby.get("radius") else None
+            k = max(1, min(int(nearby.get("k") or 5), 50))
+        except (TypeError, ValueError):
+            point = None
+        if point is None:
+            llm_result["content"] += "\n\nI couldn't find that location."
+        else:
+            results = await spatial.nearby_pins(
+                db, *point, radius_m=radius, k=k, category=nearby.get("category")
+            )
+            llm_result["content"] += "\n\n" + spatial.describe_nearby(results)
+
     # Save assistant message
-    assistant_msg = ChatMessage(role="assistant", content=llm_result["content"])
+    assistant_msg = ChatMessage(role="assistant", content=llm_result["content"], **(llm_result.get("usage") or {}))
     db.add(assistant_msg)
     await db.commit()
+    events.publish_message(assistant_msg, origin)
+
+    # Geocoding happens in the background; the draft pin follows via polling
+    pending_jobs = await jobs.pending_job_ids(db)
+    place_pin = llm_result.get("place_pin")
+    if place_pin and place_pin.get("address"):
+        job = await jobs.queue.enqueue(db, "place_pin", place_pin)
+        pending_jobs.append(job.id)
 
     # Re-fetch all messages
-    result = await db.execute(select(ChatMessage).order_by(ChatMessage.created_at))
-    messages = result.scalars().all()
+    messages, has_more = await read_models.message_page(db)
 
     return templates.TemplateResponse(
         "partials/chat_messages.html",
         {
             "request": request,
             "messages": messages,
+            "has_more": has_more,
             "request_click": llm_result.get("request_click", False),
-            "draft_pin": draft_pin,
             "move_map": move_map,
+            "pending_jobs": pending_jobs,
+            "undo_delete": len(deleted_ids),
+        },
+    )
+
+
+@router.get("/messages")
+async def get_messages(
+    request: Request,
+    before: int | None = Query(None, ge=1),
+    limit: int = Query(config.CHAT_PAGE_SIZE, ge=1, le=200),
+    format: str = Query("html", pattern="^(html|json)$"),
+    db: AsyncSession = Depends(get_db),
+):
+    # One page of history, ending before message ``before`` or at the latest
+    messages, has_more = await read_models.message_page(db, before, limit)
+    if format == "json":
+        return {"messages": [m.to_dict() for m in messages], "has_more": has_more}
+    if before is not None:
+        # Older messages only, to go above what the chat already shows
+        return templates.TemplateResponse(
+            "partials/chat_page.html",
+            {"request": request, "messages": messages, "has_more": has_more},
+        )
+    return templates.TemplateResponse(
+        "partials/chat_messages.html",
+        {
+            "request": request,
+            "messages": messages,
+            "has_more": has_more,
+            "pending_jobs": await jobs.pending_job_ids(db),
         },
     )
+
+
+@router.get("/usage/daily")
+async def usage_daily(days: int = Query(30, ge=1, le=366), db: AsyncSession = Depends(get_db)):
+    # Tokens and model latency per UTC day, archived messages included
+    return await conversations.usage_by_day(db, days)
+
+
+@router.get("/usage/conversations")
+async def usage_per_conversation(limit: int = Query(50, ge=1, le=500), db: AsyncSession = Depends(get_db)):
+    # Tokens and model latency per conversation (the chat between two clears), latest first
+    return await conversations.usage_by_conversation(db, limit)
+
+
+@router.get("/archives")
+async def list_archives(conversation: int | None = Query(None, ge=0), db: AsyncSession = Depends(get_db)):
+    # Archive metadata only; the compressed messages come from /chat/archives/{id}
+    stmt = (
+        select(
+            ChatArchive.id,
+            ChatArchive.conversation_id,
+            ChatArchive.first_message_id,
+            ChatArchive.last_message_id,
+            ChatArchive.first_at,
+            ChatArchive.last_at,
+            ChatArchive.message_count,
+        ).order_by(ChatArchive.id)
+    )
+    if conversation is not None:
+        stmt = stmt.where(ChatArchive.conversation_id == conversation)
+    return [dict(row._mapping) for row in await db.execute(stmt)]
+
+
+@router.get("/archives/{archive_id}")
+async def get_archive(archive_id: int, db: AsyncSession = Depends(get_db)):
+    messages = await archive.archived_messages(db, archive_id)
+    if messages is None:
+        raise HTTPException(status_code=404, detail="Archive not found")
+    return {"id": archive_id, "messages": messages}
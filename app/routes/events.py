@@ -0,0 +1,38 @@
+from __future__ import annotations
+
+import asyncio
+from collections.abc import AsyncIterator
+
+from fastapi import APIRouter, Request
+from fastapi.responses import StreamingResponse
+
+from app.core import config
+from app.services.events import broker
+
+router = APIRouter(prefix="/events", tags=["events"])
+
+
+async def event_stream(request: Request) -> AsyncIterator[str]:
+    """Yield SSE frames for every broker event until the client disconnects."""
+    queue = broker.subscribe()
+    try:
+        yield "retry: 3000\n\n"
+        while not await request.is_disconnected():
+            try:
+                event = await asyncio.wait_for(queue.get(), timeout=config.EVENTS_HEARTBEAT)
+            except asyncio.TimeoutError:
+                # Comment line keeps proxies from closing an idle connection
+                yield ": keepalive\n\n"
+                continue
+            yield event.encode()
+    finally:
+        broker.unsubscribe(queue)
+
+
+@router.get("")
+async def events(request: Request):
+    return StreamingResponse(
+        event_stream(request),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -0,0 +1,44 @@
+from __future__ import annotations
+
+from fastapi import APIRouter, Depends, Request, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.templates import templates
+from app.db.session import get_db
+from app.models import Job, JobStatus, Pin
+from app.services import jobs, read_models
+
+router = APIRouter(prefix="/jobs", tags=["jobs"])
+
+
+@router.get("/{job_id}")
+async def job_status(
+    request: Request,
+    job_id: int,
+    db: AsyncSession = Depends(get_db),
+):
+    job = await db.get(Job, job_id)
+    if job is not None and job.status in (JobStatus.pending, JobStatus.running):
+        # Nothing new yet — 204 tells htmx to keep polling without swapping
+        return Response(status_code=204)
+
+    job_result = (job.result if job is not None else None) or {}
+    draft_pin = None
+    if job_result.get("pin_id") is not None:
+        draft_pin = await db.get(Pin, job_result["pin_id"])
+        if draft_pin is not None and draft_pin.deleted_at is not None:
+            draft_pin = None
+
+    messages, has_more = await read_models.message_page(db)
+
+    return templates.TemplateResponse(
+        "partials/chat_messages.html",
+        {
+            "request": request,
+            "messages": messages,
+            "has_more": has_more,
+            "request_click": job_result.get("request_click", False),
+            "draft_pin": draft_pin,
+            "pending_jobs": await jobs.pending_job_ids(db),
+        },
+    )
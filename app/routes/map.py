@@ -1,33 +1,63 @@
 from __future__ import annotations
 
-from fastapi import APIRouter, Depends, Form, Request
-from sqlalchemy import and_, select
+from fastapi import APIRouter, Depends, Form, HTTPException, Path, Query, Request, Response
+from fastapi.responses import JSONResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.templates import templates
 from app.db.session import get_db
-from app.models import ChatMessage, Pin, PinStatus
-from app.services.llm import get_assistant_response
+from app.models import ChatMessage
+from app.services import clusters, events, jobs, mvt, pin_formats, read_models
+from app.services.pin_tasks import create_pin
 
 router = APIRouter(prefix="/map", tags=["map"])
 
 
 @router.get("/pins")
-async def get_pins(db: AsyncSession = Depends(get_db)):
-    result = await db.execute(select(Pin))
-    pins = result.scalars().all()
-    return [
-        {
-            "id": p.id,
-            "lat": p.lat,
-            "lng": p.lng,
-            "name": p.name,
-            "category": p.category,
-            "status": p.status.value,
-            "confidence": p.confidence,
-        }
-        for p in pins
-    ]
+async def get_pins(
+    format: str = Query("json", pattern="^(json|columns|binary)$"),
+    db: AsyncSession = Depends(get_db),
+):
+    # Columnar formats for large maps: no per-pin keys. All formats skip
+    # FastAPI's per-value encoder and return a response directly.
+    if format == "columns":
+        return JSONResponse(pin_formats.encode_columns(await pin_formats.load_columns(db)))
+    if format == "binary":
+        data = pin_formats.encode_binary(await pin_formats.load_columns(db))
+        return Response(content=data, media_type=pin_formats.BINARY_MEDIA_TYPE)
+
+    return JSONResponse([p.to_dict() for p in await read_models.pins(db)])
+
+
+@router.get("/clusters/{z}/{x}/{y}")
+async def get_clusters(
+    z: int = Path(..., ge=0, le=clusters.MAX_ZOOM),
+    x: int = Path(..., ge=0),
+    y: int = Path(..., ge=0),
+    db: AsyncSession = Depends(get_db),
+):
+    if x >= 1 << z or y >= 1 << z:
+        raise HTTPException(status_code=404, detail="Tile out of range")
+    await clusters.index.ensure_loaded(db)
+    return Response(content=clusters.index.tile(z, x, y), media_type="application/json")
+
+
+@router.get("/tiles/{z}/{x}/{y}.mvt")
+async def get_tile(
+    request: Request,
+    z: int = Path(..., ge=0, le=clusters.MAX_ZOOM),
+    x: int = Path(..., ge=0),
+    y: int = Path(..., ge=0),
+    db: AsyncSession = Depends(get_db),
+):
+    if x >= 1 << z or y >= 1 << z:
+        raise HTTPException(status_code=404, detail="Tile out of range")
+    version = await read_models.pins_version(db)
+    etag = f'"{version}"'
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    data = await mvt.pin_tile(db, version, z, x, y)
+    return Response(content=data, media_type=mvt.MEDIA_TYPE, headers={"ETag": etag, "Cache-Control": "no-cache"})
 
 
 @router.post("/click")
@@ -37,35 +67,25 @@ async def map_click(
     lng: float = Form(...),
     db: AsyncSession = Depends(get_db),
 ):
-    # Check for duplicate at same location
-    tol = 0.0001  # ~11 meters
-    existing = await db.execute(
-        select(Pin).where(
-            and_(
-                Pin.lat.between(lat - tol, lat + tol),
-                Pin.lng.between(lng - tol, lng + tol),
-            )
-        )
-    )
-    if existing.scalars().first():
+    origin = events.client_id(request)
+
+    # Create a draft pin, unless there is one at the same location already
+    pin = await create_pin(db, lat, lng)
+    if pin is None:
         dup_msg = ChatMessage(
             role="assistant",
             content=f"A pin already exists at ({lat:.5f}, {lng:.5f}). No duplicate created.",
         )
         db.add(dup_msg)
         await db.commit()
-        result = await db.execute(select(ChatMessage).order_by(ChatMessage.created_at))
-        messages = result.scalars().all()
+        events.publish_message(dup_msg, origin)
+        messages, has_more = await read_models.message_page(db)
         return templates.TemplateResponse(
             "partials/chat_messages.html",
-            {"request": request, "messages": messages},
+            {"request": request, "messages": messages, "has_more": has_more},
         )
 
-    # Create draft pin
-    pin = Pin(lat=lat, lng=lng, status=PinStatus.draft, category="other")
-    db.add(pin)
-    await db.commit()
-    await db.refresh(pin)
+    events.publish_pin("created", pin, origin)
 
     # Add system message with coordinates to conversation
     coord_msg = ChatMessage(
@@ -74,39 +94,16 @@ async def map_click(
     )
     db.add(coord_msg)
     await db.commit()
+    events.publish_message(coord_msg, origin)
 
-    # Build conversation history and current map state for LLM
-    result = await db.execute(select(ChatMessage).order_by(ChatMessage.created_at))
-    all_messages = result.scalars().all()
-    history = [{"role": m.role, "content": m.content} for m in all_messages]
-
-    pins_result = await db.execute(select(Pin))
-    pins_list = [
-        {"lat": p.lat, "lng": p.lng, "name": p.name, "category": p.category, "status": p.status.value}
-        for p in pins_result.scalars().all()
-    ]
-
-    llm_result = get_assistant_response(history, pins=pins_list)
-
-    # Update pin with classification if available
-    classification = llm_result.get("classification")
-    if classification:
-        pin.category = classification.get("category", "other")
-        pin.name = classification.get("name")
-        pin.confidence = classification.get("confidence")
-        await db.commit()
-        await db.refresh(pin)
-
-    # Save assistant response
-    assistant_msg = ChatMessage(role="assistant", content=llm_result["content"])
-    db.add(assistant_msg)
-    await db.commit()
+    # Classification runs in the background; the updated pin follows via polling
+    pending_jobs = await jobs.pending_job_ids(db)
+    job = await jobs.queue.enqueue(db, "classify_pin", {"pin_id": pin.id})
+    pending_jobs.append(job.id)
 
-    # Re-fetch all messages
-    result = await db.execute(select(ChatMessage).order_by(ChatMessage.created_at))
-    messages = result.scalars().all()
+    messages, has_more = await read_models.message_page(db)
 
     return templates.TemplateResponse(
         "partials/chat_messages.html",
-        {"request": request, "messages": messages, "draft_pin": pin},
+        {"request": request, "messages": messages, "has_more": has_more, "draft_pin": pin, "pending_jobs": pending_jobs},
     )
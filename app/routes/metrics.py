@@ -0,0 +1,24 @@
+from __future__ import annotations
+
+from fastapi import APIRouter, Depends
+from fastapi.responses import PlainTextResponse
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.session import get_db
+from app.models import Pin
+from app.services import metrics
+
+router = APIRouter(tags=["metrics"])
+
+
+@router.get("/metrics")
+async def get_metrics(db: AsyncSession = Depends(get_db)):
+    result = await db.execute(select(Pin.status, func.count()).where(Pin.deleted_at.is_(None)).group_by(Pin.status))
+    counts = {status.value: n for status, n in result.all()}
+    for status in ("draft", "confirmed"):
+        metrics.PINS.set(counts.get(status, 0), status=status)
+
+    return PlainTextResponse(
+        metrics.registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
@@ -1,16 +1,61 @@
 from __future__ import annotations
 
-from fastapi import APIRouter, Depends, Form, Request
-from sqlalchemy import select
+from fastapi import APIRouter, Depends, Form, Query, Request
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.templates import templates
 from app.db.session import get_db
 from app.models import ChatMessage, Pin, PinStatus
+from app.services import events, pin_trash, read_models, search, spatial
 
 router = APIRouter(prefix="/pins", tags=["pins"])
 
 
+@router.get("/search")
+async def search_pins(
+    q: str = Query(..., min_length=1),
+    limit: int = Query(20, ge=1, le=100),
+    db: AsyncSession = Depends(get_db),
+):
+    return [p.to_dict() for p in await search.search_pins(db, q, limit)]
+
+
+@router.get("/nearby")
+async def nearby_pins(
+    lat: float = Query(..., ge=-90, le=90),
+    lng: float = Query(..., ge=-180, le=180),
+    radius: float | None = Query(None, gt=0, description="meters; omit for the k nearest anywhere"),
+    k: int = Query(10, ge=1, le=100),
+    category: str | None = None,
+    db: AsyncSession = Depends(get_db),
+):
+    results = await spatial.nearby_pins(db, lat, lng, radius_m=radius, k=k, category=category)
+    return [{**p.to_dict(), "distance_m": round(d, 1)} for p, d in results]
+
+
+@router.post("/restore")
+async def restore_pins(request: Request, db: AsyncSession = Depends(get_db)):
+    """Undo the most recent pin delete, if it hasn't been purged yet."""
+    origin = events.client_id(request)
+    restored = await pin_trash.restore_last(db)
+    events.publish_pins_restored(restored, origin)
+
+    if restored:
+        content = f"Restored {len(restored)} pin(s)."
+    else:
+        content = "There are no deleted pins to restore."
+    msg = ChatMessage(role="assistant", content=content)
+    db.add(msg)
+    await db.commit()
+    events.publish_message(msg, origin)
+
+    messages, has_more = await read_models.message_page(db)
+    return templates.TemplateResponse(
+        "partials/chat_messages.html",
+        {"request": request, "messages": messages, "has_more": has_more},
+    )
+
+
 @router.post("/{pin_id}/confirm")
 async def confirm_pin(
     request: Request,
@@ -20,19 +65,19 @@ async def confirm_pin(
     db: AsyncSession = Depends(get_db),
 ):
     pin = await db.get(Pin, pin_id)
-    if pin is None:
+    if pin is None or pin.deleted_at is not None:
         # Return messages with an error note
-        result = await db.execute(select(ChatMessage).order_by(ChatMessage.created_at))
-        messages = result.scalars().all()
+        messages, has_more = await read_models.message_page(db)
         return templates.TemplateResponse(
             "partials/chat_messages.html",
-            {"request": request, "messages": messages},
+            {"request": request, "messages": messages, "has_more": has_more},
         )
 
     pin.name = name or None
     pin.category = category
     pin.status = PinStatus.confirmed
     await db.commit()
+    events.publish_pin("updated", pin, events.client_id(request))
 
     # Add confirmation message
     display_name = name or category.replace("_", " ").title()
@@ -42,11 +87,11 @@ async def confirm_pin(
     )
     db.add(confirm_msg)
     await db.commit()
+    events.publish_message(confirm_msg, events.client_id(request))
 
-    result = await db.execute(select(ChatMessage).order_by(ChatMessage.created_at))
-    messages = result.scalars().all()
+    messages, has_more = await read_models.message_page(db)
 
     return templates.TemplateResponse(
         "partials/chat_messages.html",
-        {"request": request, "messages": messages},
+        {"request": request, "messages": messages, "has_more": has_more},
     )
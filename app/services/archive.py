@@ -0,0 +1,198 @@
+from __future__ import annotations
+
+import asyncio
+import gzip
+import json
+import logging
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import Select, delete, func, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.core import config
+from app.db.session import async_session
+from app.models import ChatArchive, ChatMessage
+from app.models.chat import current_conversation
+from app.services import conversations, events, metrics, read_models
+from app.services.read_models import MessageRow
+
+logger = logging.getLogger(__name__)
+
+CODEC = "gzip"
+
+
+def pack(messages: list[MessageRow]) -> bytes:
+    """Messages as gzip-compressed JSON lines."""
+    lines = (
+        json.dumps({"id": m.id, "role": m.role, "content": m.content, "created_at": m.created_at.isoformat()})
+        for m in messages
+    )
+    return gzip.compress("\n".join(lines).encode(), compresslevel=6)
+
+
+def unpack(data: bytes) -> list[dict]:
+    """Inverse of pack: one dict per message, ``created_at`` as an ISO string."""
+    text = gzip.decompress(data).decode()
+    return [json.loads(line) for line in text.splitlines()]
+
+
+def cutoff(days: float | None = None) -> datetime:
+    """Messages created before this are due for archiving (naive UTC, like CURRENT_TIMESTAMP)."""
+    days = config.CHAT_ARCHIVE_AFTER_DAYS if days is None else days
+    return datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(days=days)
+
+
+def summary_text(count: int, first_at: datetime, last_at: datetime) -> str:
+    return (
+        f"{count} earlier message(s) from {first_at:%Y-%m-%d} to {last_at:%Y-%m-%d} "
+        "were moved to the chat archive."
+    )
+
+
+def _summaries() -> Select:
+    return select(ChatArchive.summary_message_id).where(ChatArchive.summary_message_id.is_not(None))
+
+
+async def drop_stale_summaries(db: AsyncSession) -> int:
+    """Delete the archive system messages of cleared conversations. Returns how many.
+
+    Nobody sees a cleared conversation any more, and one that was archived
+    in full before it was cleared has no batches left to clean up after it.
+    """
+    deleted = await db.execute(
+        delete(ChatMessage)
+        .where(ChatMessage.id.in_(_summaries()), ChatMessage.conversation_id != current_conversation())
+    )
+    await db.commit()
+    return deleted.rowcount
+
+
+async def archive_batch(db: AsyncSession, before: datetime, limit: int | None = None) -> int:
+    """Move up to ``limit`` of the oldest messages created before ``before`` into one archive row.
+
+    A batch holds messages of one conversation, oldest conversation first,
+    and the archive row records which. In the current conversation the
+    archived messages are replaced by a single system message, kept just
+    ahead of the remaining history and updated as later batches land. A
+    cleared conversation is no longer shown, so its batches get no system
+    message (``drop_stale_summaries`` removes the one it had). Returns the
+    number of messages archived.
+    """
+    limit = limit or config.CHAT_ARCHIVE_BATCH
+    due = (ChatMessage.created_at < before, ChatMessage.id.not_in(_summaries()))
+    conversation = await db.scalar(select(func.min(ChatMessage.conversation_id)).where(*due))
+    if conversation is None:
+        return 0
+    rows = [MessageRow(*row) for row in await db.execute(
+        select(*read_models.MESSAGE_COLUMNS)
+        .where(ChatMessage.conversation_id == conversation, *due)
+        .order_by(ChatMessage.created_at, ChatMessage.id)
+        .limit(limit)
+    )]
+    if not rows:
+        return 0
+
+    data = await asyncio.to_thread(pack, rows)
+    in_conversation = ChatArchive.conversation_id == conversation
+    archived, first_at = (await db.execute(
+        select(func.coalesce(func.sum(ChatArchive.message_count), 0), func.min(ChatArchive.first_at))
+        .where(in_conversation)
+    )).one()
+    summary_id = await db.scalar(
+        select(ChatArchive.summary_message_id).where(in_conversation).order_by(ChatArchive.id.desc()).limit(1)
+    )
+    ids = [m.id for m in rows]
+    summary = None
+    if conversation == await db.scalar(select(current_conversation())):
+        summary = await db.get(ChatMessage, summary_id) if summary_id is not None else None
+        if summary is None:
+            summary = ChatMessage(role="system", conversation_id=conversation)
+            db.add(summary)
+        summary.content = summary_text(archived + len(rows), first_at or rows[0].created_at, rows[-1].created_at)
+        summary.created_at = rows[-1].created_at
+    # Their LLM accounting outlives them, in the same transaction as the delete
+    await conversations.roll_up(db, ids)
+    deleted = await db.execute(delete(ChatMessage).where(ChatMessage.id.in_(ids)))
+    if deleted.rowcount != len(ids):
+        # Another worker's archiver took some of these first; leave them to it
+        await db.rollback()
+        return 0
+    await db.flush()
+    db.add(ChatArchive(
+        conversation_id=conversation,
+        first_message_id=rows[0].id,
+        last_message_id=rows[-1].id,
+        first_at=rows[0].created_at,
+        last_at=rows[-1].created_at,
+        message_count=len(rows),
+        codec=CODEC,
+        data=data,
+        summary_message_id=summary.id if summary is not None else None,
+    ))
+    await db.commit()
+    metrics.CHAT_ARCHIVED.inc(len(rows))
+    return len(rows)
+
+
+async def archived_messages(db: AsyncSession, archive_id: int) -> list[dict] | None:
+    """The messages in one archive row, oldest first, or None if there is no such row."""
+    archive = await db.get(ChatArchive, archive_id)
+    if archive is None:
+        return None
+    return await asyncio.to_thread(unpack, archive.data)
+
+
+class Archiver:
+    """Background task that archives old chat messages in bounded batches.
+
+    Every ``interval`` seconds it archives messages older than
+    CHAT_ARCHIVE_AFTER_DAYS, one batch per transaction, yielding to the
+    event loop between batches so request handlers are never held up for
+    long. Stops for the round once a batch comes back empty. Each round
+    first drops the system messages of cleared conversations.
+    """
+
+    def __init__(self, session_factory: async_sessionmaker, interval: float | None = None):
+        self.session_factory = session_factory
+        self.interval = interval if interval is not None else config.CHAT_ARCHIVE_INTERVAL
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        if config.CHAT_ARCHIVE_AFTER_DAYS > 0 and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def run_once(self, before: datetime | None = None, batch: int | None = None) -> int:
+        """Archive everything due, batch by batch. Returns the number of messages archived."""
+        before = before or cutoff()
+        batch = batch or config.CHAT_ARCHIVE_BATCH
+        async with self.session_factory() as db:
+            await drop_stale_summaries(db)
+        total = 0
+        while True:
+            async with self.session_factory() as db:
+                moved = await archive_batch(db, before, batch)
+            total += moved
+            if not moved:
+                break
+            await asyncio.sleep(0)
+        if total:
+            logger.info("Archived %d chat message(s)", total)
+            events.broker.publish("messages", {"action": "archived", "count": total})
+        return total
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.run_once()
+            except Exception:
+                logger.exception("Chat archiving failed")
+            await asyncio.sleep(self.interval)
+
+
+archiver = Archiver(async_session)
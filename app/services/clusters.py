@@ -0,0 +1,293 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import math
+from collections import OrderedDict
+from collections.abc import Iterable
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core import config
+from app.services import events, metrics, read_models
+
+MAX_ZOOM = 20
+# Highest zoom that clusters; tiles above it list every pin individually
+CLUSTER_MAX_ZOOM = 16
+# Grid cells per tile side: with 256 px tiles, pins within ~64 px merge
+CELLS_PER_TILE = 4
+MAX_LAT = 85.0511287798  # Web Mercator's square world
+
+
+def project(lat: float, lng: float) -> tuple[float, float]:
+    """Web Mercator (x, y) in [0, 1), origin at the top-left like map tiles."""
+    lat = min(MAX_LAT, max(-MAX_LAT, lat))
+    s = math.sin(math.radians(lat))
+    x = (lng + 180) / 360
+    y = 0.5 - math.log((1 + s) / (1 - s)) / (4 * math.pi)
+    return min(max(x, 0.0), math.nextafter(1.0, 0)), min(max(y, 0.0), math.nextafter(1.0, 0))
+
+
+def unproject(x: float, y: float) -> tuple[float, float]:
+    lng = x * 360 - 180
+    lat = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y))))
+    return lat, lng
+
+
+class _Cell:
+    """Running sums for the pins in one grid cell at one zoom level."""
+
+    __slots__ = ("count", "sx", "sy", "drafts", "id_sum")
+
+    def __init__(self):
+        self.count = 0
+        self.sx = 0.0
+        self.sy = 0.0
+        self.drafts = 0
+        # With one pin left, this is its id — no member list needed per level
+        self.id_sum = 0
+
+
+class ClusterIndex:
+    """Grid clusters of pins at every zoom, kept current pin by pin.
+
+    Each level up to ``CLUSTER_MAX_ZOOM`` splits the Mercator square into
+    ``CELLS_PER_TILE * 2**z`` cells per side; a cell's pins are one cluster
+    placed at their centroid. Cells nest, so a cell at zoom z is exactly
+    four cells at z+1. Adding or removing a pin touches one cell per level.
+    The finest level also keeps pin ids, for tiles zoomed past clustering.
+
+    Tile payloads are cached as JSON bytes in an LRU; a pin change evicts
+    the one tile per zoom that contains it.
+
+    Like ``PinStore``, the index follows ``data_versions``: each pin event
+    applied moves ``version`` on by the bump its write made, and
+    ``ensure_loaded`` rebuilds when the stored version differs, as it does
+    after writes from another worker process.
+    """
+
+    def __init__(self, cache_size: int | None = None):
+        self.cache_size = config.CLUSTER_TILE_CACHE_SIZE if cache_size is None else cache_size
+        self.pins: dict[int, tuple] = {}  # id -> (x, y, lat, lng, name, category, status)
+        self.levels: list[dict[int, _Cell]] = [{} for _ in range(CLUSTER_MAX_ZOOM + 1)]
+        self.leaves: dict[int, set[int]] = {}
+        self.version: int | None = None  # None until loaded
+        self._tiles: OrderedDict[tuple[int, int, int], bytes] = OrderedDict()
+        self._backlog: list[dict] | None = None
+        self._lock = asyncio.Lock()
+
+    def __len__(self) -> int:
+        return len(self.pins)
+
+    @property
+    def loaded(self) -> bool:
+        return self.version is not None
+
+    # --- Maintenance ---
+
+    def load(self, rows: Iterable[tuple], version: int = 0) -> None:
+        """Replace the contents with (id, lat, lng, name, category, status) rows."""
+        self._adopt(ClusterIndex._build(rows), version)
+
+    @staticmethod
+    def _build(rows: Iterable[tuple]) -> ClusterIndex:
+        """A fresh index of ``rows``; touches no shared state, so it can run in a thread."""
+        fresh = ClusterIndex(cache_size=0)
+        for pin_id, lat, lng, name, category, status in rows:
+            fresh._insert(pin_id, lat, lng, name, category, status)
+        return fresh
+
+    def _adopt(self, fresh: ClusterIndex, version: int) -> None:
+        # One synchronous step on the loop: no tile is ever cut from a half-built index
+        self.pins, self.levels, self.leaves = fresh.pins, fresh.levels, fresh.leaves
+        self._tiles = OrderedDict()
+        self.version = version
+
+    async def ensure_loaded(self, db: AsyncSession) -> None:
+        """Build from the database, off the event loop, on first use or when stale.
+
+        The version is read before the rows, as in ``PinStore.sync``. Pin
+        events published meanwhile are replayed afterwards; ``add`` and
+        ``remove`` are idempotent, so overlaps are harmless.
+        """
+        if self.version is not None and await read_models.pins_version(db) == self.version:
+            return
+        async with self._lock:
+            version = await read_models.pins_version(db)
+            if version == self.version:
+                return
+            self._backlog = []
+            try:
+                rows = [row[:6] for row in await read_models.pin_tuples(db)]
+                # Built off the loop, swapped in on it
+                self._adopt(await asyncio.to_thread(ClusterIndex._build, rows), version)
+                backlog, self._backlog = self._backlog, None
+                for data in backlog:
+                    self.apply(data)
+            finally:
+                self._backlog = None
+
+    def apply(self, data: dict) -> None:
+        """Apply a ``pins`` broker event."""
+        if self._backlog is not None:
+            self._backlog.append(data)
+            return
+        if self.version is None:
+            return
+        if data.get("action") == "deleted":
+            for pin_id in data.get("ids", ()):
+                self.remove(pin_id)
+            self.version += len(data.get("ids", ()))
+        elif "pin" in data:
+            pin = data["pin"]
+            row = (pin["lat"], pin["lng"], pin["name"], pin["category"], pin["status"])
+            # Unchanged means no UPDATE and no bump. A change to a field not
+            # indexed here (confidence) goes uncounted and forces a reload.
+            entry = self.pins.get(pin["id"])
+            if entry is None or entry[2:] != row:
+                self.add(pin["id"], *row)
+                self.version += 1
+
+    def add(self, pin_id: int, lat: float, lng: float, name: str | None, category: str, status: str) -> None:
+        """Insert a pin, or update it in place if it is already indexed."""
+        if pin_id in self.pins:
+            self.remove(pin_id)
+        x, y = self._insert(pin_id, lat, lng, name, category, status)
+        self._evict(x, y)
+
+    def _insert(self, pin_id, lat, lng, name, category, status) -> tuple[float, float]:
+        x, y = project(lat, lng)
+        self.pins[pin_id] = (x, y, lat, lng, name, category, status)
+        draft = status == "draft"
+        n = CELLS_PER_TILE
+        for level in self.levels:
+            key = int(x * n) << 32 | int(y * n)
+            n <<= 1
+            cell = level.get(key)
+            if cell is None:
+                cell = level[key] = _Cell()
+            cell.count += 1
+            cell.sx += x
+            cell.sy += y
+            cell.drafts += draft
+            cell.id_sum += pin_id
+        self.leaves.setdefault(key, set()).add(pin_id)
+        return x, y
+
+    def remove(self, pin_id: int) -> None:
+        entry = self.pins.pop(pin_id, None)
+        if entry is None:
+            return
+        x, y, status = entry[0], entry[1], entry[6]
+        draft = status == "draft"
+        n = CELLS_PER_TILE
+        for level in self.levels:
+            key = int(x * n) << 32 | int(y * n)
+            n <<= 1
+            cell = level[key]
+            if cell.count == 1:
+                del level[key]
+                continue
+            cell.count -= 1
+            cell.sx -= x
+            cell.sy -= y
+            cell.drafts -= draft
+            cell.id_sum -= pin_id
+        leaf = self.leaves[key]
+        leaf.discard(pin_id)
+        if not leaf:
+            del self.leaves[key]
+        self._evict(x, y)
+
+    def _evict(self, x: float, y: float) -> None:
+        if self._tiles:
+            for z in range(MAX_ZOOM + 1):
+                n = 1 << z
+                self._tiles.pop((z, int(x * n), int(y * n)), None)
+
+    # --- Queries ---
+
+    def tile(self, z: int, x: int, y: int) -> bytes:
+        """JSON payload of the clusters and pins in tile (z, x, y), cached."""
+        key = (z, x, y)
+        payload = self._tiles.get(key)
+        if payload is not None:
+            self._tiles.move_to_end(key)
+            metrics.CLUSTER_TILES.inc(outcome="hit")
+            return payload
+        metrics.CLUSTER_TILES.inc(outcome="miss")
+        payload = json.dumps(self.features(z, x, y), separators=(",", ":")).encode()
+        if self.cache_size > 0:
+            self._tiles[key] = payload
+            if len(self._tiles) > self.cache_size:
+                self._tiles.popitem(last=False)
+        return payload
+
+    def features(self, z: int, x: int, y: int) -> dict:
+        if z > CLUSTER_MAX_ZOOM:
+            return {"clusters": [], "pins": self._tile_pins(z, x, y)}
+        clusters, pins = [], []
+        level = self.levels[z]
+        for cx in range(x * CELLS_PER_TILE, (x + 1) * CELLS_PER_TILE):
+            for cy in range(y * CELLS_PER_TILE, (y + 1) * CELLS_PER_TILE):
+                cell = level.get(cx << 32 | cy)
+                if cell is None:
+                    continue
+                if cell.count == 1:
+                    pins.append(self._pin(cell.id_sum))
+                    continue
+                lat, lng = unproject(cell.sx / cell.count, cell.sy / cell.count)
+                clusters.append({
+                    "lat": lat,
+                    "lng": lng,
+                    "count": cell.count,
+                    "drafts": cell.drafts,
+                    "expand": self.expansion_zoom(z, cx, cy),
+                })
+        return {"clusters": clusters, "pins": pins}
+
+    def expansion_zoom(self, z: int, cx: int, cy: int) -> int:
+        """First zoom at which the cluster in cell (cx, cy) splits up."""
+        cells = [(cx, cy)]
+        for zoom in range(z + 1, CLUSTER_MAX_ZOOM + 1):
+            level = self.levels[zoom]
+            cells = [
+                (2 * px + dx, 2 * py + dy)
+                for px, py in cells
+                for dx in (0, 1)
+                for dy in (0, 1)
+                if (2 * px + dx) << 32 | (2 * py + dy) in level
+            ]
+            if len(cells) > 1:
+                return zoom
+        return CLUSTER_MAX_ZOOM + 1
+
+    def _tile_pins(self, z: int, x: int, y: int) -> list[dict]:
+        n = CELLS_PER_TILE << CLUSTER_MAX_ZOOM
+        # Finest cells overlapping this tile (one, unless the tile is just past clustering)
+        lo_x, hi_x = (x * n) >> z, ((x + 1) * n - 1) >> z
+        lo_y, hi_y = (y * n) >> z, ((y + 1) * n - 1) >> z
+        scale = 1 << z
+        pins = []
+        for cx in range(lo_x, hi_x + 1):
+            for cy in range(lo_y, hi_y + 1):
+                for pin_id in self.leaves.get(cx << 32 | cy, ()):
+                    px, py = self.pins[pin_id][:2]
+                    if int(px * scale) == x and int(py * scale) == y:
+                        pins.append(self._pin(pin_id))
+        return pins
+
+    def _pin(self, pin_id: int) -> dict:
+        _, _, lat, lng, name, category, status = self.pins[pin_id]
+        return {"id": pin_id, "lat": lat, "lng": lng, "name": name, "category": category, "status": status}
+
+
+index = ClusterIndex()
+
+
+def _on_event(event: events.Event) -> None:
+    if event.name == "pins":
+        index.apply(event.data)
+
+
+events.broker.add_listener(_on_event)
@@ -0,0 +1,160 @@
+from __future__ import annotations
+
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import Subquery, bindparam, func, select, text, union_all
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import ChatMessage, ChatUsage
+from app.models.chat import current_conversation
+
+# Works on SQLite and PostgreSQL alike
+_NEXT_CONVERSATION = text(
+    "INSERT INTO data_versions (name, version) VALUES ('conversation', 1) "
+    "ON CONFLICT (name) DO UPDATE SET version = data_versions.version + 1"
+)
+
+# Adds the accounting of messages about to leave chat_messages to their
+# conversation's day in chat_usage. Works on SQLite and PostgreSQL alike;
+# the CASEs keep the larger or smaller value without GREATEST/LEAST, whose
+# NULL handling differs between the two.
+_ROLL_UP = text("""
+INSERT INTO chat_usage (conversation_id, day, messages, llm_calls, input_tokens, output_tokens,
+                        cached_tokens, latency_ms, max_latency_ms, first_at, last_at)
+SELECT conversation_id, date(created_at), count(*), count(latency_ms),
+       coalesce(sum(input_tokens), 0), coalesce(sum(output_tokens), 0), coalesce(sum(cached_tokens), 0),
+       coalesce(sum(latency_ms), 0), max(latency_ms), min(created_at), max(created_at)
+FROM chat_messages
+WHERE id IN :ids
+GROUP BY conversation_id, date(created_at)
+ON CONFLICT (conversation_id, day) DO UPDATE SET
+    messages = chat_usage.messages + excluded.messages,
+    llm_calls = chat_usage.llm_calls + excluded.llm_calls,
+    input_tokens = chat_usage.input_tokens + excluded.input_tokens,
+    output_tokens = chat_usage.output_tokens + excluded.output_tokens,
+    cached_tokens = chat_usage.cached_tokens + excluded.cached_tokens,
+    latency_ms = chat_usage.latency_ms + excluded.latency_ms,
+    max_latency_ms = CASE WHEN excluded.max_latency_ms IS NULL
+                           OR chat_usage.max_latency_ms >= excluded.max_latency_ms
+                          THEN chat_usage.max_latency_ms ELSE excluded.max_latency_ms END,
+    first_at = CASE WHEN chat_usage.first_at <= excluded.first_at
+                    THEN chat_usage.first_at ELSE excluded.first_at END,
+    last_at = CASE WHEN chat_usage.last_at >= excluded.last_at
+                   THEN chat_usage.last_at ELSE excluded.last_at END
+""").bindparams(bindparam("ids", expanding=True))
+
+
+def _usage_rows(since: datetime | None = None) -> Subquery:
+    """LLM accounting per conversation and UTC day: messages still in
+    ``chat_messages`` plus those rolled up into ``chat_usage``. A day can
+    appear in both; callers sum over it.
+
+    Only assistant messages from a model call have latency_ms set, so
+    counting it counts the calls.
+    """
+    day = func.date(ChatMessage.created_at)
+    live = (
+        select(
+            ChatMessage.conversation_id,
+            day.label("day"),
+            func.count().label("messages"),
+            func.count(ChatMessage.latency_ms).label("llm_calls"),
+            func.coalesce(func.sum(ChatMessage.input_tokens), 0).label("input_tokens"),
+            func.coalesce(func.sum(ChatMessage.output_tokens), 0).label("output_tokens"),
+            func.coalesce(func.sum(ChatMessage.cached_tokens), 0).label("cached_tokens"),
+            func.coalesce(func.sum(ChatMessage.latency_ms), 0).label("latency_ms"),
+            func.max(ChatMessage.latency_ms).label("max_latency_ms"),
+            func.min(ChatMessage.created_at).label("first_at"),
+            func.max(ChatMessage.created_at).label("last_at"),
+        )
+        .group_by(ChatMessage.conversation_id, day)
+    )
+    rolled_up = select(
+        ChatUsage.conversation_id, ChatUsage.day, ChatUsage.messages, ChatUsage.llm_calls,
+        ChatUsage.input_tokens, ChatUsage.output_tokens, ChatUsage.cached_tokens, ChatUsage.latency_ms,
+        ChatUsage.max_latency_ms, ChatUsage.first_at, ChatUsage.last_at,
+    )
+    if since is not None:
+        live = live.where(ChatMessage.created_at >= since)
+        rolled_up = rolled_up.where(ChatUsage.day >= since.date())
+    return union_all(live, rolled_up).subquery()
+
+
+def _totals(rows: Subquery) -> tuple:
+    return (
+        func.sum(rows.c.messages).label("messages"),
+        func.sum(rows.c.llm_calls).label("llm_calls"),
+        func.sum(rows.c.input_tokens).label("input_tokens"),
+        func.sum(rows.c.output_tokens).label("output_tokens"),
+        func.sum(rows.c.cached_tokens).label("cached_tokens"),
+        func.sum(rows.c.latency_ms).label("latency_ms"),
+        func.max(rows.c.max_latency_ms).label("max_latency_ms"),
+    )
+
+
+def _usage(row) -> dict:
+    usage = {
+        "messages": row.messages,
+        "llm_calls": row.llm_calls,
+        "input_tokens": row.input_tokens,
+        "output_tokens": row.output_tokens,
+        "cached_tokens": row.cached_tokens,
+        "latency_ms": row.latency_ms,
+        "max_latency_ms": row.max_latency_ms,
+    }
+    usage["avg_latency_ms"] = round(row.latency_ms / row.llm_calls) if row.llm_calls else None
+    return usage
+
+
+async def start_new(db: AsyncSession) -> None:
+    """End the current conversation; new messages go to the next one. The caller commits.
+
+    The old conversation's messages leave the history but stay in the
+    table until the archiver moves them out.
+    """
+    await db.execute(_NEXT_CONVERSATION)
+
+
+async def roll_up(db: AsyncSession, message_ids: list[int]) -> None:
+    """Add these messages' LLM accounting to ``chat_usage``, before they are deleted.
+
+    Runs in the caller's transaction, so it lands if and only if the delete does.
+    """
+    if message_ids:
+        await db.execute(_ROLL_UP, {"ids": message_ids})
+
+
+async def usage_by_day(db: AsyncSession, days: int = 30) -> list[dict]:
+    """LLM usage per UTC day over the last ``days`` days, oldest first."""
+    since = datetime.now(timezone.utc).replace(tzinfo=None, hour=0, minute=0, second=0, microsecond=0)
+    since -= timedelta(days=days - 1)
+    rows = _usage_rows(since)
+    result = await db.execute(select(rows.c.day, *_totals(rows)).group_by(rows.c.day).order_by(rows.c.day))
+    return [{"day": str(row.day), **_usage(row)} for row in result]
+
+
+async def usage_by_conversation(db: AsyncSession, limit: int = 50) -> list[dict]:
+    """LLM usage per conversation, latest first."""
+    current = await db.scalar(select(current_conversation()))
+    rows = _usage_rows()
+    result = await db.execute(
+        select(
+            rows.c.conversation_id,
+            func.min(rows.c.first_at).label("started_at"),
+            func.max(rows.c.last_at).label("last_at"),
+            *_totals(rows),
+        )
+        .group_by(rows.c.conversation_id)
+        .order_by(rows.c.conversation_id.desc())
+        .limit(limit)
+    )
+    return [
+        {
+            "conversation_id": row.conversation_id,
+            "current": row.conversation_id == current,
+            "started_at": row.started_at,
+            "last_at": row.last_at,
+            **_usage(row),
+        }
+        for row in result
+    ]
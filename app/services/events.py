@@ -0,0 +1,107 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+from collections.abc import Callable
+from dataclasses import dataclass, field
+
+from fastapi import Request
+
+from app.models import ChatMessage, Pin
+from app.services.read_models import PinRow
+
+logger = logging.getLogger(__name__)
+
+# Header each browser tab sends with its own requests, so it can ignore the
+# echo of changes it caused itself.
+CLIENT_HEADER = "X-Karte-Client"
+
+
+@dataclass
+class Event:
+    name: str
+    data: dict = field(default_factory=dict)
+    origin: str | None = None
+
+    def encode(self) -> str:
+        """Format as a Server-Sent Events frame."""
+        payload = json.dumps({**self.data, "origin": self.origin})
+        return f"event: {self.name}\ndata: {payload}\n\n"
+
+
+class Broker:
+    """In-process pub/sub for pin and chat message changes.
+
+    Subscribers get a bounded asyncio.Queue each (one per SSE connection).
+    Listeners are plain callables invoked synchronously on publish, for
+    in-process consumers such as caches.
+    """
+
+    def __init__(self, maxsize: int = 256):
+        self.maxsize = maxsize
+        self._subscribers: set[asyncio.Queue[Event]] = set()
+        self._listeners: list[Callable[[Event], None]] = []
+
+    def subscribe(self) -> asyncio.Queue[Event]:
+        q: asyncio.Queue[Event] = asyncio.Queue(maxsize=self.maxsize)
+        self._subscribers.add(q)
+        return q
+
+    def unsubscribe(self, q: asyncio.Queue[Event]) -> None:
+        self._subscribers.discard(q)
+
+    def add_listener(self, fn: Callable[[Event], None]) -> None:
+        self._listeners.append(fn)
+
+    def remove_listener(self, fn: Callable[[Event], None]) -> None:
+        self._listeners.remove(fn)
+
+    def publish(self, name: str, data: dict, origin: str | None = None) -> None:
+        event = Event(name, data, origin)
+        for fn in list(self._listeners):
+            try:
+                fn(event)
+            except Exception:
+                logger.exception("Event listener %r failed on %s", fn, name)
+        for q in list(self._subscribers):
+            if q.full():
+                # A slow client loses its oldest event rather than stalling writers
+                q.get_nowait()
+            q.put_nowait(event)
+
+
+broker = Broker()
+
+
+def client_id(request: Request) -> str | None:
+    return request.headers.get(CLIENT_HEADER)
+
+
+def pin_data(pin: Pin) -> dict:
+    # The same shape as the JSON API's pins
+    return PinRow.from_pin(pin).to_dict()
+
+
+def publish_pin(action: str, pin: Pin, origin: str | None = None) -> None:
+    """Publish a ``pins`` event for a created or updated pin."""
+    broker.publish("pins", {"action": action, "pin": pin_data(pin)}, origin)
+
+
+def publish_pins_restored(rows: list[PinRow], origin: str | None = None) -> None:
+    """Publish a ``created`` event for each undeleted pin."""
+    for row in rows:
+        broker.publish("pins", {"action": "created", "pin": row.to_dict()}, origin)
+
+
+def publish_pins_deleted(ids: list[int], origin: str | None = None) -> None:
+    if ids:
+        broker.publish("pins", {"action": "deleted", "ids": ids}, origin)
+
+
+def publish_message(msg: ChatMessage, origin: str | None = None) -> None:
+    broker.publish("messages", {"action": "created", "id": msg.id, "role": msg.role}, origin)
+
+
+def publish_messages_cleared(origin: str | None = None) -> None:
+    broker.publish("messages", {"action": "cleared"}, origin)
@@ -0,0 +1,134 @@
+from __future__ import annotations
+
+import csv
+import logging
+import re
+import sqlite3
+import unicodedata
+from collections.abc import Iterable
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+_TOKEN_RE = re.compile(r"\w+")
+# Queries matching more places than this are too vague to answer locally
+MAX_CANDIDATES = 20
+
+_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS places USING fts5(
+    name, address, lat UNINDEXED, lng UNINDEXED,
+    tokenize = 'unicode61 remove_diacritics 2'
+);
+CREATE TABLE IF NOT EXISTS place_keys (
+    key TEXT PRIMARY KEY,
+    place_id INTEGER NOT NULL
+) WITHOUT ROWID;
+"""
+
+
+def normalize(text: str) -> str:
+    """Lowercase, strip accents and punctuation: "Av. São João" -> "av sao joao"."""
+    text = text.lower()
+    if not text.isascii():
+        text = "".join(c for c in unicodedata.normalize("NFKD", text) if not unicodedata.combining(c))
+    return " ".join(_TOKEN_RE.findall(text))
+
+
+class Gazetteer:
+    """Offline geocoder over a local list of place names and addresses.
+
+    An address that exactly matches a place's name, address or both
+    (after normalize()) is a primary-key lookup. Anything else is a
+    full-text query against an SQLite FTS5 table. Every word must match,
+    and the query must match at most MAX_CANDIDATES places. Vague
+    queries are left for the next backend, and ranking stays cheap.
+    Candidates are ranked by bm25, with name matches weighted above
+    address matches.
+    """
+
+    name = "gazetteer"
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[tuple[str, str, float, float]]) -> Gazetteer:
+        """Build an in-memory gazetteer from (name, address, lat, lng) tuples."""
+        conn = sqlite3.connect(":memory:", check_same_thread=False)
+        conn.executescript(_SCHEMA)
+        places = [(place_id, *row) for place_id, row in enumerate(rows, start=1)]
+        conn.executemany("INSERT INTO places (rowid, name, address, lat, lng) VALUES (?, ?, ?, ?, ?)", places)
+        keys = []
+        for place_id, name, address, _, _ in places:
+            name_key, address_key = normalize(name), normalize(address)
+            for key in {name_key, address_key, f"{name_key} {address_key}".strip()}:
+                if key:
+                    keys.append((key, place_id))
+        # First place wins when two share a key
+        conn.executemany("INSERT OR IGNORE INTO place_keys (key, place_id) VALUES (?, ?)", keys)
+        conn.commit()
+        return cls(conn)
+
+    @classmethod
+    def from_file(cls, path: str | Path) -> Gazetteer:
+        """Load a CSV (``name``, ``address``, ``lat``, ``lng``/``lon``) or a file written by save().
+
+        SQLite files (``.db``/``.sqlite``) are opened read-only; CSV rows
+        with bad coordinates are skipped.
+        """
+        path = Path(path)
+        if path.suffix in (".db", ".sqlite", ".sqlite3"):
+            conn = sqlite3.connect(f"{path.resolve().as_uri()}?mode=ro", uri=True, check_same_thread=False)
+            return cls(conn)
+
+        rows = []
+        with open(path, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                try:
+                    lat = float(row["lat"])
+                    lng = float(row.get("lng") or row["lon"])
+                except (KeyError, TypeError, ValueError):
+                    continue
+                name = (row.get("name") or "").strip()
+                address = (row.get("address") or "").strip()
+                if name or address:
+                    rows.append((name, address, lat, lng))
+        return cls.from_rows(rows)
+
+    def save(self, path: str | Path) -> None:
+        """Write the index to an SQLite file that from_file() can open directly."""
+        with sqlite3.connect(path) as dest:
+            self.conn.backup(dest)
+        dest.close()
+
+    def __len__(self) -> int:
+        return self.conn.execute("SELECT count(*) FROM places").fetchone()[0]
+
+    def lookup(self, address: str) -> dict | None:
+        key = normalize(address)
+        if not key:
+            return None
+
+        row = self.conn.execute(
+            "SELECT p.name, p.address, p.lat, p.lng FROM place_keys k JOIN places p ON p.rowid = k.place_id"
+            " WHERE k.key = ?",
+            (key,),
+        ).fetchone()
+        if row is None:
+            query = " ".join(f'"{token}"' for token in key.split())
+            # No ORDER BY, so FTS5 stops after MAX_CANDIDATES + 1 matches instead of ranking all of them
+            rows = self.conn.execute(
+                "SELECT bm25(places, 2.0, 1.0), name, address, lat, lng FROM places WHERE places MATCH ? LIMIT ?",
+                (query, MAX_CANDIDATES + 1),
+            ).fetchall()
+            if not rows or len(rows) > MAX_CANDIDATES:
+                return None
+            row = min(rows)[1:]
+
+        name, place_address, lat, lng = row
+        formatted = ", ".join(part for part in (name, place_address) if part)
+        return {"lat": float(lat), "lng": float(lng), "formatted_address": formatted}
+
+    async def geocode(self, address: str) -> dict | None:
+        # Runs inline: lookups are sub-millisecond
+        return self.lookup(address)
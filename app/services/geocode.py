@@ -1,37 +1,341 @@
 from __future__ import annotations
 
+import asyncio
 import logging
+import random
+import time
+from collections import OrderedDict
+from collections.abc import Awaitable, Callable
+from dataclasses import dataclass
+from typing import Protocol
 
 import httpx
 
 from app.core import config
+from app.services import metrics
+from app.services.gazetteer import Gazetteer
 
 logger = logging.getLogger(__name__)
 
+GEOCODE_URL = "https://maps.googleapis.com/maps/api/geocode/json"
+BACKOFF_CAP = 8.0  # seconds
 
-def geocode(address: str) -> dict | None:
+
+class GeocodeError(Exception):
+    """A lookup failed (as opposed to finding nothing)."""
+
+
+class OverQueryLimit(GeocodeError):
+    """The geocoding provider rejected a request for exceeding its quota."""
+
+
+Lookup = Callable[[str], Awaitable["dict | None"]]
+
+
+class Geocoder(Protocol):
+    """A geocoding backend: resolves an address or returns None."""
+
+    name: str
+
+    async def geocode(self, address: str) -> dict | None: ...
+
+
+_client: httpx.AsyncClient | None = None
+
+
+def _http() -> httpx.AsyncClient:
+    """The client every Google lookup shares, so connections and TLS sessions are reused."""
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(timeout=10)
+    return _client
+
+
+async def close() -> None:
+    """Close the shared client (at shutdown); a later lookup opens a new one."""
+    global _client
+    client, _client = _client, None
+    if client is not None:
+        await client.aclose()
+
+
+async def google_lookup(address: str) -> dict | None:
     """Geocode an address using Google Maps Geocoding API.
 
     Returns {"lat": float, "lng": float, "formatted_address": str} or None.
+    Raises OverQueryLimit when Google reports a quota error.
     """
-    try:
-        resp = httpx.get(
-            "https://maps.googleapis.com/maps/api/geocode/json",
-            params={"address": address, "key": config.GOOGLE_MAPS_API_KEY},
-            timeout=10,
+    with metrics.span("geocode"):
+        resp = await _http().get(GEOCODE_URL, params={"address": address, "key": config.GOOGLE_MAPS_API_KEY})
+    data = resp.json()
+    status = data.get("status")
+    if status == "OVER_QUERY_LIMIT":
+        raise OverQueryLimit(data.get("error_message") or status)
+    if status != "OK" or not data.get("results"):
+        logger.warning("Geocoding failed for %r: %s", address, status)
+        return None
+
+    result = data["results"][0]
+    loc = result["geometry"]["location"]
+    return {
+        "lat": loc["lat"],
+        "lng": loc["lng"],
+        "formatted_address": result.get("formatted_address", address),
+    }
+
+
+def address_key(address: str) -> str:
+    """Case- and whitespace-insensitive key for coalescing and caching."""
+    return " ".join(address.lower().split())
+
+
+class TokenBucket:
+    """Async token bucket: ``rate`` tokens per second, up to ``burst`` saved up.
+
+    Callers over the limit reserve a future token and sleep until it is due,
+    so a burst turns into a queue instead of being rejected.
+    """
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+
+    async def acquire(self) -> None:
+        if self.rate <= 0:
+            return
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        # No await between reading and taking the token, so this is race-free on one loop
+        self._tokens -= 1
+        if self._tokens < 0:
+            await asyncio.sleep(-self._tokens / self.rate)
+
+
+class GeocodeScheduler:
+    """Rate-limited, coalescing front end for a geocoding lookup.
+
+    Identical addresses that are already in flight share one upstream call.
+    Every upstream call takes a token from the bucket, and quota errors are
+    retried with full-jitter exponential backoff. Raises GeocodeError when
+    retries run out or the lookup fails.
+    """
+
+    def __init__(
+        self,
+        lookup: Lookup = google_lookup,
+        qps: float | None = None,
+        burst: int | None = None,
+        max_retries: int | None = None,
+        backoff: float | None = None,
+        name: str = "google",
+    ):
+        self.name = name
+        self.lookup = lookup
+        self.bucket = TokenBucket(
+            config.GEOCODE_QPS if qps is None else qps,
+            config.GEOCODE_BURST if burst is None else burst,
         )
-        data = resp.json()
-        if data.get("status") != "OK" or not data.get("results"):
-            logger.warning("Geocoding failed for %r: %s", address, data.get("status"))
-            return None
-
-        result = data["results"][0]
-        loc = result["geometry"]["location"]
-        return {
-            "lat": loc["lat"],
-            "lng": loc["lng"],
-            "formatted_address": result.get("formatted_address", address),
-        }
-    except Exception:
-        logger.exception("Geocoding error for %r", address)
+        self.max_retries = config.GEOCODE_MAX_RETRIES if max_retries is None else max_retries
+        self.backoff = config.GEOCODE_BACKOFF if backoff is None else backoff
+        self._inflight: dict[str, asyncio.Future] = {}
+
+    async def geocode(self, address: str) -> dict | None:
+        key = address_key(address)
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._resolve(address))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            metrics.GEOCODE_REQUESTS.inc(outcome="coalesced")
+        # Shield so one cancelled caller doesn't cancel the lookup for the others
+        return await asyncio.shield(task)
+
+    async def _resolve(self, address: str) -> dict | None:
+        attempt = 0
+        while True:
+            await self.bucket.acquire()
+            try:
+                result = await self.lookup(address)
+            except OverQueryLimit:
+                metrics.GEOCODE_REQUESTS.inc(outcome="over_query_limit")
+                if attempt == self.max_retries:
+                    logger.warning("Geocoding quota still exceeded for %r after %d attempts", address, attempt + 1)
+                    raise
+                await asyncio.sleep(random.uniform(0, min(BACKOFF_CAP, self.backoff * 2**attempt)))
+                attempt += 1
+                continue
+            except Exception as exc:
+                logger.exception("Geocoding error for %r", address)
+                metrics.GEOCODE_REQUESTS.inc(outcome="error")
+                raise GeocodeError(f"{type(exc).__name__}: {exc}") from exc
+            metrics.GEOCODE_REQUESTS.inc(outcome="ok" if result else "not_found")
+            return result
+
+
+class ChainGeocoder:
+    """Try each backend in order and return the first hit.
+
+    A backend that raises is skipped, so a broken local source falls
+    through to the network. If nothing matched and any backend failed,
+    the last failure is raised as a GeocodeError.
+    """
+
+    name = "chain"
+
+    def __init__(self, backends: list[Geocoder]):
+        self.backends = backends
+
+    async def geocode(self, address: str) -> dict | None:
+        error: GeocodeError | None = None
+        for backend in self.backends:
+            try:
+                result = await backend.geocode(address)
+            except GeocodeError as exc:
+                error = exc  # already logged by the backend
+                continue
+            except Exception as exc:
+                logger.exception("Geocoder %s failed for %r", backend.name, address)
+                error = GeocodeError(f"{backend.name}: {type(exc).__name__}: {exc}")
+                continue
+            if result:
+                metrics.GEOCODE_RESOLVED.inc(backend=backend.name)
+                return result
+        metrics.GEOCODE_RESOLVED.inc(backend="none")
+        if error is not None:
+            raise error
         return None
+
+
+class GeocodeCache:
+    """LRU of recent results with expiry; misses are kept for a shorter time."""
+
+    def __init__(self, size: int, ttl: float, miss_ttl: float):
+        self.size = size
+        self.ttl = ttl
+        self.miss_ttl = miss_ttl
+        self._entries: OrderedDict[str, tuple[float, dict | None]] = OrderedDict()
+
+    def get(self, address: str) -> tuple[bool, dict | None]:
+        """Return (found, result) so a cached miss can be told apart from no entry."""
+        key = address_key(address)
+        entry = self._entries.get(key)
+        if entry is None:
+            return False, None
+        expires, result = entry
+        if expires < time.monotonic():
+            del self._entries[key]
+            return False, None
+        self._entries.move_to_end(key)
+        return True, result
+
+    def put(self, address: str, result: dict | None) -> None:
+        if self.size <= 0:
+            return
+        key = address_key(address)
+        self._entries[key] = (time.monotonic() + (self.ttl if result else self.miss_ttl), result)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+scheduler = GeocodeScheduler()
+geocoder: Geocoder = ChainGeocoder([scheduler])
+cache = GeocodeCache(config.GEOCODE_CACHE_SIZE, config.GEOCODE_CACHE_TTL, config.GEOCODE_CACHE_MISS_TTL)
+
+
+def build_geocoder(names: str | None = None, gazetteer_file: str | None = None) -> Geocoder:
+    """Build the backend chain named in ``names`` (default: GEOCODER).
+
+    Without an explicit list, the gazetteer is tried before Google
+    whenever GAZETTEER_FILE is set.
+    """
+    gazetteer_file = config.GAZETTEER_FILE if gazetteer_file is None else gazetteer_file
+    names = config.GEOCODER if names is None else names
+    if not names:
+        names = "gazetteer,google" if gazetteer_file else "google"
+
+    backends: list[Geocoder] = []
+    for name in (n.strip() for n in names.split(",") if n.strip()):
+        if name == "google":
+            backends.append(scheduler)
+        elif name == "gazetteer":
+            if not gazetteer_file:
+                raise ValueError("The gazetteer geocoder needs GAZETTEER_FILE to be set")
+            gazetteer = Gazetteer.from_file(gazetteer_file)
+            logger.info("Loaded %d gazetteer places from %s", len(gazetteer), gazetteer_file)
+            backends.append(gazetteer)
+        else:
+            raise ValueError(f"Unknown geocoder {name!r}. Supported: gazetteer, google")
+    return ChainGeocoder(backends)
+
+
+def configure(names: str | None = None, gazetteer_file: str | None = None) -> Geocoder:
+    """Replace the module-level geocoder with one built from config."""
+    global geocoder
+    geocoder = build_geocoder(names, gazetteer_file)
+    return geocoder
+
+
+async def _cached_geocode(address: str) -> dict | None:
+    found, result = cache.get(address)
+    if found:
+        metrics.GEOCODE_RESOLVED.inc(backend="cache")
+        return result
+    result = await geocoder.geocode(address)  # errors propagate and are not cached
+    cache.put(address, result)
+    return result
+
+
+async def geocode(address: str) -> dict | None:
+    """Geocode an address with the configured backends.
+
+    Returns {"lat": float, "lng": float, "formatted_address": str} or None.
+    """
+    try:
+        return await _cached_geocode(address)
+    except GeocodeError:
+        return None
+
+
+@dataclass(slots=True)
+class BatchResult:
+    address: str
+    result: dict | None = None
+    error: str | None = None  # "not_found", or why the lookup failed
+
+
+async def geocode_many(addresses: list[str], concurrency: int | None = None) -> list[BatchResult]:
+    """Geocode several addresses at once, returning one BatchResult per input, in order.
+
+    Duplicates (ignoring case and spacing) are looked up once. Cached
+    results are answered without a lookup. The rest run concurrently,
+    at most ``concurrency`` at a time (default: GEOCODE_BATCH_CONCURRENCY).
+    Google lookups still share the scheduler's rate limit.
+    """
+    limit = asyncio.Semaphore(config.GEOCODE_BATCH_CONCURRENCY if concurrency is None else concurrency)
+    unique = {address_key(a): a for a in reversed(addresses)}  # first spelling wins
+
+    async def _one(address: str) -> BatchResult:
+        async with limit:
+            try:
+                result = await _cached_geocode(address)
+            except GeocodeError as exc:
+                return BatchResult(address, error=str(exc) or type(exc).__name__)
+        return BatchResult(address, result, None if result else "not_found")
+
+    keys = list(unique)
+    done = dict(zip(keys, await asyncio.gather(*(_one(unique[k]) for k in keys))))
+    return [
+        BatchResult(a, done[address_key(a)].result, done[address_key(a)].error)
+        for a in addresses
+    ]
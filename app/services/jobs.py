@@ -0,0 +1,213 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from collections.abc import Awaitable, Callable
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.core import config
+from app.db.session import async_session
+from app.models import Job, JobStatus
+
+logger = logging.getLogger(__name__)
+
+JobHandler = Callable[[AsyncSession, dict], Awaitable[dict | None]]
+
+_handlers: dict[str, JobHandler] = {}
+
+
+def handler(kind: str) -> Callable[[JobHandler], JobHandler]:
+    """Register a coroutine as the handler for jobs of the given kind.
+
+    Handlers receive their own session and the job payload, and return a
+    JSON-serializable result dict (or None) that is stored on the job row.
+    """
+
+    def decorator(fn: JobHandler) -> JobHandler:
+        _handlers[kind] = fn
+        return fn
+
+    return decorator
+
+
+async def pending_job_ids(db: AsyncSession) -> list[int]:
+    """Return ids of jobs that have not finished yet, oldest first."""
+    result = await db.execute(
+        select(Job.id)
+        .where(Job.status.in_([JobStatus.pending, JobStatus.running]))
+        .order_by(Job.id)
+    )
+    return list(result.scalars().all())
+
+
+def _utcnow() -> datetime:
+    # Naive UTC with microseconds, like the recovery cutoff it is compared with
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+class JobQueue:
+    """In-process asyncio worker pool fed from the persistent ``jobs`` table.
+
+    Jobs are committed to the database before they are queued, so anything
+    still pending (or interrupted mid-run) is picked up again by ``start()``
+    after a restart.
+
+    Each run first claims its job with a conditional UPDATE, so when several
+    worker processes share the table a job runs once, in whichever process
+    claims it. With JOB_RECOVER_AFTER set, that claim is a lease: while the
+    handler runs, its worker touches ``updated_at`` every third of that
+    interval, and a running job is only taken as interrupted once it has
+    gone JOB_RECOVER_AFTER seconds without a touch (its process is gone).
+    The check repeats every JOB_RECOVER_AFTER seconds.
+    """
+
+    def __init__(self, session_factory: async_sessionmaker, workers: int | None = None):
+        self.session_factory = session_factory
+        self.workers = workers if workers is not None else config.JOB_WORKERS
+        self._queue: asyncio.Queue[int] | None = None
+        self._tasks: list[asyncio.Task] = []
+
+    async def start(self) -> None:
+        self._queue = asyncio.Queue()
+        recovered = await self.recover(config.JOB_RECOVER_AFTER)
+        if recovered:
+            logger.info("Recovered %d pending job(s)", recovered)
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        if config.JOB_RECOVER_AFTER > 0:
+            self._tasks.append(asyncio.create_task(self._recover_stale(config.JOB_RECOVER_AFTER)))
+
+    async def recover(self, stale_after: float = 0) -> int:
+        """Queue the pending jobs and reset interrupted ones. Returns how many were queued.
+
+        With ``stale_after`` (seconds) only jobs untouched for that long, so
+        running jobs whose lease has lapsed, are taken; otherwise every
+        pending or running job is.
+        """
+        async with self.session_factory() as db:
+            reset = update(Job).where(Job.status == JobStatus.running)
+            waiting = select(Job.id).where(Job.status == JobStatus.pending).order_by(Job.id)
+            if stale_after > 0:
+                cutoff = _utcnow() - timedelta(seconds=stale_after)
+                reset = reset.where(Job.updated_at < cutoff)
+                waiting = waiting.where(Job.updated_at < cutoff)
+            pending = set((await db.execute(waiting)).scalars())
+            # Resetting touches updated_at, so these are collected as they are reset
+            pending.update((await db.execute(reset.values(status=JobStatus.pending).returning(Job.id))).scalars())
+            await db.commit()
+        if self._queue is not None:
+            for job_id in sorted(pending):
+                self._queue.put_nowait(job_id)
+        return len(pending)
+
+    async def _recover_stale(self, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                recovered = await self.recover(interval)
+            except Exception:
+                logger.exception("Job recovery failed")
+                continue
+            if recovered:
+                logger.info("Recovered %d stale job(s)", recovered)
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queue = None
+
+    async def enqueue(self, db: AsyncSession, kind: str, payload: dict) -> Job:
+        """Persist a job and hand it to the workers.
+
+        If the queue is not running the job stays pending in the database
+        and is picked up on the next ``start()``.
+        """
+        if kind not in _handlers:
+            raise ValueError(f"No job handler registered for kind={kind!r}")
+        job = Job(kind=kind, payload=payload, status=JobStatus.pending)
+        db.add(job)
+        await db.commit()
+        if self._queue is not None:
+            self._queue.put_nowait(job.id)
+        return job
+
+    async def join(self) -> None:
+        """Wait until every queued job has been processed."""
+        if self._queue is not None:
+            await self._queue.join()
+
+    async def _worker(self) -> None:
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self.run(job_id)
+            except Exception:
+                logger.exception("Job %d crashed", job_id)
+            finally:
+                self._queue.task_done()
+
+    async def run(self, job_id: int) -> None:
+        async with self.session_factory() as db:
+            # Claim the job: of several workers racing for it, one UPDATE matches
+            claimed = await db.execute(
+                update(Job)
+                .where(Job.id == job_id, Job.status == JobStatus.pending)
+                .values(status=JobStatus.running, attempts=Job.attempts + 1, updated_at=_utcnow())
+            )
+            await db.commit()
+            if claimed.rowcount != 1:
+                return
+            job = await db.get(Job, job_id)
+
+            try:
+                result = await self._handle(db, job)
+            except Exception as exc:
+                logger.exception("Job %d (%s) failed on attempt %d", job.id, job.kind, job.attempts)
+                await db.rollback()
+                await db.refresh(job)
+                job.error = repr(exc)
+                retry = job.attempts < config.JOB_MAX_ATTEMPTS
+                job.status = JobStatus.pending if retry else JobStatus.failed
+                await db.commit()
+                if retry and self._queue is not None:
+                    self._queue.put_nowait(job.id)
+                return
+
+            job.status = JobStatus.done
+            job.result = result
+            job.error = None
+            await db.commit()
+
+    async def _handle(self, db: AsyncSession, job: Job) -> dict | None:
+        """Run the job's handler, renewing its lease meanwhile if JOB_RECOVER_AFTER is set."""
+        lease = config.JOB_RECOVER_AFTER
+        if lease <= 0:
+            return await _handlers[job.kind](db, dict(job.payload))
+        heartbeat = asyncio.create_task(self._heartbeat(job.id, lease / 3))
+        try:
+            return await _handlers[job.kind](db, dict(job.payload))
+        finally:
+            heartbeat.cancel()
+            await asyncio.gather(heartbeat, return_exceptions=True)
+
+    async def _heartbeat(self, job_id: int, interval: float) -> None:
+        """Renew the lease on a running job until cancelled, in a session of its own."""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                async with self.session_factory() as db:
+                    await db.execute(
+                        update(Job)
+                        .where(Job.id == job_id, Job.status == JobStatus.running)
+                        .values(updated_at=_utcnow())
+                    )
+                    await db.commit()
+            except Exception:
+                logger.exception("Heartbeat for job %d failed", job_id)
+
+
+queue = JobQueue(async_session)
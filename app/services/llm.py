@@ -3,11 +3,13 @@ from __future__ import annotations
 import json
 import logging
 import re
+import time
 
 from langchain_core.language_models.chat_models import BaseChatModel
 from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
 
 from app.core import config
+from app.services import metrics
 
 logger = logging.getLogger(__name__)
 
@@ -43,6 +45,11 @@ Actions — append EXACTLY ONE JSON block at the END of your message when needed
    {"action": "move_map", "target": "center", "lat": <latitude>, "lng": <longitude>, "zoom": <2-20>} — center on specific coordinates (use pin coords from map state when user asks to show/go to a specific pin)
    {"action": "move_map", "target": "location", "address": "<place name or address>"} — center on a named place not yet on the map
 
+8. **Find nearby pins**: When the user asks what is near a place or pin, or for the closest pins of some kind:
+   {"action": "nearby", "lat": <latitude>, "lng": <longitude>, "radius": <meters, optional>, "k": <max results, optional>, "category": "<category, optional>"}
+   {"action": "nearby", "address": "<place name or address>", "radius": <meters, optional>, "k": <max results, optional>, "category": "<category, optional>"}
+   Use pin coords from map state for "near <pin>". The matching pins and their distances are appended to your message, so don't compute distances yourself.
+
 Rules:
 - Use actions for pin operations: ADD, REMOVE, CLASSIFY, LIST, or MAP NAVIGATION. For counting, general questions, or conversation, respond with plain text and NO JSON action block.
 - PREFER place_pin whenever possible. Use request_click only as a last resort when no location can be determined.
@@ -51,11 +58,6 @@ Rules:
 - Always respond in the same language the user is using.\
 """
 
-PIN_CATEGORIES = [
-    "school", "health_clinic", "bakery", "supermarket", "pharmacy",
-    "restaurant", "cafe", "bank", "park", "other",
-]
-
 _SUPPORTED_PROVIDERS = ("openai", "anthropic", "google")
 
 
@@ -134,136 +136,212 @@ def _to_langchain_messages(messages: list[dict]) -> list:
     return result
 
 
+def map_state_header(total: int, confirmed: int, drafts: int) -> str:
+    if not total:
+        return "Current map state: The map has no pins yet."
+    return f"Current map state: {total} pin(s) total ({confirmed} confirmed, {drafts} draft)."
+
+
+def map_state_line(lat: float, lng: float, name: str | None, category: str, status: str) -> str:
+    """One pin's line in the map state message."""
+    return f"- [{status}] {name or 'unnamed'} ({category.replace('_', ' ')}) at ({lat:.5f}, {lng:.5f})"
+
+
 def _build_map_state_message(pins: list[dict]) -> str:
     """Build a system message describing the current map state."""
     if not pins:
-        return "Current map state: The map has no pins yet."
-
-    confirmed = [p for p in pins if p.get("status") == "confirmed"]
-    drafts = [p for p in pins if p.get("status") == "draft"]
+        return map_state_header(0, 0, 0)
 
-    lines = [f"Current map state: {len(pins)} pin(s) total ({len(confirmed)} confirmed, {len(drafts)} draft)."]
+    # One pass: count statuses while formatting, without filtered copies of the list
+    confirmed = drafts = 0
+    lines = [""]
     for p in pins:
-        name = p.get("name") or "unnamed"
-        cat = p.get("category", "other").replace("_", " ")
         status = p.get("status", "unknown")
-        lines.append(f"- [{status}] {name} ({cat}) at ({p['lat']:.5f}, {p['lng']:.5f})")
+        if status == "confirmed":
+            confirmed += 1
+        elif status == "draft":
+            drafts += 1
+        lines.append(map_state_line(p["lat"], p["lng"], p.get("name"), p.get("category", "other"), status))
+    lines[0] = map_state_header(len(pins), confirmed, drafts)
 
     return "\n".join(lines)
 
 
-def get_assistant_response(history: list[dict], pins: list[dict] | None = None) -> dict:
+def get_assistant_response(
+    history: list[dict], pins: list[dict] | None = None, map_state: str | None = None
+) -> dict:
     """Call the LLM and return parsed response.
 
+    The map state goes in as ``pins`` to describe, or as an already built
+    ``map_state`` message (see ``PinStore.map_state_message``).
+
     Returns dict with keys:
       - content: str (the assistant message text)
       - request_click: bool (whether the assistant wants a map click)
       - classification: dict | None (category, name, confidence, reasoning)
       - place_pin: dict | None (address, category, name, confidence)
+      - usage: dict of ChatMessage usage columns (tokens as reported by the
+        provider, latency_ms of the model call); None if it never ran
     """
     messages = [{"role": "system", "content": SYSTEM_PROMPT}]
-    if pins is not None:
-        messages.append({"role": "system", "content": _build_map_state_message(pins)})
+    if map_state is None and pins is not None:
+        map_state = _build_map_state_message(pins)
+    if map_state is not None:
+        messages.append({"role": "system", "content": map_state})
     messages.extend(history)
 
+    start = None
     try:
         model = get_chat_model()
         lc_messages = _to_langchain_messages(messages)
-        response = model.invoke(lc_messages)
+        start = time.perf_counter()
+        with metrics.span("llm"):
+            response = model.invoke(lc_messages)
+        latency_ms = round((time.perf_counter() - start) * 1000)
         content = response.content or ""
+        usage = _record_usage(getattr(response, "usage_metadata", None))
     except Exception:
         logger.exception("LLM call failed")
         content = "Sorry, I'm having trouble connecting to my brain right now. Please try again."
-        return {"content": content, "request_click": False, "classification": None, "place_pin": None, "delete_pins": None, "move_map": None, "clear_chat": False}
+        result = _empty_result(content)
+        # A failed call still took time (timeouts especially), but used no reported tokens
+        if start is not None:
+            result["usage"] = {"latency_ms": round((time.perf_counter() - start) * 1000)}
+        return result
+
+    result = _parse_response(content)
+    result["usage"] = {**usage, "latency_ms": latency_ms}
+    return result
 
-    return _parse_response(content)
+
+def _record_usage(usage: dict | None) -> dict:
+    """Count tokens from a LangChain ``usage_metadata`` dict, when the provider reports one.
+
+    Returns them as ChatMessage usage columns, or an empty dict without a report.
+    """
+    if not isinstance(usage, dict):
+        return {}
+    tokens = {
+        "input_tokens": usage.get("input_tokens") or 0,
+        "output_tokens": usage.get("output_tokens") or 0,
+        "cached_tokens": (usage.get("input_token_details") or {}).get("cache_read") or 0,
+    }
+    metrics.LLM_TOKENS.inc(tokens["input_tokens"], kind="input")
+    metrics.LLM_TOKENS.inc(tokens["output_tokens"], kind="output")
+    metrics.LLM_TOKENS.inc(tokens["cached_tokens"], kind="cached")
+    return tokens
+
+
+# Trailing artifacts left before an action block: ```json, ```, json\, json", etc.
+_TRAILING_FENCE_RE = re.compile(r"```(?:json)?\s*\Z")
+_TRAILING_JSON_LABEL_RE = re.compile(r"\bjson\s*\\*\"*\s*\Z")
+# Artifacts are a few characters long, so only the end of the text is searched
+_ARTIFACT_WINDOW = 64
+
+
+def _strip_trailing(pattern: re.Pattern, text: str) -> str:
+    tail_start = max(0, len(text.rstrip()) - _ARTIFACT_WINDOW)
+    match = pattern.search(text, tail_start)
+    return text[: match.start()] if match else text
 
 
 def _clean_content(text: str) -> str:
     """Remove leftover markdown/JSON artifacts from the visible message."""
-    # Remove trailing ```json, ```, json\, json", etc.
-    text = re.sub(r"```(?:json)?\s*$", "", text)
-    text = re.sub(r"\bjson\s*\\*\"*\s*$", "", text)
+    text = _strip_trailing(_TRAILING_FENCE_RE, text)
+    text = _strip_trailing(_TRAILING_JSON_LABEL_RE, text)
     # Remove any remaining orphan backticks at the end
-    text = text.rstrip("`").rstrip()
-    return text
+    return text.rstrip("`").rstrip()
+
+
+def _empty_result(content: str) -> dict:
+    return {"content": content, "request_click": False, "classification": None, "place_pin": None, "delete_pins": None, "list_pins": False, "move_map": None, "nearby": None, "clear_chat": False, "usage": None}
 
 
 def _parse_response(content: str) -> dict:
-    """Extract action JSON from the assistant's response."""
-    result = {"content": content, "request_click": False, "classification": None, "place_pin": None, "delete_pins": None, "list_pins": False, "move_map": None, "clear_chat": False}
+    """Extract action JSON from the assistant's response.
+
+    The action block is the last ``{...}`` in the text. It is located with a
+    single backward scan from the end; any code fence wrapping it is trimmed
+    from the text on either side rather than rewritten across the whole string.
+    """
+    result = _empty_result(content)
+
+    last_brace = content.rfind("}")
+    if last_brace == -1:
+        return result
+    first_brace = content.rfind("{", 0, last_brace)
+    if first_brace == -1:
+        return result
 
-    # Try to find JSON action block in the response
     try:
-        # Strip markdown code fences wrapping JSON (various formats)
-        stripped = re.sub(r"```(?:json)?\s*(\{.*?\})\s*```", r"\1", content, flags=re.DOTALL)
-
-        # Find the last JSON object in the response
-        last_brace = stripped.rfind("}")
-        if last_brace == -1:
-            return result
-
-        first_brace = stripped.rfind("{", 0, last_brace)
-        if first_brace == -1:
-            return result
-
-        json_str = stripped[first_brace : last_brace + 1]
-        action_data = json.loads(json_str)
-
-        if "action" not in action_data:
-            return result
-
-        # Extract clean text before the JSON block, and also after it
-        text_before = stripped[:first_brace]
-        text_after = stripped[last_brace + 1:]
-        clean = _clean_content(text_before)
-        # If there's meaningful text after the JSON, append it
-        after_clean = text_after.strip().rstrip("`").strip()
-        if after_clean:
-            clean = f"{clean}\n{after_clean}" if clean else after_clean
-
-        action = action_data.get("action")
-        if action == "place_pin":
-            result["place_pin"] = {
-                "address": action_data.get("address", ""),
-                "category": action_data.get("category", "other"),
-                "name": action_data.get("name"),
-                "confidence": action_data.get("confidence"),
-            }
-            result["content"] = clean
-        elif action == "request_click":
-            result["request_click"] = True
-            result["content"] = clean
-        elif action == "classify":
-            result["classification"] = {
-                "category": action_data.get("category", "other"),
-                "name": action_data.get("name"),
-                "confidence": action_data.get("confidence"),
-                "reasoning": action_data.get("reasoning"),
-            }
-            result["content"] = clean
-        elif action == "delete_pins":
-            result["delete_pins"] = {
-                "which": action_data.get("which", "all"),
-                "names": action_data.get("names", []),
-            }
-            result["content"] = clean
-        elif action == "list_pins":
-            result["list_pins"] = True
-            result["content"] = clean
-        elif action == "clear_chat":
-            result["clear_chat"] = True
-            result["content"] = clean
-        elif action == "move_map":
-            result["move_map"] = {
-                "target": action_data.get("target", "fit_all"),
-                "lat": action_data.get("lat"),
-                "lng": action_data.get("lng"),
-                "zoom": action_data.get("zoom"),
-                "address": action_data.get("address"),
-            }
-            result["content"] = clean
-    except (json.JSONDecodeError, ValueError):
-        pass
+        action_data = json.loads(content[first_brace : last_brace + 1])
+    except ValueError:  # includes json.JSONDecodeError
+        return result
+    if "action" not in action_data:
+        return result
+
+    # Clean text before the JSON block, plus any meaningful text after it
+    before = content[:first_brace]
+    after = content[last_brace + 1:]
+    unfenced = _strip_trailing(_TRAILING_FENCE_RE, before)
+    if len(unfenced) != len(before) and after.lstrip().startswith("```"):
+        # The block sits in a code fence; drop the closing fence as well
+        after = after.lstrip()[3:]
+    clean = _clean_content(unfenced)
+    after_clean = after.strip().rstrip("`").strip()
+    if after_clean:
+        clean = f"{clean}\n{after_clean}" if clean else after_clean
+
+    action = action_data.get("action")
+    if action == "place_pin":
+        result["place_pin"] = {
+            "address": action_data.get("address", ""),
+            "category": action_data.get("category", "other"),
+            "name": action_data.get("name"),
+            "confidence": action_data.get("confidence"),
+        }
+        result["content"] = clean
+    elif action == "request_click":
+        result["request_click"] = True
+        result["content"] = clean
+    elif action == "classify":
+        result["classification"] = {
+            "category": action_data.get("category", "other"),
+            "name": action_data.get("name"),
+            "confidence": action_data.get("confidence"),
+            "reasoning": action_data.get("reasoning"),
+        }
+        result["content"] = clean
+    elif action == "delete_pins":
+        result["delete_pins"] = {
+            "which": action_data.get("which", "all"),
+            "names": action_data.get("names", []),
+        }
+        result["content"] = clean
+    elif action == "list_pins":
+        result["list_pins"] = True
+        result["content"] = clean
+    elif action == "clear_chat":
+        result["clear_chat"] = True
+        result["content"] = clean
+    elif action == "move_map":
+        result["move_map"] = {
+            "target": action_data.get("target", "fit_all"),
+            "lat": action_data.get("lat"),
+            "lng": action_data.get("lng"),
+            "zoom": action_data.get("zoom"),
+            "address": action_data.get("address"),
+        }
+        result["content"] = clean
+    elif action == "nearby":
+        result["nearby"] = {
+            "lat": action_data.get("lat"),
+            "lng": action_data.get("lng"),
+            "address": action_data.get("address"),
+            "radius": action_data.get("radius"),
+            "k": action_data.get("k") or 5,
+            "category": action_data.get("category"),
+        }
+        result["content"] = clean
 
     return result
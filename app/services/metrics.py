@@ -0,0 +1,247 @@
+from __future__ import annotations
+
+import abc
+import math
+import threading
+import time
+from collections.abc import Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: dict[str, str]) -> str:
+    if not labels:
+        return ""
+    inner = ",".join(f'{k}="{_escape(str(v))}"' for k, v in labels.items())
+    return "{" + inner + "}"
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric(abc.ABC):
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict[str, str]) -> tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def _labels(self, key: tuple[str, ...], **extra: str) -> str:
+        return _format_labels({**dict(zip(self.labelnames, key)), **extra})
+
+    def render(self) -> list[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}", *self._samples()]
+
+    @abc.abstractmethod
+    def _samples(self) -> list[str]:
+        """The metric's sample lines in the text exposition format."""
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...] = ()):
+        super().__init__(name, help, labelnames)
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def _samples(self) -> list[str]:
+        return [f"{self.name}{self._labels(k)} {_format_value(v)}" for k, v in sorted(self._values.items())]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        # key -> [bucket counts..., sum, count]
+        self._values: dict[tuple[str, ...], list[float]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            row = self._values.setdefault(key, [0] * (len(self.buckets) + 2))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    row[i] += 1
+            row[-2] += value
+            row[-1] += 1
+
+    def count(self, **labels: str) -> int:
+        row = self._values.get(self._key(labels))
+        return int(row[-1]) if row else 0
+
+    def _samples(self) -> list[str]:
+        lines = []
+        for key, row in sorted(self._values.items()):
+            for bound, n in zip(self.buckets, row):
+                lines.append(f"{self.name}_bucket{self._labels(key, le=_format_value(bound))} {int(n)}")
+            lines.append(f"{self.name}_sum{self._labels(key)} {_format_value(row[-2])}")
+            lines.append(f"{self.name}_count{self._labels(key)} {int(row[-1])}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        """Render all metrics in the Prometheus text exposition format."""
+        lines: list[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+REQUEST_SECONDS = registry.register(Histogram(
+    "karte_http_request_duration_seconds", "HTTP request latency.", ("method", "route", "status"),
+))
+SPAN_SECONDS = registry.register(Histogram(
+    "karte_span_duration_seconds", "Time spent in instrumented spans (db, llm, geocode).", ("span",),
+))
+LLM_TOKENS = registry.register(Counter(
+    "karte_llm_tokens_total", "LLM tokens by kind (input, output, cached).", ("kind",),
+))
+GEOCODE_REQUESTS = registry.register(Counter(
+    "karte_geocode_requests_total", "Geocoding lookups by outcome.", ("outcome",),
+))
+GEOCODE_RESOLVED = registry.register(Counter(
+    "karte_geocode_resolved_total", "Geocoded addresses by the backend that answered (none for misses).", ("backend",),
+))
+POI_LOOKUPS = registry.register(Counter(
+    "karte_poi_lookups_total", "Map-click lookups in the local places index by outcome.", ("outcome",),
+))
+CLUSTER_TILES = registry.register(Counter(
+    "karte_cluster_tiles_total", "Cluster tile requests by tile cache outcome.", ("outcome",),
+))
+VECTOR_TILES = registry.register(Counter(
+    "karte_vector_tiles_total", "Vector tile requests by disk cache outcome.", ("outcome",),
+))
+PIN_STORE_LOADS = registry.register(Counter(
+    "karte_pin_store_loads_total", "Full reloads of the in-memory pin store (startup or a version mismatch).",
+))
+MAP_STATE = registry.register(Counter(
+    "karte_map_state_total", "Map state prompt builds by cache outcome.", ("outcome",),
+))
+FRAGMENTS = registry.register(Counter(
+    "karte_fragment_cache_total", "Chat message fragments by render cache outcome.", ("outcome",),
+))
+CHAT_ARCHIVED = registry.register(Counter(
+    "karte_chat_archived_total", "Chat messages moved into the compressed archive.",
+))
+PINS_PURGED = registry.register(Counter(
+    "karte_pins_purged_total", "Deleted pins hard-deleted by the background purger.",
+))
+PINS = registry.register(Gauge("karte_pins", "Pins currently stored, by status.", ("status",)))
+
+
+# --- Per-request spans ---
+
+# (span name, seconds) pairs recorded during the current request, if any
+_request_spans: ContextVar[list[tuple[str, float]] | None] = ContextVar("request_spans", default=None)
+
+
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    """Time a block, record it in SPAN_SECONDS and in the current request's spans."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_span(name, time.perf_counter() - start)
+
+
+def record_span(name: str, seconds: float) -> None:
+    SPAN_SECONDS.observe(seconds, span=name)
+    spans = _request_spans.get()
+    if spans is not None:
+        spans.append((name, seconds))
+
+
+def start_request() -> list[tuple[str, float]]:
+    """Begin collecting spans for the current request context."""
+    spans: list[tuple[str, float]] = []
+    _request_spans.set(spans)
+    return spans
+
+
+def server_timing(spans: list[tuple[str, float]], total: float) -> str:
+    """Format collected spans as a Server-Timing header value."""
+    totals: dict[str, list[float]] = {}
+    for name, seconds in spans:
+        acc = totals.setdefault(name, [0.0, 0])
+        acc[0] += seconds
+        acc[1] += 1
+    parts = [f'{name};dur={acc[0] * 1000:.1f};desc="{int(acc[1])}x"' for name, acc in totals.items()]
+    parts.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(parts)
+
+
+# --- Database spans ---
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    starts = conn.info.get("query_start")
+    if starts:
+        record_span("db", time.perf_counter() - starts.pop())
+
+
+@event.listens_for(Engine, "handle_error")
+def _handle_error(context):
+    starts = context.connection.info.get("query_start") if context.connection is not None else None
+    if starts:
+        record_span("db", time.perf_counter() - starts.pop())
@@ -0,0 +1,205 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import shutil
+import tempfile
+from collections.abc import Iterable
+from pathlib import Path
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core import config
+from app.services import metrics, spatial
+from app.services.clusters import project, unproject
+
+logger = logging.getLogger(__name__)
+
+MEDIA_TYPE = "application/vnd.mapbox-vector-tile"
+LAYER = "pins"
+EXTENT = 4096
+# Pins this far past a tile edge (in tile units) are included too, so a dot
+# drawn on the border isn't cut off by the neighbouring tile.
+BUFFER = 64
+# Below this zoom features carry no name: labels would be unreadable there,
+# and unique names are most of a tile's size.
+NAME_MIN_ZOOM = 12
+
+# --- Protocol Buffers encoding (vector_tile.proto, version 2) ---
+
+_VARINT, _LENGTH = 0, 2
+_SMALL = [bytes([i]) for i in range(0x80)]
+# Fixed parts of a point feature: type = POINT, and the MoveTo(1) command
+_POINT_TYPE = b"\x18\x01"
+_MOVE_TO_ONE = b"\x09"
+
+
+def _varint(out: bytearray, value: int) -> None:
+    while value > 0x7F:
+        out.append(value & 0x7F | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _uvarint(value: int) -> bytes:
+    if value < 0x80:
+        return _SMALL[value]
+    out = bytearray()
+    _varint(out, value)
+    return bytes(out)
+
+
+def _zigzag(value: int) -> int:
+    return value << 1 if value >= 0 else (-value << 1) - 1
+
+
+def _tag(out: bytearray, field: int, wire_type: int) -> None:
+    _varint(out, field << 3 | wire_type)
+
+
+def _message(out: bytearray, field: int, body: bytes | bytearray) -> None:
+    _tag(out, field, _LENGTH)
+    _varint(out, len(body))
+    out += body
+
+
+def encode_points(features: Iterable[tuple[int, int, int, dict]], layer: str = LAYER) -> bytes:
+    """One MVT layer of point features given as (id, x, y, attributes).
+
+    ``x`` and ``y`` are in tile units (0..EXTENT). Attributes are strings;
+    None values are left out. Keys and values are shared across features
+    as the format intends. A tile with no features encodes to b"".
+    """
+    keys: dict[str, int] = {}
+    values: dict[str, int] = {}
+    # Encoded tags field per distinct attribute combination; most repeat
+    tag_fields: dict[tuple, bytes] = {}
+    body = bytearray()
+    _tag(body, 15, _VARINT)
+    _varint(body, 2)  # version
+    _message(body, 1, layer.encode())
+    empty = True
+    for feature_id, x, y, attributes in features:
+        empty = False
+        combo = tuple(attributes.items())
+        tags = tag_fields.get(combo)
+        if tags is None:
+            packed = bytearray()
+            for key, value in combo:
+                if value is not None:
+                    _varint(packed, keys.setdefault(key, len(keys)))
+                    _varint(packed, values.setdefault(value, len(values)))
+            tags = tag_fields[combo] = b"\x12" + _uvarint(len(packed)) + packed if packed else b""
+        geometry = _MOVE_TO_ONE + _uvarint(_zigzag(x)) + _uvarint(_zigzag(y))
+        feature = b"".join((b"\x08", _uvarint(feature_id), tags, _POINT_TYPE, b"\x22", _SMALL[len(geometry)], geometry))
+        body += b"\x12"
+        body += _uvarint(len(feature))
+        body += feature
+    if empty:
+        return b""
+    for key in keys:
+        _message(body, 3, key.encode())
+    for value in values:
+        value_msg = bytearray()
+        _message(value_msg, 1, value.encode())  # string_value
+        _message(body, 4, value_msg)
+    _tag(body, 5, _VARINT)
+    _varint(body, EXTENT)
+
+    tile = bytearray()
+    _message(tile, 3, body)
+    return bytes(tile)
+
+
+# --- Tiles ---
+
+
+def tile_bounds(z: int, x: int, y: int, buffer: float = 0.0) -> tuple[float, float, float, float]:
+    """(south, north, west, east) of a tile, grown by ``buffer`` tile widths on each side."""
+    n = 1 << z
+    x0, x1 = (x - buffer) / n, (x + 1 + buffer) / n
+    y0, y1 = max(0.0, (y - buffer) / n), min(1.0, (y + 1 + buffer) / n)
+    north, west = unproject(x0, y0)
+    south, east = unproject(x1, y1)
+    return south, north, max(-180.0, west), min(180.0, east)
+
+
+def encode_tile(rows: Iterable[tuple], z: int, x: int, y: int) -> bytes:
+    """Encode (id, lat, lng, name, category, status) rows that fall in or near tile (z, x, y)."""
+    n = 1 << z
+    named = z >= NAME_MIN_ZOOM
+    features = []
+    for pin_id, lat, lng, name, category, status in rows:
+        mx, my = project(lat, lng)
+        features.append((
+            pin_id,
+            round((mx * n - x) * EXTENT),
+            round((my * n - y) * EXTENT),
+            {"status": status, "category": category, "name": name if named else None},
+        ))
+    return encode_points(features)
+
+
+class TileCache:
+    """Rendered tiles on disk under ``<directory>/<version>/<z>/<x>/<y>.mvt``.
+
+    Writing the first tile of a new version removes the directories of
+    older versions. An empty ``directory`` disables the cache.
+    """
+
+    def __init__(self, directory: str | Path | None):
+        self.directory = Path(directory) if directory else None
+
+    def _path(self, version: int, z: int, x: int, y: int) -> Path:
+        return self.directory / str(version) / str(z) / str(x) / f"{y}.mvt"
+
+    def get(self, version: int, z: int, x: int, y: int) -> bytes | None:
+        if self.directory is None:
+            return None
+        try:
+            return self._path(version, z, x, y).read_bytes()
+        except OSError:  # missing, or an unusable cache directory: a miss
+            return None
+
+    def put(self, version: int, z: int, x: int, y: int, data: bytes) -> None:
+        if self.directory is None:
+            return
+        if not (self.directory / str(version)).exists():
+            self._prune(keep=str(version))
+        path = self._path(version, z, x, y)
+        tmp = None
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # Write then rename, so readers (possibly other workers) never see half a tile
+            fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except OSError:
+            logger.exception("Could not cache tile %s", path)
+            if tmp is not None:
+                Path(tmp).unlink(missing_ok=True)
+
+    def _prune(self, keep: str) -> None:
+        if not self.directory.is_dir():
+            return
+        for child in self.directory.iterdir():
+            if child.is_dir() and child.name != keep:
+                shutil.rmtree(child, ignore_errors=True)
+
+
+cache = TileCache(config.TILE_CACHE_DIR)
+
+
+async def pin_tile(db: AsyncSession, version: int, z: int, x: int, y: int) -> bytes:
+    """The pins vector tile for (z, x, y) at ``version``, from disk if rendered before."""
+    data = await asyncio.to_thread(cache.get, version, z, x, y)
+    if data is not None:
+        metrics.VECTOR_TILES.inc(outcome="hit")
+        return data
+    metrics.VECTOR_TILES.inc(outcome="miss")
+    rows = await spatial.pins_in_box(db, *tile_bounds(z, x, y, BUFFER / EXTENT))
+    data = await asyncio.to_thread(encode_tile, rows, z, x, y)
+    await asyncio.to_thread(cache.put, version, z, x, y, data)
+    return data
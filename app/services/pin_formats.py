@@ -0,0 +1,139 @@
+from __future__ import annotations
+
+import json
+import math
+import struct
+import sys
+from array import array
+from collections.abc import Sequence
+from dataclasses import dataclass
+from itertools import accumulate
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.services import read_models
+
+FORMATS = ("json", "columns", "binary")
+BINARY_MEDIA_TYPE = "application/octet-stream"
+MAGIC = b"KPN1"
+# magic, count, name bytes, dictionary bytes
+_HEADER = struct.Struct("<4sIII")
+
+
+@dataclass(slots=True)
+class PinColumns:
+    """Every pin as parallel columns, in id order."""
+
+    id: Sequence[int]
+    lat: Sequence[float]
+    lng: Sequence[float]
+    name: Sequence[str | None]
+    category: Sequence[str]
+    status: Sequence[str]
+    confidence: Sequence[float | None]
+
+    def __len__(self) -> int:
+        return len(self.id)
+
+
+async def load_columns(db: AsyncSession) -> PinColumns:
+    """Every pin as columns, transposed from the read-model tuples."""
+    rows = await read_models.pin_tuples(db)
+    if not rows:
+        return PinColumns((), (), (), (), (), (), ())
+    return PinColumns(*zip(*rows))
+
+
+def _dictionary(values: Sequence[str]) -> tuple[list[str], list[int]]:
+    """(distinct values in first-seen order, code per value)."""
+    table: dict[str, int] = {}
+    codes = [table.setdefault(v, len(table)) for v in values]
+    return list(table), codes
+
+
+def encode_columns(cols: PinColumns) -> dict:
+    """Struct-of-arrays JSON: one array per field, category and status as codes."""
+    categories, category_codes = _dictionary(cols.category)
+    statuses, status_codes = _dictionary(cols.status)
+    return {
+        "count": len(cols),
+        "id": cols.id,
+        "lat": cols.lat,
+        "lng": cols.lng,
+        "name": cols.name,
+        "confidence": cols.confidence,
+        "category": category_codes,
+        "status": status_codes,
+        "categories": categories,
+        "statuses": statuses,
+    }
+
+
+def _little_endian(values: array) -> bytes:
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values.tobytes()
+
+
+def encode_binary(cols: PinColumns) -> bytes:
+    """Packed little-endian buffer that the browser reads as typed arrays.
+
+    After a 16-byte header (``KPN1``, count, name bytes, dictionary bytes):
+    Float64 lat, lng and confidence (NaN for none); Uint32 id; Uint32
+    name offsets (count + 1) into the UTF-8 name bytes; Uint16 category
+    code; Uint8 status code; the name bytes; and a JSON dictionary with
+    the ``categories`` and ``statuses`` the codes index. A missing name
+    is stored as an empty one. Every column starts on a multiple of its
+    element size, so typed array views need no copy.
+    """
+    categories, category_codes = _dictionary(cols.category)
+    statuses, status_codes = _dictionary(cols.status)
+    names = [(name or "").encode() for name in cols.name]
+    blob = b"".join(names)
+    offsets = array("I", accumulate((len(n) for n in names), initial=0))
+    dictionary = json.dumps({"categories": categories, "statuses": statuses}).encode()
+    return b"".join((
+        _HEADER.pack(MAGIC, len(cols), len(blob), len(dictionary)),
+        _little_endian(array("d", cols.lat)),
+        _little_endian(array("d", cols.lng)),
+        _little_endian(array("d", (math.nan if c is None else c for c in cols.confidence))),
+        _little_endian(array("I", cols.id)),
+        _little_endian(offsets),
+        _little_endian(array("H", category_codes)),
+        bytes(status_codes),
+        blob,
+        dictionary,
+    ))
+
+
+def decode_binary(data: bytes) -> PinColumns:
+    """Inverse of encode_binary (what app.js does, for tests and benchmarks)."""
+    magic, n, blob_len, dict_len = _HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError("Not a pin buffer")
+    pos = _HEADER.size
+
+    def take(typecode: str, count: int) -> array:
+        nonlocal pos
+        values = array(typecode)
+        values.frombytes(data[pos:pos + count * values.itemsize])
+        if sys.byteorder == "big":
+            values.byteswap()
+        pos += count * values.itemsize
+        return values
+
+    lat, lng, confidence = take("d", n), take("d", n), take("d", n)
+    ids, offsets = take("I", n), take("I", n + 1)
+    category_codes, status_codes = take("H", n), take("B", n)
+    blob = data[pos:pos + blob_len]
+    dictionary = json.loads(data[pos + blob_len:pos + blob_len + dict_len])
+    categories, statuses = dictionary["categories"], dictionary["statuses"]
+    return PinColumns(
+        id=ids.tolist(),
+        lat=lat.tolist(),
+        lng=lng.tolist(),
+        name=[blob[offsets[i]:offsets[i + 1]].decode() or None for i in range(n)],
+        category=[categories[c] for c in category_codes],
+        status=[statuses[s] for s in status_codes],
+        confidence=[None if math.isnan(c) else c for c in confidence],
+    )
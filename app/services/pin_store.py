@@ -0,0 +1,258 @@
+from __future__ import annotations
+
+import asyncio
+import math
+from array import array
+from collections import Counter
+from collections.abc import Iterable, Iterator, Mapping
+from typing import TypeVar
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.services import events, llm, metrics, read_models
+from app.services.read_models import PinRow
+
+# Grid cell size in degrees (~1.1 km of latitude)
+CELL_DEGREES = 0.01
+
+
+# The containers ``load`` replaces as a set
+_CONTENTS = ("ids", "lat", "lng", "name", "category", "status", "confidence", "lines", "slots", "grid", "status_counts")
+
+
+V = TypeVar("V")
+
+
+def grid_cell(lat: float, lng: float, size: float = CELL_DEGREES) -> tuple[int, int]:
+    """The (row, column) of the ``size``-degree grid cell holding (lat, lng)."""
+    return math.floor(lat / size), math.floor(lng / size)
+
+
+def cells_in_box(
+    grid: Mapping[tuple[int, int], V], south: float, north: float, west: float, east: float,
+    size: float = CELL_DEGREES,
+) -> Iterator[V]:
+    """The ``grid`` entries of the cells overlapping the box.
+
+    A box spanning more cells than ``grid`` has entries yields every entry
+    instead, since scanning them all is then cheaper; callers filter exactly.
+    """
+    lo_lat, lo_lng = grid_cell(south, west, size)
+    hi_lat, hi_lng = grid_cell(north, east, size)
+    if (hi_lat - lo_lat + 1) * (hi_lng - lo_lng + 1) > len(grid):
+        yield from grid.values()
+        return
+    for cy in range(lo_lat, hi_lat + 1):
+        for cx in range(lo_lng, hi_lng + 1):
+            entry = grid.get((cy, cx))
+            if entry is not None:
+                yield entry
+
+
+class PinStore:
+    """Every pin in process memory, for map state, dedup and nearby queries.
+
+    Coordinates live in two ``array("d")`` columns beside lists of the other
+    fields, addressed by slot; ``slots`` maps pin id to slot and ``grid``
+    maps a CELL_DEGREES cell to the ids inside it. Removed pins leave an
+    empty slot (id 0) until enough pile up to compact.
+
+    Each slot also keeps the pin's formatted map-state line, so a pin
+    change reformats one line. The assembled map-state message is cached
+    per ``version``.
+
+    SQLite stays the source of truth. Writes commit there first, then reach
+    the store through the ``pins`` broker events published right after.
+    Each of those local changes moves ``version`` on by the one bump the
+    version triggers made in ``data_versions``. ``sync`` compares that
+    with the stored version, so a write from another worker (or any write
+    that published no event) shows up as a mismatch and forces a reload.
+    """
+
+    def __init__(self):
+        self.version: int | None = None  # None until loaded
+        self.ids: list[int] = []
+        self.lat = array("d")
+        self.lng = array("d")
+        self.name: list[str | None] = []
+        self.category: list[str] = []
+        self.status: list[str] = []
+        self.confidence: list[float | None] = []
+        self.lines: list[str | None] = []
+        self.slots: dict[int, int] = {}
+        self.grid: dict[tuple[int, int], set[int]] = {}
+        self.status_counts: Counter[str] = Counter()
+        self._map_state: tuple[int, str] | None = None
+        self._backlog: list[dict] | None = None
+        self._lock = asyncio.Lock()
+
+    def __len__(self) -> int:
+        return len(self.slots)
+
+    # --- Maintenance ---
+
+    def load(self, rows: Iterable[tuple], version: int) -> None:
+        """Replace the contents with rows in ``read_models.PIN_COLUMNS`` order."""
+        self._adopt(PinStore._build(rows), version)
+
+    @staticmethod
+    def _build(rows: Iterable[tuple]) -> dict:
+        """Fresh containers holding ``rows``; touches no shared state, so it can run in a thread."""
+        fresh = PinStore()
+        for row in rows:
+            fresh._append(*row)
+        return {name: getattr(fresh, name) for name in _CONTENTS}
+
+    def _adopt(self, contents: dict, version: int) -> None:
+        # One synchronous step on the loop: no query ever sees a mix of old and new
+        self.__dict__.update(contents, version=version, _map_state=None)
+
+    async def sync(self, db: AsyncSession) -> bool:
+        """Reload if the pins table changed in ways the store hasn't seen.
+
+        The version is read before the rows, so a write landing in between
+        leaves the store looking stale (and reloading next time) rather
+        than fresh. Returns whether it reloaded.
+        """
+        if self.version is not None and await read_models.pins_version(db) == self.version:
+            return False
+        async with self._lock:
+            version = await read_models.pins_version(db)
+            if version == self.version:
+                return False
+            self._backlog = []
+            try:
+                rows = await read_models.pin_tuples(db)
+                # Built off the loop, swapped in on it
+                self._adopt(await asyncio.to_thread(PinStore._build, rows), version)
+                metrics.PIN_STORE_LOADS.inc()
+                backlog, self._backlog = self._backlog, None
+                for data in backlog:
+                    self.apply(data)
+            finally:
+                self._backlog = None
+        return True
+
+    def apply(self, data: dict) -> None:
+        """Apply a ``pins`` broker event."""
+        if self._backlog is not None:
+            self._backlog.append(data)
+            return
+        if self.version is None:
+            return
+        if data.get("action") == "deleted":
+            # The ids come from DELETE ... RETURNING: each was one row, one bump
+            for pin_id in data.get("ids", ()):
+                self.remove(pin_id)
+            self.version += len(data.get("ids", ()))
+        elif "pin" in data:
+            pin = data["pin"]
+            row = (pin["id"], pin["lat"], pin["lng"], pin["name"], pin["category"], pin["status"], pin["confidence"])
+            # An unchanged pin means the ORM issued no UPDATE, so nothing was bumped
+            if self.row(pin["id"]) != PinRow(*row):
+                self.put(*row)
+                self.version += 1
+
+    def put(self, pin_id, lat, lng, name, category, status, confidence) -> None:
+        """Insert a pin, or update it in place if it is already stored."""
+        slot = self.slots.get(pin_id)
+        if slot is None:
+            self._append(pin_id, lat, lng, name, category, status, confidence)
+            return
+        old, new = grid_cell(self.lat[slot], self.lng[slot]), grid_cell(lat, lng)
+        if old != new:
+            self._unindex(pin_id, old)
+            self.grid.setdefault(new, set()).add(pin_id)
+        self.status_counts[self.status[slot]] -= 1
+        self.status_counts[status] += 1
+        self.lat[slot], self.lng[slot] = lat, lng
+        self.name[slot], self.category[slot] = name, category
+        self.status[slot], self.confidence[slot] = status, confidence
+        self.lines[slot] = llm.map_state_line(lat, lng, name, category, status)
+
+    def _append(self, pin_id, lat, lng, name, category, status, confidence) -> None:
+        self.slots[pin_id] = len(self.ids)
+        self.ids.append(pin_id)
+        self.lat.append(lat)
+        self.lng.append(lng)
+        self.name.append(name)
+        self.category.append(category)
+        self.status.append(status)
+        self.confidence.append(confidence)
+        self.lines.append(llm.map_state_line(lat, lng, name, category, status))
+        self.grid.setdefault(grid_cell(lat, lng), set()).add(pin_id)
+        self.status_counts[status] += 1
+
+    def remove(self, pin_id: int) -> None:
+        slot = self.slots.pop(pin_id, None)
+        if slot is None:
+            return
+        self._unindex(pin_id, grid_cell(self.lat[slot], self.lng[slot]))
+        self.status_counts[self.status[slot]] -= 1
+        self.ids[slot] = 0
+        self.name[slot] = self.confidence[slot] = self.lines[slot] = None
+        if len(self.ids) > 2 * len(self.slots) + 64:
+            self._compact()
+
+    def _unindex(self, pin_id: int, cell: tuple[int, int]) -> None:
+        ids = self.grid[cell]
+        ids.discard(pin_id)
+        if not ids:
+            del self.grid[cell]
+
+    def _compact(self) -> None:
+        keep = [slot for slot, pin_id in enumerate(self.ids) if pin_id]
+        self.ids = [self.ids[s] for s in keep]
+        self.lat = array("d", (self.lat[s] for s in keep))
+        self.lng = array("d", (self.lng[s] for s in keep))
+        self.name = [self.name[s] for s in keep]
+        self.category = [self.category[s] for s in keep]
+        self.status = [self.status[s] for s in keep]
+        self.confidence = [self.confidence[s] for s in keep]
+        self.lines = [self.lines[s] for s in keep]
+        self.slots = {pin_id: slot for slot, pin_id in enumerate(self.ids)}
+
+    # --- Queries ---
+
+    def row(self, pin_id: int) -> PinRow | None:
+        slot = self.slots.get(pin_id)
+        if slot is None:
+            return None
+        return PinRow(
+            pin_id, self.lat[slot], self.lng[slot], self.name[slot],
+            self.category[slot], self.status[slot], self.confidence[slot],
+        )
+
+    def map_state_message(self) -> str:
+        """The map state system message (as llm._build_map_state_message words it), oldest pin first."""
+        if self._map_state is not None and self._map_state[0] == self.version:
+            metrics.MAP_STATE.inc(outcome="hit")
+            return self._map_state[1]
+        metrics.MAP_STATE.inc(outcome="miss")
+        header = llm.map_state_header(len(self.slots), self.status_counts["confirmed"], self.status_counts["draft"])
+        message = "\n".join([header, *filter(None, self.lines)]) if self.slots else header
+        self._map_state = (self.version, message)
+        return message
+
+    def in_box(
+        self, south: float, north: float, west: float, east: float, category: str | None = None
+    ) -> Iterator[tuple[int, float, float]]:
+        """(id, lat, lng) of each pin inside the box, in no particular order."""
+        for ids in cells_in_box(self.grid, south, north, west, east):
+            for pin_id in ids:
+                slot = self.slots[pin_id]
+                lat, lng = self.lat[slot], self.lng[slot]
+                if south <= lat <= north and west <= lng <= east:
+                    if category is None or self.category[slot] == category:
+                        yield pin_id, lat, lng
+
+
+store = PinStore()
+
+
+def _on_event(event: events.Event) -> None:
+    if event.name == "pins":
+        store.apply(event.data)
+
+
+events.broker.add_listener(_on_event)
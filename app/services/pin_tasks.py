@@ -0,0 +1,214 @@
+from __future__ import annotations
+
+import asyncio
+import math
+
+from sqlalchemy import bindparam, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core import config
+from app.db.session import is_postgres
+from app.models import ChatMessage, Pin, PinStatus
+from app.services import events, jobs, metrics, pin_store, poi, read_models, spatial
+from app.services.geocode import geocode
+from app.services.llm import get_assistant_response
+from app.services.read_models import PinRow
+
+DUPLICATE_TOLERANCE = 0.0001  # degrees of latitude
+# Pins closer than this (~11 m) are duplicates, on either backend
+DUPLICATE_RADIUS_M = DUPLICATE_TOLERANCE * spatial.METERS_PER_DEGREE
+
+# SQLite: one statement checks for a pin in the box around the duplicate
+# circle and inserts only if there is none. SQLite takes the write lock
+# before the statement reads anything, so two workers inserting at once are
+# serialised and the second sees the first. Pins in the box's corners,
+# beyond the radius, are listed in :outside and don't block it.
+_INSERT_IF_ABSENT = text("""
+INSERT INTO pins (lat, lng, name, category, status, confidence)
+SELECT :lat, :lng, :name, :category, :status, :confidence
+WHERE NOT EXISTS (
+    SELECT 1 FROM pins_rtree JOIN pins ON pins.id = pins_rtree.id
+    WHERE pins_rtree.max_lat >= :south AND pins_rtree.min_lat <= :north
+      AND pins_rtree.max_lng >= :west AND pins_rtree.min_lng <= :east
+      AND pins.lat BETWEEN :south AND :north AND pins.lng BETWEEN :west AND :east
+      AND pins.deleted_at IS NULL AND pins.id NOT IN :outside
+)
+RETURNING id
+""").bindparams(bindparam("outside", expanding=True))
+# PostgreSQL: a transaction-scoped advisory lock per latitude band the
+# duplicate circle touches. Two pins within the radius are less than a band
+# apart in latitude, so they share a band and their check-then-insert
+# transactions run one after the other. Bands span every longitude, so this
+# holds near the poles and across the antimeridian too.
+_LOCK_BAND = text("SELECT pg_advisory_xact_lock(:band)")
+_LOCK_BAND_DEGREES = 2 * DUPLICATE_TOLERANCE
+
+
+async def find_duplicate(db: AsyncSession, lat: float, lng: float) -> PinRow | None:
+    """Return an existing pin within DUPLICATE_RADIUS_M of the given coordinates, if any.
+
+    Both backends measure the same circle through ``spatial.nearby_pins``:
+    ST_DWithin on PostgreSQL, so concurrent workers see each other's pins
+    without waiting for a pin store reload, and the pin store with a
+    haversine filter on SQLite.
+    """
+    nearest = await spatial.nearby_pins(db, lat, lng, radius_m=DUPLICATE_RADIUS_M, k=1)
+    return nearest[0][0] if nearest else None
+
+
+async def create_pin(
+    db: AsyncSession,
+    lat: float,
+    lng: float,
+    *,
+    name: str | None = None,
+    category: str = "other",
+    confidence: float | None = None,
+) -> Pin | None:
+    """Insert a draft pin unless one already exists within DUPLICATE_RADIUS_M.
+
+    Returns the committed pin, or None for a duplicate. The check and the
+    insert are atomic in the database, so this holds across worker
+    processes, not just within one.
+    """
+    if await find_duplicate(db, lat, lng):
+        return None
+    if is_postgres(db):
+        first = math.floor((lat - DUPLICATE_TOLERANCE) / _LOCK_BAND_DEGREES)
+        last = math.floor((lat + DUPLICATE_TOLERANCE) / _LOCK_BAND_DEGREES)
+        for band in range(first, last + 1):  # in a fixed order, so two lockers never deadlock
+            await db.execute(_LOCK_BAND, {"band": band})
+        if await find_duplicate(db, lat, lng):
+            await db.rollback()
+            return None
+        pin = Pin(lat=lat, lng=lng, name=name, category=category, status=PinStatus.draft, confidence=confidence)
+        db.add(pin)
+        await db.commit()
+        await db.refresh(pin)
+        return pin
+
+    south, north, west, east = spatial.bounding_box(lat, lng, DUPLICATE_RADIUS_M)
+    outside = [0]  # ids of pins in the box but beyond the radius; 0 is no pin's
+    while True:
+        pin_id = await db.scalar(_INSERT_IF_ABSENT, {
+            "lat": lat,
+            "lng": lng,
+            "name": name,
+            "category": category,
+            "status": PinStatus.draft.name,
+            "confidence": confidence,
+            "south": south,
+            "north": north,
+            "west": west,
+            "east": east,
+            "outside": outside,
+        })
+        if pin_id is not None:
+            break
+        # Something in the box blocked it; it is only a duplicate inside the circle
+        boxed = await spatial.pins_in_box(db, south, north, west, east)
+        if any(spatial.haversine_m(lat, lng, row[1], row[2]) <= DUPLICATE_RADIUS_M for row in boxed):
+            await db.commit()
+            return None
+        outside = [0, *(row[0] for row in boxed)]
+    await db.commit()
+    return await db.get(Pin, pin_id)
+
+
+async def load_llm_context(db: AsyncSession) -> tuple[list[dict], str]:
+    """Return (history, map state message) for get_assistant_response."""
+    history = [{"role": m.role, "content": m.content} for m in await read_models.messages(db)]
+    await pin_store.store.sync(db)
+    return history, pin_store.store.map_state_message()
+
+
+@jobs.handler("place_pin")
+async def place_pin(db: AsyncSession, payload: dict) -> dict:
+    """Geocode an address from a place_pin action and create a draft pin."""
+    geo = await geocode(payload["address"])
+    if not geo:
+        msg = ChatMessage(
+            role="assistant",
+            content="I couldn't find that address. Could you be more specific, or click on the map instead?",
+        )
+        db.add(msg)
+        await db.commit()
+        events.publish_message(msg)
+        return {"pin_id": None, "request_click": True}
+
+    pin = await create_pin(
+        db,
+        geo["lat"],
+        geo["lng"],
+        name=payload.get("name"),
+        category=payload.get("category") or "other",
+        confidence=payload.get("confidence"),
+    )
+    if pin is None:
+        msg = ChatMessage(
+            role="assistant",
+            content=f"A pin already exists at that location ({geo['formatted_address']}). No duplicate created.",
+        )
+        db.add(msg)
+        await db.commit()
+        events.publish_message(msg)
+        return {"pin_id": None}
+
+    events.publish_pin("created", pin)
+    msg = ChatMessage(role="assistant", content=f"📍 Found at: {geo['formatted_address']}")
+    db.add(msg)
+    await db.commit()
+    events.publish_message(msg)
+    return {"pin_id": pin.id}
+
+
+@jobs.handler("classify_pin")
+async def classify_pin(db: AsyncSession, payload: dict) -> dict:
+    """Classify a draft pin created by a map click.
+
+    A named place from the local index right at the click is taken as is;
+    otherwise the LLM classifies it, with any nearby places as extra context.
+    """
+    pin = await db.get(Pin, payload["pin_id"])
+    if pin is None or pin.deleted_at is not None:
+        return {"pin_id": None}
+
+    nearby = poi.index.nearest(pin.lat, pin.lng, k=3, radius_m=config.POI_CONTEXT_RADIUS)
+    match = nearby[0] if nearby and nearby[0].distance_m <= config.POI_MATCH_RADIUS else None
+    if match and match.category != "other":
+        metrics.POI_LOOKUPS.inc(outcome="match")
+        pin.category = match.category
+        pin.name = match.name
+        pin.confidence = 0.9
+        msg = ChatMessage(
+            role="assistant",
+            content=f"This looks like **{match.name}** ({match.category.replace('_', ' ')}), "
+            f"{match.distance_m:.0f} m from where you clicked.",
+        )
+        db.add(msg)
+        await db.commit()
+        events.publish_pin("updated", pin)
+        events.publish_message(msg)
+        return {"pin_id": pin.id, "source": "poi"}
+
+    history, map_state = await load_llm_context(db)
+    if nearby:
+        metrics.POI_LOOKUPS.inc(outcome="nearby")
+        history.append({"role": "system", "content": poi.describe(nearby)})
+    else:
+        metrics.POI_LOOKUPS.inc(outcome="none")
+    llm_result = await asyncio.to_thread(get_assistant_response, history, map_state=map_state)
+
+    classification = llm_result.get("classification")
+    if classification:
+        pin.category = classification.get("category", "other")
+        pin.name = classification.get("name")
+        pin.confidence = classification.get("confidence")
+
+    msg = ChatMessage(role="assistant", content=llm_result["content"], **(llm_result.get("usage") or {}))
+    db.add(msg)
+    await db.commit()
+    if classification:
+        events.publish_pin("updated", pin)
+    events.publish_message(msg)
+    return {"pin_id": pin.id}
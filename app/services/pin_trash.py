@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from itertools import starmap
+
+from sqlalchemy import ColumnElement, delete, func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.core import config
+from app.db.session import async_session
+from app.models import Pin
+from app.services import metrics, pin_tasks, read_models
+from app.services.read_models import PinRow
+
+logger = logging.getLogger(__name__)
+
+
+def _now() -> datetime:
+    # Naive UTC with microseconds, so each delete gets its own timestamp to undo by
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+async def soft_delete(db: AsyncSession, *criteria: ColumnElement[bool]) -> list[int]:
+    """Mark the live pins matching ``criteria`` deleted, returning their ids.
+
+    One UPDATE, however many pins match; the rows stay until ``purge_batch``
+    removes them, and ``restore_last`` can bring them back until then.
+    The caller commits.
+    """
+    result = await db.execute(
+        update(Pin).where(Pin.deleted_at.is_(None), *criteria).values(deleted_at=_now()).returning(Pin.id)
+    )
+    return list(result.scalars().all())
+
+
+async def restore_last(db: AsyncSession) -> list[PinRow]:
+    """Undelete the pins of the most recent delete that hasn't been purged yet.
+
+    Like ``create_pin``, this never puts a pin on top of another: a deleted
+    pin within DUPLICATE_RADIUS_M of a live one is merged into it, that is
+    purged now instead of restored, so it can't hold up undoing an earlier
+    delete. Pins of the same delete coexisted before it and are restored
+    together.
+    """
+    latest = await db.scalar(select(func.max(Pin.deleted_at)))
+    if latest is None:
+        return []
+    restore, merged = [], []
+    for pin_id, lat, lng in await db.execute(select(Pin.id, Pin.lat, Pin.lng).where(Pin.deleted_at == latest)):
+        (merged if await pin_tasks.find_duplicate(db, lat, lng) else restore).append(pin_id)
+    if merged:
+        await db.execute(delete(Pin).where(Pin.id.in_(merged)))
+        metrics.PINS_PURGED.inc(len(merged))
+    rows = []
+    if restore:
+        result = await db.execute(
+            update(Pin)
+            .where(Pin.id.in_(restore), Pin.deleted_at == latest)
+            .values(deleted_at=None)
+            .returning(*read_models.PIN_COLUMNS)
+        )
+        rows = list(starmap(PinRow, result))
+    await db.commit()
+    return rows
+
+
+async def purge_batch(db: AsyncSession, before: datetime, limit: int | None = None) -> int:
+    """Hard-delete up to ``limit`` pins deleted before ``before``. Returns how many."""
+    limit = limit or config.PIN_PURGE_BATCH
+    ids = (
+        select(Pin.id)
+        .where(Pin.deleted_at.is_not(None), Pin.deleted_at < before)
+        .limit(limit)
+        .scalar_subquery()
+    )
+    result = await db.execute(delete(Pin).where(Pin.id.in_(ids)))
+    await db.commit()
+    metrics.PINS_PURGED.inc(result.rowcount)
+    return result.rowcount
+
+
+class Purger:
+    """Background task that purges deleted pins in bounded batches.
+
+    Every ``interval`` seconds it hard-deletes pins deleted more than
+    PIN_PURGE_AFTER seconds ago, one short transaction per batch, so the
+    write lock is never held for long and other writers get in between.
+    """
+
+    def __init__(self, session_factory: async_sessionmaker, interval: float | None = None):
+        self.session_factory = session_factory
+        self.interval = interval if interval is not None else config.PIN_PURGE_INTERVAL
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def run_once(self, before: datetime | None = None, batch: int | None = None) -> int:
+        """Purge everything due, batch by batch. Returns the number of pins purged."""
+        before = before or _now() - timedelta(seconds=config.PIN_PURGE_AFTER)
+        batch = batch or config.PIN_PURGE_BATCH
+        total = 0
+        while True:
+            async with self.session_factory() as db:
+                purged = await purge_batch(db, before, batch)
+            total += purged
+            if purged < batch:
+                break
+            await asyncio.sleep(0)
+        if total:
+            logger.info("Purged %d deleted pin(s)", total)
+        return total
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.run_once()
+            except Exception:
+                logger.exception("Pin purge failed")
+            await asyncio.sleep(self.interval)
+
+
+purger = Purger(async_session)
@@ -0,0 +1,150 @@
+from __future__ import annotations
+
+import csv
+import logging
+import math
+from array import array
+from collections.abc import Iterable
+from dataclasses import dataclass
+from pathlib import Path
+
+from app.core import config
+from app.services.pin_store import cells_in_box, grid_cell
+from app.services.spatial import METERS_PER_DEGREE, bounding_box
+
+logger = logging.getLogger(__name__)
+
+CELL_DEGREES = 0.0025  # grid cell size, ~280 m of latitude
+
+# OSM amenity/shop/leisure values that map onto our pin categories
+OSM_CATEGORIES = {
+    "kindergarten": "school",
+    "college": "school",
+    "university": "school",
+    "clinic": "health_clinic",
+    "doctors": "health_clinic",
+    "hospital": "health_clinic",
+    "dentist": "health_clinic",
+    "chemist": "pharmacy",
+    "convenience": "supermarket",
+    "greengrocer": "supermarket",
+    "fast_food": "restaurant",
+    "food_court": "restaurant",
+    "coffee": "cafe",
+    "atm": "bank",
+    "garden": "park",
+    "playground": "park",
+}
+
+
+def normalize_category(value: str) -> str:
+    value = value.strip().lower().replace(" ", "_")
+    if value in config.PIN_CATEGORIES:
+        return value
+    return OSM_CATEGORIES.get(value, "other")
+
+
+@dataclass(frozen=True, slots=True)
+class Place:
+    name: str
+    category: str
+    lat: float
+    lng: float
+    distance_m: float
+
+
+class PoiIndex:
+    """Nearest-place lookups over a fixed set of points.
+
+    Points are bucketed into a lat/lng grid. Coordinates live in flat
+    ``array('d')`` columns sorted by cell, and each cell maps to a
+    (start, end) slice of them. A query only scans the cells that
+    overlap its radius.
+    """
+
+    def __init__(self, rows: Iterable[tuple[str, str, float, float]] = ()):
+        items = sorted(
+            ((grid_cell(lat, lng, CELL_DEGREES), name, category, lat, lng) for name, category, lat, lng in rows),
+            key=lambda item: item[0],
+        )
+        self.names = [item[1] for item in items]
+        self.categories = [item[2] for item in items]
+        self.lats = array("d", (item[3] for item in items))
+        self.lngs = array("d", (item[4] for item in items))
+        self.cells: dict[tuple[int, int], tuple[int, int]] = {}
+        for i, item in enumerate(items):
+            start, _ = self.cells.get(item[0], (i, i))
+            self.cells[item[0]] = (start, i + 1)
+
+    def __len__(self) -> int:
+        return len(self.lats)
+
+    @classmethod
+    def from_csv(cls, path: str | Path) -> PoiIndex:
+        """Load a CSV with ``name``, ``category``, ``lat`` and ``lng`` (or ``lon``) columns.
+
+        Rows without a name or with unparsable coordinates are skipped.
+        Categories may be ours or OSM tag values such as ``doctors`` or ``fast_food``.
+        """
+        rows = []
+        with open(path, newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                name = (row.get("name") or "").strip()
+                try:
+                    lat = float(row["lat"])
+                    lng = float(row.get("lng") or row["lon"])
+                except (KeyError, TypeError, ValueError):
+                    continue
+                if name:
+                    rows.append((name, normalize_category(row.get("category") or ""), lat, lng))
+        return cls(rows)
+
+    def nearest(self, lat: float, lng: float, k: int = 3, radius_m: float = 250) -> list[Place]:
+        """Up to ``k`` places within ``radius_m`` meters, closest first."""
+        if not self.cells:
+            return []
+        coslat = max(math.cos(math.radians(lat)), 0.01)
+        radius_sq = radius_m * radius_m
+        lats, lngs = self.lats, self.lngs
+
+        found = []
+        for bounds in cells_in_box(self.cells, *bounding_box(lat, lng, radius_m), CELL_DEGREES):
+            for i in range(*bounds):
+                # Equirectangular approximation; exact enough at these distances
+                dy = (lats[i] - lat) * METERS_PER_DEGREE
+                dx = (lngs[i] - lng) * METERS_PER_DEGREE * coslat
+                d_sq = dx * dx + dy * dy
+                if d_sq <= radius_sq:
+                    found.append((d_sq, i))
+
+        found.sort()
+        return [
+            Place(self.names[i], self.categories[i], lats[i], lngs[i], math.sqrt(d_sq))
+            for d_sq, i in found[:k]
+        ]
+
+
+index = PoiIndex()
+
+
+def load_index(path: str | None = None) -> PoiIndex:
+    """Load the places index from ``path`` (default: POI_FILE) into the module-level ``index``."""
+    global index
+    path = config.POI_FILE if path is None else path
+    if not path:
+        return index
+    try:
+        index = PoiIndex.from_csv(path)
+    except OSError:
+        logger.exception("Could not load places index from %s", path)
+        return index
+    logger.info("Loaded %d places from %s", len(index), path)
+    return index
+
+
+def describe(places: list[Place]) -> str:
+    """Render nearby places as a system message for the classification prompt."""
+    lines = ["Known places near the clicked point (from local map data):"]
+    for p in places:
+        lines.append(f"- {p.name} ({p.category.replace('_', ' ')}), {p.distance_m:.0f} m away")
+    return "\n".join(lines)
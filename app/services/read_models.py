@@ -0,0 +1,124 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from datetime import datetime
+from itertools import starmap
+
+from sqlalchemy import ColumnElement, String, select, tuple_, type_coerce
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+
+from app.core import config
+from app.models import ChatMessage, DataVersion, Pin
+from app.models.chat import current_conversation
+
+# Read-only views for rendering and serialising. Core column selects build no
+# ORM objects, so nothing is tracked in the identity map or expired on commit.
+# Writes still go through the ORM.
+
+# Column order of pin rows. ``status`` is read as its stored string, skipping
+# the per-row Enum conversion.
+PIN_COLUMNS = (
+    Pin.id,
+    Pin.lat,
+    Pin.lng,
+    Pin.name,
+    Pin.category,
+    type_coerce(Pin.status, String).label("status"),
+    Pin.confidence,
+)
+MESSAGE_COLUMNS = (ChatMessage.id, ChatMessage.role, ChatMessage.content, ChatMessage.created_at)
+
+
+@dataclass(slots=True, frozen=True)
+class PinRow:
+    id: int
+    lat: float
+    lng: float
+    name: str | None
+    category: str
+    status: str
+    confidence: float | None
+
+    @classmethod
+    def from_pin(cls, pin: Pin) -> PinRow:
+        return cls(pin.id, pin.lat, pin.lng, pin.name, pin.category, pin.status.value, pin.confidence)
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "lat": self.lat,
+            "lng": self.lng,
+            "name": self.name,
+            "category": self.category,
+            "status": self.status,
+            "confidence": self.confidence,
+        }
+
+
+@dataclass(slots=True, frozen=True)
+class MessageRow:
+    id: int
+    role: str
+    content: str
+    created_at: datetime
+
+    def to_dict(self) -> dict:
+        return {"id": self.id, "role": self.role, "content": self.content, "created_at": self.created_at}
+
+
+async def pin_tuples(db: AsyncSession) -> list[tuple]:
+    """Every live pin as a plain tuple in ``PIN_COLUMNS`` order, by id."""
+    result = await db.execute(select(*PIN_COLUMNS).where(Pin.deleted_at.is_(None)).order_by(Pin.id))
+    return result.all()
+
+
+async def pins(db: AsyncSession) -> list[PinRow]:
+    """Every live pin, by id (which is creation order)."""
+    return list(starmap(PinRow, await pin_tuples(db)))
+
+
+def _current() -> ColumnElement[bool]:
+    return ChatMessage.conversation_id == current_conversation()
+
+
+async def messages(db: AsyncSession) -> list[MessageRow]:
+    """The current conversation, oldest first."""
+    result = await db.execute(
+        select(*MESSAGE_COLUMNS).where(_current()).order_by(ChatMessage.created_at, ChatMessage.id)
+    )
+    return list(starmap(MessageRow, result))
+
+
+async def message_page(
+    db: AsyncSession, before: int | None = None, limit: int | None = None
+) -> tuple[list[MessageRow], bool]:
+    """(up to ``limit`` messages, oldest first; whether older ones exist).
+
+    The page ends just before message ``before``, or at the latest message
+    of the current conversation.
+    Keyset pagination on (created_at, id): no OFFSET, so a page costs the
+    same wherever it falls in the history.
+    """
+    limit = limit or config.CHAT_PAGE_SIZE
+    stmt = (
+        select(*MESSAGE_COLUMNS)
+        .where(_current())
+        .order_by(ChatMessage.created_at.desc(), ChatMessage.id.desc())
+        .limit(limit + 1)
+    )
+    if before is not None:
+        # Compared in SQL against the stored row, so timestamps never round-trip
+        # through Python; an unknown ``before`` matches nothing
+        anchor = aliased(ChatMessage)
+        cursor = select(anchor.created_at, anchor.id).where(anchor.id == before).scalar_subquery()
+        stmt = stmt.where(tuple_(ChatMessage.created_at, ChatMessage.id) < cursor)
+    rows = (await db.execute(stmt)).all()
+    page = list(starmap(MessageRow, reversed(rows[:limit])))
+    return page, len(rows) > limit
+
+
+async def pins_version(db: AsyncSession) -> int:
+    """The pin-set version; any insert, update or delete on pins bumps it."""
+    version = await db.scalar(select(DataVersion.version).where(DataVersion.name == "pins"))
+    return version or 0
@@ -0,0 +1,138 @@
+from __future__ import annotations
+
+import re
+
+from sqlalchemy import func, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.session import is_postgres
+from app.models import Pin
+from app.services.read_models import PIN_COLUMNS, PinRow
+
+# Trigram matching needs at least this many characters; shorter queries are name prefixes
+MIN_SUBSTRING = 3
+# FTS matches fetched per query, unranked. Ranking every match of a common
+# fragment costs tens of ms at 100k pins; a capped candidate set is ranked in Python.
+MAX_CANDIDATES = 500
+# Minimum trigram similarity (Jaccard) for a fuzzy match
+FUZZY_THRESHOLD = 0.4
+
+_MATCH_SQL = text(
+    "SELECT pins.id, pins.name FROM pins_fts JOIN pins ON pins.id = pins_fts.rowid"
+    " WHERE pins_fts MATCH :query AND pins.deleted_at IS NULL LIMIT :limit"
+)
+# PostgreSQL: the pg_trgm GIN indexes serve ILIKE substrings and ``%`` similarity
+_PG_SUBSTRING_SQL = text(
+    "SELECT id, name FROM pins WHERE (name ILIKE :pattern OR category ILIKE :pattern)"
+    " AND deleted_at IS NULL LIMIT :limit"
+)
+_PG_FUZZY_SQL = text("SELECT id, name FROM pins WHERE name % :q AND deleted_at IS NULL LIMIT :limit")
+_NUMBER_RE = re.compile(r"\d+")
+
+
+def _phrase(value: str) -> str:
+    return '"' + value.replace('"', '""') + '"'
+
+
+def _like_pattern(value: str) -> str:
+    escaped = value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+def _trigrams(value: str) -> set[str]:
+    value = value.lower()
+    return {value[i : i + 3] for i in range(len(value) - 2)}
+
+
+def similarity(a: str, b: str) -> float:
+    """Trigram Jaccard similarity of two strings, 0.0 to 1.0."""
+    ta, tb = _trigrams(a), _trigrams(b)
+    if not ta or not tb:
+        return 0.0
+    return len(ta & tb) / len(ta | tb)
+
+
+async def _candidates(db: AsyncSession, q: str) -> list[tuple[int, str | None]]:
+    """(id, name) of up to MAX_CANDIDATES pins whose name (or category) contains ``q``."""
+    if len(q) < MIN_SUBSTRING:
+        stmt = select(Pin.id, Pin.name).where(Pin.deleted_at.is_(None), Pin.name.istartswith(q, autoescape=True)).limit(MAX_CANDIDATES)
+        return [tuple(row) for row in await db.execute(stmt)]
+    if is_postgres(db):
+        rows = await db.execute(_PG_SUBSTRING_SQL, {"pattern": _like_pattern(q), "limit": MAX_CANDIDATES})
+        return [tuple(row) for row in rows]
+    return [tuple(row) for row in await db.execute(_MATCH_SQL, {"query": _phrase(q), "limit": MAX_CANDIDATES})]
+
+
+async def _fuzzy_candidates(db: AsyncSession, q: str) -> list[tuple[float, int, str]]:
+    """(similarity, id, name) of pins sharing enough trigrams with ``q``, best first."""
+    if is_postgres(db):
+        rows = await db.execute(_PG_FUZZY_SQL, {"q": q, "limit": MAX_CANDIDATES})
+    else:
+        query = "name : (" + " OR ".join(_phrase(t) for t in sorted(_trigrams(q))) + ")"
+        rows = await db.execute(_MATCH_SQL, {"query": query, "limit": MAX_CANDIDATES})
+    scored = [(similarity(q, name), pin_id, name) for pin_id, name in rows if name]
+    return sorted((s for s in scored if s[0] >= FUZZY_THRESHOLD), key=lambda s: (-s[0], s[1]))
+
+
+async def _load(db: AsyncSession, ids: list[int]) -> list[PinRow]:
+    if not ids:
+        return []
+    by_id = {row.id: PinRow(*row) for row in await db.execute(select(*PIN_COLUMNS).where(Pin.id.in_(ids)))}
+    return [by_id[i] for i in ids if i in by_id]
+
+
+async def search_pins(db: AsyncSession, q: str, limit: int = 20) -> list[PinRow]:
+    """Find pins by partial name or category, falling back to fuzzy name matches.
+
+    Substring matches are ranked name prefix first, then name substring,
+    then category-only, shorter names first.
+    """
+    q = " ".join(q.split())
+    if not q:
+        return []
+    needle = q.lower()
+
+    candidates = await _candidates(db, q)
+    if candidates:
+
+        def rank(row: tuple[int, str | None]) -> tuple:
+            name = (row[1] or "").lower()
+            return (0 if name.startswith(needle) else 1 if needle in name else 2, len(name), row[0])
+
+        return await _load(db, [row[0] for row in sorted(candidates, key=rank)[:limit]])
+
+    if len(q) < MIN_SUBSTRING:
+        return []
+    return await _load(db, [pin_id for _, pin_id, _ in (await _fuzzy_candidates(db, q))[:limit]])
+
+
+async def resolve_pin_names(db: AsyncSession, names: list[str]) -> list[int]:
+    """Map names the LLM used for pins to pin ids.
+
+    A name that exactly matches (ignoring case) selects every pin with
+    that name. Otherwise it selects the single best partial or fuzzy
+    name match, if any, so a loose reference never removes more than
+    one pin. Fuzzy matches must contain the same numbers, so that
+    "Padaria 12" never resolves to "Padaria 13".
+    """
+    ids: list[int] = []
+    for name in names:
+        name = " ".join(name.split())
+        if not name:
+            continue
+        exact = await db.execute(select(Pin.id).where(func.lower(Pin.name) == name.lower(), Pin.deleted_at.is_(None)))
+        found = list(exact.scalars().all())
+        if not found:
+            needle = name.lower()
+            # Category-only matches ("bakery") don't identify a pin by name
+            partial = sorted(
+                (len(n), pin_id) for pin_id, n in await _candidates(db, name) if n and needle in n.lower()
+            )
+            if partial:
+                found = [partial[0][1]]
+            elif len(name) >= MIN_SUBSTRING:
+                numbers = _NUMBER_RE.findall(name)
+                fuzzy = [pin_id for _, pin_id, n in await _fuzzy_candidates(db, name) if _NUMBER_RE.findall(n) == numbers]
+                found = fuzzy[:1]
+        ids.extend(i for i in found if i not in ids)
+    return ids
@@ -0,0 +1,142 @@
+from __future__ import annotations
+
+import math
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.session import is_postgres
+from app.services import pin_store
+from app.services.read_models import PinRow
+
+EARTH_RADIUS_M = 6_371_000
+METERS_PER_DEGREE = math.pi * EARTH_RADIUS_M / 180
+HALF_CIRCUMFERENCE_M = math.pi * EARTH_RADIUS_M
+# Unbounded nearest-neighbour searches start here and widen 4x until k pins are found
+INITIAL_RADIUS_M = 1000
+
+_BBOX_FROM = """
+FROM pins_rtree JOIN pins ON pins.id = pins_rtree.id
+WHERE pins_rtree.max_lat >= :south AND pins_rtree.min_lat <= :north
+  AND pins_rtree.max_lng >= :west AND pins_rtree.min_lng <= :east
+  AND pins.deleted_at IS NULL
+"""
+_BBOX_PINS = text("SELECT pins.id, pins.lat, pins.lng, pins.name, pins.category, pins.status" + _BBOX_FROM)
+
+# PostgreSQL: the GiST index on pins.geog narrows the box; the lat/lng
+# comparisons keep it exact (geography box edges are great circles)
+_PG_BBOX_PINS = text("""
+SELECT id, lat, lng, name, category, status::text FROM pins
+WHERE geog && ST_MakeEnvelope(:west, :south, :east, :north, 4326)::geography
+  AND lat BETWEEN :south AND :north AND lng BETWEEN :west AND :east
+  AND deleted_at IS NULL
+""")
+# Nearest first by the GiST index (<->); distances on the sphere, like haversine_m
+_PG_POINT = "ST_SetSRID(ST_MakePoint(:lng, :lat), 4326)::geography"
+_PG_NEARBY = f"""
+SELECT id, lat, lng, name, category, status::text, confidence, ST_Distance(geog, {_PG_POINT}, false) AS d
+FROM pins
+WHERE deleted_at IS NULL {{conditions}}
+ORDER BY geog <-> {_PG_POINT}, id
+LIMIT :k
+"""
+
+
+def haversine_m(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    """Great-circle distance in meters."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlmb = math.radians(lng2 - lng1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlmb / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(min(1.0, math.sqrt(a)))
+
+
+def bounding_box(lat: float, lng: float, radius_m: float) -> tuple[float, float, float, float]:
+    """(south, north, west, east) enclosing every point within ``radius_m`` of (lat, lng)."""
+    dlat = radius_m / METERS_PER_DEGREE
+    south, north = max(-90.0, lat - dlat), min(90.0, lat + dlat)
+    widest = max(abs(south), abs(north))
+    if widest >= 90 or radius_m >= HALF_CIRCUMFERENCE_M / 2:
+        return south, north, -180.0, 180.0
+    dlng = dlat / math.cos(math.radians(widest))
+    west, east = lng - dlng, lng + dlng
+    if west < -180 or east > 180:
+        # Crosses the antimeridian; search the full longitude range rather than two boxes
+        return south, north, -180.0, 180.0
+    return south, north, west, east
+
+
+async def pins_in_box(db: AsyncSession, south: float, north: float, west: float, east: float) -> list:
+    """(id, lat, lng, name, category, status) rows of every pin inside the box."""
+    params = {"south": south, "north": north, "west": west, "east": east}
+    return (await db.execute(_PG_BBOX_PINS if is_postgres(db) else _BBOX_PINS, params)).all()
+
+
+async def _nearby_postgres(
+    db: AsyncSession, lat: float, lng: float, radius_m: float | None, k: int, category: str | None
+) -> list[tuple[PinRow, float]]:
+    conditions, params = "", {"lat": lat, "lng": lng, "k": k}
+    if radius_m:
+        conditions += f" AND ST_DWithin(geog, {_PG_POINT}, :radius, false)"
+        params["radius"] = radius_m
+    if category:
+        conditions += " AND category = :category"
+        params["category"] = category
+    rows = await db.execute(text(_PG_NEARBY.format(conditions=conditions)), params)
+    found = [(PinRow(*row[:7]), row[7]) for row in rows]
+    found.sort(key=lambda pair: (pair[1], pair[0].id))
+    return found
+
+
+def _within(lat: float, lng: float, radius_m: float, category: str | None) -> list[tuple[float, int]]:
+    found = []
+    for pin_id, plat, plng in pin_store.store.in_box(*bounding_box(lat, lng, radius_m), category or None):
+        # The grid narrows to a box; haversine keeps only the circle
+        d = haversine_m(lat, lng, plat, plng)
+        if d <= radius_m:
+            found.append((d, pin_id))
+    return found
+
+
+async def nearby_pins(
+    db: AsyncSession,
+    lat: float,
+    lng: float,
+    radius_m: float | None = None,
+    k: int = 10,
+    category: str | None = None,
+) -> list[tuple[PinRow, float]]:
+    """Up to ``k`` pins closest to (lat, lng) as (pin, meters) pairs, nearest first.
+
+    With ``radius_m`` only pins inside that radius count. Without it the
+    search widens from INITIAL_RADIUS_M until ``k`` pins are found or the
+    whole globe has been covered. Served from the in-memory pin store, or
+    on PostgreSQL by ST_DWithin and nearest-neighbour ordering on the
+    PostGIS index.
+    """
+    if is_postgres(db):
+        return await _nearby_postgres(db, lat, lng, radius_m, k, category)
+    await pin_store.store.sync(db)
+    limit = radius_m or HALF_CIRCUMFERENCE_M
+    radius = min(radius_m or INITIAL_RADIUS_M, limit)
+    while True:
+        found = _within(lat, lng, radius, category)
+        if len(found) >= k or radius >= limit:
+            break
+        radius = min(radius * 4, limit)
+
+    found.sort()
+    return [(pin_store.store.row(i), d) for d, i in found[:k]]
+
+
+def format_distance(meters: float) -> str:
+    return f"{meters:.0f} m" if meters < 1000 else f"{meters / 1000:.1f} km"
+
+
+def describe_nearby(results: list[tuple[PinRow, float]]) -> str:
+    """Plain-text list of nearby pins for the chat."""
+    if not results:
+        return "No matching pins found nearby."
+    return "\n".join(
+        f"- {p.name or 'unnamed'} ({p.category.replace('_', ' ')}), {format_distance(d)}" for p, d in results
+    )
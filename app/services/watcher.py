@@ -0,0 +1,85 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.core import config
+from app.db.session import async_session
+from app.models import ChatArchive, ChatMessage
+from app.models.chat import current_conversation
+from app.services import events, pin_store
+
+logger = logging.getLogger(__name__)
+
+
+class VersionWatcher:
+    """Background task that brings in changes made by other worker processes.
+
+    Broker events only reach the process that published them. Every
+    ``interval`` seconds this syncs the pin store against ``data_versions``
+    and compares the latest chat message id with the latest one this
+    process has published or seen. It also compares the current
+    conversation (moved on by clears) and the latest archive batch with
+    the last ones it read; those change rarely, so a clear or archive run
+    made here is republished too rather than tracked. Any difference is
+    republished here as a ``reloaded`` event, so this worker's SSE tabs
+    refresh too.
+    """
+
+    def __init__(self, session_factory: async_sessionmaker, interval: float | None = None):
+        self.session_factory = session_factory
+        self.interval = interval if interval is not None else config.VERSION_POLL_INTERVAL
+        self.message_id: int | None = None
+        self.history: tuple[int, int | None] | None = None  # (conversation, latest archive id)
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        if self.interval > 0 and self._task is None:
+            events.broker.add_listener(self._on_event)
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+            events.broker.remove_listener(self._on_event)
+
+    def _on_event(self, event: events.Event) -> None:
+        if event.name == "messages" and event.data.get("action") == "created":
+            self.message_id = max(self.message_id or 0, event.data["id"])
+
+    async def check(self, db: AsyncSession) -> list[str]:
+        """Sync once; returns the names of the events republished."""
+        changed = []
+        if await pin_store.store.sync(db):
+            changed.append("pins")
+        latest, conversation, archive_id = (await db.execute(select(
+            select(func.max(ChatMessage.id)).scalar_subquery(),
+            current_conversation(),
+            select(func.max(ChatArchive.id)).scalar_subquery(),
+        ))).one()
+        history = (conversation, archive_id)
+        # None: nothing seen yet to compare against
+        new_message = self.message_id is not None and latest != self.message_id
+        if new_message or self.history is not None and history != self.history:
+            changed.append("messages")
+        self.message_id, self.history = latest, history
+        for name in changed:
+            events.broker.publish(name, {"action": "reloaded"})
+        return changed
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                async with self.session_factory() as db:
+                    await self.check(db)
+            except Exception:
+                logger.exception("Version check failed")
+            await asyncio.sleep(self.interval)
+
+
+watcher = VersionWatcher(async_session)
@@ -1,8 +1,19 @@
 window.karteApp = {
   map: null,
   markers: [],
+  // Past this many pins the map shows server-side cluster tiles instead
+  clusterThreshold: 1000,
+  clustered: false,
+  clusterMarkers: [],
+  tiles: {},
+  tileRequest: 0,
   directionsRenderer: null,
   expectingClick: false,
+  // Identifies this tab so it can skip server events about its own requests
+  clientId: Math.random().toString(36).slice(2),
+  eventSource: null,
+  timers: {},
+  loadingOlder: false,
 
   async init() {
     const { Map } = await google.maps.importLibrary("maps");
@@ -14,6 +25,35 @@ window.karteApp = {
     });
 
     this.map.addListener("click", (e) => this.handleClick(e));
+    this.connectEvents();
+  },
+
+  connectEvents() {
+    let connected = false;
+    this.eventSource = new EventSource("/events");
+    this.eventSource.addEventListener("open", () => {
+      // Resync after a reconnect — events may have been missed while offline
+      if (connected) this.debounce("pins", () => this.refreshPins());
+      connected = true;
+    });
+    this.eventSource.addEventListener("pins", () => {
+      this.debounce("pins", () => this.refreshPins());
+    });
+    this.eventSource.addEventListener("messages", (e) => {
+      const data = JSON.parse(e.data);
+      // Our own requests already swap in their response, and pending job
+      // pollers will swap in theirs.
+      if (data.origin === this.clientId) return;
+      if (document.querySelector(".chat-pending")) return;
+      this.debounce("messages", () => {
+        htmx.ajax("GET", "/chat/messages", { target: "#chat-messages", swap: "innerHTML" });
+      });
+    });
+  },
+
+  debounce(key, fn, delay = 150) {
+    clearTimeout(this.timers[key]);
+    this.timers[key] = setTimeout(fn, delay);
   },
 
   handleClick(e) {
@@ -25,17 +65,11 @@ window.karteApp = {
 
     this.showTyping();
 
-    fetch("/map/click", {
-      method: "POST",
-      headers: { "Content-Type": "application/x-www-form-urlencoded" },
-      body: `lat=${lat}&lng=${lng}`,
-    })
-      .then((r) => r.text())
-      .then((html) => {
-        document.getElementById("chat-messages").innerHTML = html;
-        this.scrollChat();
-        this.refreshPins();
-      });
+    htmx.ajax("POST", "/map/click", {
+      target: "#chat-messages",
+      swap: "innerHTML",
+      values: { lat, lng },
+    });
   },
 
   loadPins(pins) {
@@ -48,19 +82,7 @@ window.karteApp = {
     }
 
     pins.forEach((pin, i) => {
-      const letter = String.fromCharCode(65 + (i % 26));
-      const marker = new google.maps.Marker({
-        position: { lat: pin.lat, lng: pin.lng },
-        map: this.map,
-        title: pin.name || pin.category,
-        label: pin.status === "draft"
-          ? { text: letter, color: "#333" }
-          : { text: letter, color: "#fff" },
-        icon: pin.status === "draft"
-          ? "http://maps.google.com/mapfiles/ms/icons/yellow-dot.png"
-          : undefined,
-      });
-      this.markers.push(marker);
+      this.markers.push(this.pinMarker(pin, String.fromCharCode(65 + (i % 26))));
     });
 
     // Draw walking route connecting all pins in order
@@ -69,6 +91,209 @@ window.karteApp = {
     }
   },
 
+  pinMarker(pin, letter) {
+    return new google.maps.Marker({
+      position: { lat: pin.lat, lng: pin.lng },
+      map: this.map,
+      title: pin.name || pin.category,
+      label: letter
+        ? { text: letter, color: pin.status === "draft" ? "#333" : "#fff" }
+        : undefined,
+      icon: pin.status === "draft"
+        ? "http://maps.google.com/mapfiles/ms/icons/yellow-dot.png"
+        : undefined,
+    });
+  },
+
+  enableClusters() {
+    this.clustered = true;
+    this.loadPins([]);
+    if (!this.idleListener) {
+      this.idleListener = this.map.addListener("idle", () => this.loadClusters());
+      this.map.overlayMapTypes.push(this.pinLayer());
+    }
+    this.loadClusters();
+  },
+
+  // Individual pins on large maps: a data layer drawn from /map/tiles vector
+  // tiles onto one canvas per map tile, instead of one Marker per pin.
+  pinLayer() {
+    const app = this;
+    return {
+      tileSize: new google.maps.Size(256, 256),
+      maxZoom: 20,
+      name: "pins",
+      getTile(coord, zoom, doc) {
+        const canvas = doc.createElement("canvas");
+        canvas.width = canvas.height = 256;
+        app.drawPinTile(canvas, zoom, coord.x, coord.y);
+        return canvas;
+      },
+      releaseTile() {},
+    };
+  },
+
+  async drawPinTile(canvas, z, x, y) {
+    const n = 2 ** z;
+    if (y < 0 || y >= n) return;
+    x = ((x % n) + n) % n;  // the map repeats horizontally
+    const resp = await fetch(`/map/tiles/${z}/${x}/${y}.mvt`);
+    if (!resp.ok) return;
+    const layer = this.decodeTile(new Uint8Array(await resp.arrayBuffer()));
+    const ctx = canvas.getContext("2d");
+    const scale = canvas.width / layer.extent;
+    ctx.strokeStyle = "#fff";
+    layer.features.forEach((f) => {
+      ctx.beginPath();
+      ctx.arc(f.x * scale, f.y * scale, 4, 0, 2 * Math.PI);
+      ctx.fillStyle = f.properties.status === "draft" ? "#F4B400" : "#DB4437";
+      ctx.fill();
+      ctx.stroke();
+    });
+  },
+
+  decodeTile(bytes) {
+    // Just enough of the protobuf wire format for the single-layer point
+    // tiles /map/tiles serves.
+    let pos = 0;
+    const varint = () => {
+      let value = 0;
+      for (let shift = 0; ; shift += 7) {
+        const b = bytes[pos++];
+        value += (b & 0x7f) * 2 ** shift;
+        if (b < 0x80) return value;
+      }
+    };
+    // Calls fn(field, end) for length-delimited fields, fn(field, value) for varints
+    const each = (end, fn) => {
+      while (pos < end) {
+        const key = varint();
+        if ((key & 7) === 2) {
+          const length = varint();
+          const next = pos + length;
+          fn(key >> 3, next);
+          pos = next;
+        } else {
+          fn(key >> 3, varint());
+        }
+      }
+    };
+    const packed = (end) => {
+      const out = [];
+      while (pos < end) out.push(varint());
+      return out;
+    };
+    const zigzag = (n) => (n % 2 ? -(n + 1) / 2 : n / 2);
+    const text = new TextDecoder();
+
+    const layer = { extent: 4096, features: [] };
+    const keys = [];
+    const values = [];
+    each(bytes.length, (field, end) => {
+      if (field !== 3) return;
+      each(end, (f, arg) => {
+        if (f === 3) {
+          keys.push(text.decode(bytes.subarray(pos, arg)));
+        } else if (f === 4) {
+          each(arg, (vf, vend) => {
+            if (vf === 1) values.push(text.decode(bytes.subarray(pos, vend)));
+          });
+        } else if (f === 5) {
+          layer.extent = arg;
+        } else if (f === 2) {
+          const feature = { id: null, tags: [], x: 0, y: 0 };
+          each(arg, (ff, farg) => {
+            if (ff === 1) feature.id = farg;
+            else if (ff === 2) feature.tags = packed(farg);
+            else if (ff === 4) {
+              const geometry = packed(farg);
+              feature.x = zigzag(geometry[1]);
+              feature.y = zigzag(geometry[2]);
+            }
+          });
+          layer.features.push(feature);
+        }
+      });
+    });
+    layer.features.forEach((f) => {
+      f.properties = {};
+      for (let i = 0; i < f.tags.length; i += 2) {
+        f.properties[keys[f.tags[i]]] = values[f.tags[i + 1]];
+      }
+    });
+    return layer;
+  },
+
+  visibleTiles() {
+    const bounds = this.map.getBounds();
+    if (!bounds) return [];
+    const z = Math.max(0, Math.min(20, Math.round(this.map.getZoom())));
+    const n = 2 ** z;
+    const tileX = (lng) => Math.min(n - 1, Math.floor(((lng + 180) / 360) * n));
+    const tileY = (lat) => {
+      const s = Math.sin((Math.max(-85.0511, Math.min(85.0511, lat)) * Math.PI) / 180);
+      const y = 0.5 - Math.log((1 + s) / (1 - s)) / (4 * Math.PI);
+      return Math.max(0, Math.min(n - 1, Math.floor(y * n)));
+    };
+    const ne = bounds.getNorthEast();
+    const sw = bounds.getSouthWest();
+    let x0 = tileX(sw.lng());
+    let x1 = tileX(ne.lng());
+    if (x1 < x0) x1 += n;  // viewport crosses the antimeridian
+    if (x1 - x0 >= n) [x0, x1] = [0, n - 1];
+    const keys = [];
+    for (let x = x0; x <= x1; x++) {
+      for (let y = tileY(ne.lat()); y <= tileY(sw.lat()); y++) {
+        keys.push(`${z}/${x % n}/${y}`);
+      }
+    }
+    return keys;
+  },
+
+  fetchTile(key) {
+    if (!this.tiles[key]) {
+      this.tiles[key] = fetch(`/map/clusters/${key}`)
+        .then((resp) => resp.json())
+        .catch(() => {
+          delete this.tiles[key];
+          return { clusters: [], pins: [] };
+        });
+    }
+    return this.tiles[key];
+  },
+
+  async loadClusters() {
+    const request = ++this.tileRequest;
+    const tiles = await Promise.all(this.visibleTiles().map((key) => this.fetchTile(key)));
+    if (request !== this.tileRequest) return;  // the map moved on meanwhile
+
+    this.clusterMarkers.forEach((m) => m.setMap(null));
+    this.clusterMarkers = [];
+    tiles.forEach((tile) => {
+      tile.clusters.forEach((c) => {
+        const marker = new google.maps.Marker({
+          position: { lat: c.lat, lng: c.lng },
+          map: this.map,
+          title: `${c.count} pins`,
+          label: { text: String(c.count), color: "#fff", fontSize: "11px" },
+          icon: {
+            path: google.maps.SymbolPath.CIRCLE,
+            scale: 12 + 4 * Math.log10(c.count),
+            fillColor: c.drafts ? "#F4B400" : "#4285F4",
+            fillOpacity: 0.85,
+            strokeColor: "#fff",
+            strokeWeight: 2,
+          },
+        });
+        marker.addListener("click", () => {
+          this.map.setCenter(marker.getPosition());
+          this.map.setZoom(c.expand);
+        });
+        this.clusterMarkers.push(marker);
+      });
+    });
+  },
+
   drawWalkingRoute(pins) {
     const origin = { lat: pins[0].lat, lng: pins[0].lng };
     const destination = { lat: pins[pins.length - 1].lat, lng: pins[pins.length - 1].lng };
@@ -104,9 +329,66 @@ window.karteApp = {
   },
 
   async refreshPins() {
-    const resp = await fetch("/map/pins");
-    const pins = await resp.json();
-    this.loadPins(pins);
+    if (this.clustered) {
+      this.tiles = {};
+      this.map.overlayMapTypes.setAt(0, this.pinLayer());
+      await this.loadClusters();
+      return;
+    }
+    const resp = await fetch("/map/pins?format=binary");
+    const pins = this.decodePins(await resp.arrayBuffer());
+    if (pins.count > this.clusterThreshold) {
+      this.enableClusters();
+    } else {
+      this.loadPins(this.pinObjects(pins));
+    }
+  },
+
+  // Reads the packed /map/pins?format=binary layout (see pin_formats.encode_binary)
+  // into typed array views over the response buffer.
+  decodePins(buffer) {
+    const header = new DataView(buffer, 0, 16);
+    const count = header.getUint32(4, true);
+    const nameBytes = header.getUint32(8, true);
+    const dictBytes = header.getUint32(12, true);
+    let offset = 16;
+    const take = (Type, length) => {
+      const values = new Type(buffer, offset, length);
+      offset += length * Type.BYTES_PER_ELEMENT;
+      return values;
+    };
+    const pins = {
+      count,
+      lat: take(Float64Array, count),
+      lng: take(Float64Array, count),
+      confidence: take(Float64Array, count),
+      id: take(Uint32Array, count),
+      nameOffsets: take(Uint32Array, count + 1),
+      category: take(Uint16Array, count),
+      status: take(Uint8Array, count),
+      names: take(Uint8Array, nameBytes),
+    };
+    const text = new TextDecoder();
+    Object.assign(pins, JSON.parse(text.decode(new Uint8Array(buffer, offset, dictBytes))));
+    pins.name = (i) =>
+      text.decode(pins.names.subarray(pins.nameOffsets[i], pins.nameOffsets[i + 1])) || null;
+    return pins;
+  },
+
+  pinObjects(pins) {
+    const out = [];
+    for (let i = 0; i < pins.count; i++) {
+      out.push({
+        id: pins.id[i],
+        lat: pins.lat[i],
+        lng: pins.lng[i],
+        name: pins.name(i),
+        category: pins.categories[pins.category[i]],
+        status: pins.statuses[pins.status[i]],
+        confidence: Number.isNaN(pins.confidence[i]) ? null : pins.confidence[i],
+      });
+    }
+    return out;
   },
 
   requestMapClick() {
@@ -118,6 +400,35 @@ window.karteApp = {
     el.scrollTop = el.scrollHeight;
   },
 
+  // The chat renders only its latest page; the .chat-older marker above it
+  // holds the cursor for the page before.
+  async loadOlder() {
+    const el = document.getElementById("chat-messages");
+    const marker = el.querySelector(".chat-older");
+    if (!marker || this.loadingOlder) return;
+    this.loadingOlder = true;
+    try {
+      const resp = await fetch(`/chat/messages?before=${marker.dataset.before}`);
+      // The chat may have been swapped out while this was loading
+      if (!resp.ok || !marker.isConnected) return;
+      const html = await resp.text();
+      // Keep the visible messages in place while history grows above them
+      const fromBottom = el.scrollHeight - el.scrollTop;
+      marker.insertAdjacentHTML("afterend", html);
+      marker.remove();
+      el.scrollTop = el.scrollHeight - fromBottom;
+    } finally {
+      this.loadingOlder = false;
+    }
+    this.fillChat();
+  },
+
+  // A page too short to scroll can't be scrolled up, so keep loading
+  fillChat() {
+    const el = document.getElementById("chat-messages");
+    if (el.scrollHeight <= el.clientHeight) this.loadOlder();
+  },
+
   showTyping() {
     const el = document.getElementById("chat-messages");
     const bubble = document.createElement("div");
@@ -165,7 +476,9 @@ window.karteApp = {
 
   moveMap(data) {
     if (!this.map) return;
-    if (data.target === "fit_all") {
+    if (data.target === "fit_all" && this.clustered) {
+      this.fitClusters();
+    } else if (data.target === "fit_all") {
       if (this.markers.length === 0) return;
       const bounds = new google.maps.LatLngBounds();
       this.markers.forEach((m) => bounds.extend(m.getPosition()));
@@ -175,29 +488,52 @@ window.karteApp = {
       if (data.zoom) this.map.setZoom(data.zoom);
     }
   },
+
+  async fitClusters() {
+    // The world tile's clusters outline where all the pins are
+    const tile = await (await fetch("/map/clusters/0/0/0")).json();
+    const points = [...tile.clusters, ...tile.pins];
+    if (points.length === 0) return;
+    if (points.length === 1) {
+      this.map.setCenter({ lat: points[0].lat, lng: points[0].lng });
+      this.map.setZoom(points[0].expand || 17);
+      return;
+    }
+    const bounds = new google.maps.LatLngBounds();
+    points.forEach((p) => bounds.extend({ lat: p.lat, lng: p.lng }));
+    this.map.fitBounds(bounds);
+  },
 };
 
+// Tag every htmx request with this tab's id (see connectEvents)
+document.addEventListener("htmx:configRequest", (e) => {
+  e.detail.headers["X-Karte-Client"] = window.karteApp.clientId;
+});
+
+// Older chat history loads when the chat is scrolled near its top
+document.getElementById("chat-messages").addEventListener("scroll", (e) => {
+  if (e.target.scrollTop < 100) window.karteApp.loadOlder();
+});
+
 // After every htmx swap on chat, scroll to bottom and check for click-request
 document.addEventListener("htmx:afterSwap", (e) => {
   if (e.detail.target.id === "chat-messages") {
     window.karteApp.scrollChat();
+    window.karteApp.fillChat();
     // Check if assistant requested a map click
     if (document.querySelector("[data-request-click]")) {
       window.karteApp.requestMapClick();
     }
-    // Check if assistant requested a map move
+    // Check if assistant requested a map move. Other pin changes arrive via
+    // the /events stream; only a move needs markers to be current right now.
     const moveEl = document.querySelector("[data-move-map]");
     if (moveEl) {
       try {
         const moveData = JSON.parse(moveEl.getAttribute("data-move-map"));
-        // Refresh pins first so markers are current, then move
         window.karteApp.refreshPins().then(() => {
           window.karteApp.moveMap(moveData);
         });
-        return;
       } catch (_) {}
     }
-    // Refresh map pins after any chat update (covers confirm actions)
-    window.karteApp.refreshPins();
   }
 });
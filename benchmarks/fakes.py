@@ -0,0 +1,78 @@
+"""Deterministic stand-ins for the LLM and the geocoder, with injectable latency."""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import time
+
+from langchain_core.messages import AIMessage
+
+
+class FakeChatModel:
+    """Mimics ``BaseChatModel.invoke`` closely enough for ``get_assistant_response``.
+
+    The reply depends only on the last message, so runs are reproducible:
+    map-click prompts get a ``classify`` action, messages starting with
+    "add" get a ``place_pin`` action, everything else gets plain text.
+    """
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.calls = 0
+
+    def invoke(self, messages: list) -> AIMessage:
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        last = messages[-1].content if messages else ""
+        prompt_chars = sum(len(m.content) for m in messages)
+
+        if "User clicked on the map" in last:
+            action = {"action": "classify", "category": "cafe", "name": "Fake Cafe", "confidence": 0.7,
+                      "reasoning": "benchmark"}
+            text = "Looks like a cafe."
+        elif last.lower().startswith("add"):
+            action = {"action": "place_pin", "address": last[4:], "category": "bakery",
+                      "name": last[4:40], "confidence": 0.9}
+            text = "Placing that for you."
+        else:
+            action = None
+            text = "You have some pins on the map."
+
+        content = text if action is None else f"{text}\n{json.dumps(action)}"
+        return AIMessage(
+            content=content,
+            usage_metadata={
+                "input_tokens": prompt_chars // 4,
+                "output_tokens": len(content) // 4,
+                "total_tokens": (prompt_chars + len(content)) // 4,
+            },
+        )
+
+
+class FakeGeocoder:
+    """Maps every address to stable pseudo-random coordinates near São Paulo.
+
+    Async, so it can stand in for ``google_lookup`` behind a ``GeocodeScheduler``.
+    """
+
+    def __init__(self, latency: float = 0.0, miss_rate: float = 0.0):
+        self.latency = latency
+        self.miss_rate = miss_rate
+        self.calls = 0
+
+    async def __call__(self, address: str) -> dict | None:
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        digest = hashlib.sha1(address.encode()).digest()
+        if self.miss_rate and digest[0] / 255 < self.miss_rate:
+            return None
+        dlat = int.from_bytes(digest[1:5], "big") / 2**32 - 0.5
+        dlng = int.from_bytes(digest[5:9], "big") / 2**32 - 0.5
+        return {
+            "lat": -23.55 + dlat * 0.5,
+            "lng": -46.63 + dlng * 0.5,
+            "formatted_address": f"{address}, São Paulo",
+        }
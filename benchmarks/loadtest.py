@@ -0,0 +1,232 @@
+"""Load-test the app in-process against fake LLM and geocoder stand-ins.
+
+Seeds a fresh SQLite database per data size, drives the main endpoints at a
+fixed concurrency through an ASGI transport, and prints (or writes) a JSON
+report with p50/p95/p99 latency and requests/sec per endpoint, so runs can
+be compared across commits.
+
+    python -m benchmarks.loadtest --sizes 10,10000 --concurrency 8 --requests 200
+    python -m benchmarks.loadtest --sizes 100000 --llm-latency 0.5 --output bench.json
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import math
+import random
+import statistics
+import subprocess
+import tempfile
+import time
+from contextlib import ExitStack
+from datetime import datetime, timezone
+from pathlib import Path
+from unittest.mock import patch
+
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.db.session import get_db
+from app.main import app
+from app.models import Base, ChatMessage, Pin, PinStatus
+from app.services import geocode, jobs
+from benchmarks.fakes import FakeChatModel, FakeGeocoder
+
+ENDPOINTS = ("index", "map_pins", "map_click", "chat_send")
+CATEGORIES = ("school", "bakery", "pharmacy", "restaurant", "cafe", "bank", "park", "other")
+
+
+def percentile(sorted_values: list[float], q: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    k = max(0, min(len(sorted_values) - 1, math.ceil(q / 100 * len(sorted_values)) - 1))
+    return sorted_values[k]
+
+
+def summarize(latencies: list[float], errors: int, wall: float) -> dict:
+    values = sorted(latencies)
+    return {
+        "requests": len(values),
+        "errors": errors,
+        "rps": round(len(values) / wall, 2) if wall else 0.0,
+        "mean_ms": round(statistics.fmean(values) * 1000, 3) if values else 0.0,
+        "p50_ms": round(percentile(values, 50) * 1000, 3),
+        "p95_ms": round(percentile(values, 95) * 1000, 3),
+        "p99_ms": round(percentile(values, 99) * 1000, 3),
+        "max_ms": round(values[-1] * 1000, 3) if values else 0.0,
+    }
+
+
+async def seed(session_factory: async_sessionmaker, pins: int, messages: int, rng: random.Random) -> None:
+    """Bulk-insert synthetic pins and chat messages with Core inserts."""
+    batch = 5000
+    async with session_factory() as db:
+        for start in range(0, pins, batch):
+            rows = [
+                {
+                    "lat": -23.55 + rng.uniform(-0.5, 0.5),
+                    "lng": -46.63 + rng.uniform(-0.5, 0.5),
+                    "name": f"Place {i}",
+                    "category": rng.choice(CATEGORIES),
+                    "status": rng.choice((PinStatus.draft, PinStatus.confirmed)),
+                    "confidence": round(rng.random(), 2),
+                }
+                for i in range(start, min(start + batch, pins))
+            ]
+            await db.execute(insert(Pin), rows)
+        for start in range(0, messages, batch):
+            rows = [
+                {"role": "user" if i % 2 == 0 else "assistant", "content": f"Message number {i} " * 4}
+                for i in range(start, min(start + batch, messages))
+            ]
+            await db.execute(insert(ChatMessage), rows)
+        await db.commit()
+
+
+def make_request(endpoint: str, rng: random.Random, n: int) -> tuple[str, str, dict | None]:
+    if endpoint == "index":
+        return "GET", "/", None
+    if endpoint == "map_pins":
+        return "GET", "/map/pins", None
+    if endpoint == "map_click":
+        lat = -23.55 + rng.uniform(-0.5, 0.5)
+        lng = -46.63 + rng.uniform(-0.5, 0.5)
+        return "POST", "/map/click", {"lat": f"{lat:.6f}", "lng": f"{lng:.6f}"}
+    if endpoint == "chat_send":
+        text = f"add bakery number {n} on rua {rng.randint(1, 10**6)}" if n % 2 == 0 else "how many pins?"
+        return "POST", "/chat/send", {"message": text}
+    raise ValueError(f"Unknown endpoint {endpoint!r}")
+
+
+async def drive(client: AsyncClient, endpoint: str, total: int, concurrency: int, rng: random.Random) -> dict:
+    latencies: list[float] = []
+    errors = 0
+    counter = iter(range(total))
+
+    async def worker() -> None:
+        nonlocal errors
+        for n in counter:
+            method, url, data = make_request(endpoint, rng, n)
+            start = time.perf_counter()
+            resp = await client.request(method, url, data=data)
+            latencies.append(time.perf_counter() - start)
+            if resp.status_code >= 400:
+                errors += 1
+
+    wall_start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, errors, time.perf_counter() - wall_start)
+
+
+async def run_size(size: int, args: argparse.Namespace, workdir: Path) -> dict:
+    rng = random.Random(args.seed)
+    engine = create_async_engine(f"sqlite+aiosqlite:///{workdir / f'bench_{size}.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.drop_all)
+        await conn.run_sync(Base.metadata.create_all)
+    session_factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    seed_start = time.perf_counter()
+    await seed(session_factory, pins=size, messages=size, rng=rng)
+    seed_seconds = time.perf_counter() - seed_start
+
+    async def _get_db():
+        async with session_factory() as session:
+            yield session
+
+    llm = FakeChatModel(latency=args.llm_latency)
+    geocoder = FakeGeocoder(latency=args.geocode_latency)
+    queue = jobs.JobQueue(session_factory, workers=args.job_workers)
+
+    results: dict[str, dict] = {}
+    with ExitStack() as stack:
+        stack.enter_context(patch("app.services.llm.get_chat_model", return_value=llm))
+        chain = geocode.ChainGeocoder([geocode.GeocodeScheduler(geocoder, qps=args.geocode_qps)])
+        stack.enter_context(patch.object(geocode, "geocoder", chain))
+        stack.enter_context(patch.object(geocode, "cache", geocode.GeocodeCache(10000, 3600, 300)))
+        stack.enter_context(patch.object(jobs, "queue", queue))
+        app.dependency_overrides[get_db] = _get_db
+        await queue.start()
+        try:
+            transport = ASGITransport(app=app, raise_app_exceptions=False)
+            async with AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+                for endpoint in args.endpoints:
+                    results[endpoint] = await drive(client, endpoint, args.requests, args.concurrency, rng)
+            await queue.join()
+        finally:
+            await queue.stop()
+            app.dependency_overrides.clear()
+
+    await engine.dispose()
+    return {
+        "pins": size,
+        "messages": size,
+        "seed_seconds": round(seed_seconds, 3),
+        "llm_calls": llm.calls,
+        "geocode_calls": geocoder.calls,
+        "endpoints": results,
+    }
+
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def main(args: argparse.Namespace) -> dict:
+    report = {
+        "commit": git_revision(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "config": {
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "llm_latency": args.llm_latency,
+            "geocode_latency": args.geocode_latency,
+            "geocode_qps": args.geocode_qps,
+            "job_workers": args.job_workers,
+            "seed": args.seed,
+        },
+        "runs": [],
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in args.sizes:
+            report["runs"].append(await run_size(size, args, Path(tmp)))
+    return report
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10,10000", type=lambda s: [int(x) for x in s.split(",")],
+                        help="comma-separated pin/message counts to seed (default: 10,10000)")
+    parser.add_argument("--endpoints", default=",".join(ENDPOINTS), type=lambda s: s.split(","),
+                        help=f"comma-separated subset of {', '.join(ENDPOINTS)}")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=100, help="requests per endpoint per size")
+    parser.add_argument("--llm-latency", type=float, default=0.0, help="seconds per fake LLM call")
+    parser.add_argument("--geocode-latency", type=float, default=0.0, help="seconds per fake geocode call")
+    parser.add_argument("--geocode-qps", type=float, default=0.0, help="geocoder rate limit (default: unlimited)")
+    parser.add_argument("--job-workers", type=int, default=2)
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--output", type=Path, help="write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+    unknown = set(args.endpoints) - set(ENDPOINTS)
+    if unknown:
+        parser.error(f"unknown endpoints: {', '.join(sorted(unknown))}")
+    return args
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    report = asyncio.run(main(args))
+    text = json.dumps(report, indent=2)
+    if args.output:
+        args.output.write_text(text + "\n")
+    else:
+        print(text)
@@ -0,0 +1,142 @@
+"""Micro-benchmarks for the per-turn LLM helpers in app/services/llm.py.
+
+Times ``_parse_response``, ``_clean_content``, ``_build_map_state_message``
+and ``_to_langchain_messages`` on generated inputs of growing size, and
+records peak allocations with tracemalloc. The map state is also timed
+through ``PinStore.map_state_message``: unchanged (a cache hit) and after
+one pin change. Prints a JSON report.
+
+    python -m benchmarks.micro_llm
+    python -m benchmarks.micro_llm --sizes 1000,100000 --repeat 7 --output micro.json
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import statistics
+import time
+import tracemalloc
+from collections.abc import Callable
+from pathlib import Path
+
+from app.services import llm
+from app.services.pin_store import PinStore
+from benchmarks.loadtest import CATEGORIES, git_revision
+
+ACTION = '{"action": "place_pin", "address": "Av Paulista 1000, São Paulo", "category": "bakery", "name": "X", "confidence": 0.9}'
+
+
+def make_response(chars: int, variant: str) -> str:
+    """A long assistant reply of roughly ``chars`` characters ending in an action block."""
+    words = ("the", "map", "pin", "near", "bakery", "{curly}", "street", "json", "café")
+    rng = random.Random(chars)
+    body = []
+    total = 0
+    while total < chars:
+        w = rng.choice(words)
+        body.append(w)
+        total += len(w) + 1
+    text = " ".join(body)
+    if variant == "plain":
+        return f"{text} {ACTION}"
+    if variant == "fenced":
+        return f"{text}\n\n```json\n{ACTION}\n```"
+    if variant == "no_action":
+        return text
+    raise ValueError(variant)
+
+
+def make_pins(n: int) -> list[dict]:
+    rng = random.Random(n)
+    return [
+        {
+            "lat": rng.uniform(-90, 90),
+            "lng": rng.uniform(-180, 180),
+            "name": f"Place {i}" if i % 5 else None,
+            "category": rng.choice(CATEGORIES),
+            "status": "confirmed" if i % 3 else "draft",
+        }
+        for i in range(n)
+    ]
+
+
+def make_store(pins: list[dict]) -> PinStore:
+    store = PinStore()
+    store.load(
+        ((i, p["lat"], p["lng"], p["name"], p["category"], p["status"], None) for i, p in enumerate(pins, 1)), 1
+    )
+    return store
+
+
+def change_one(store: PinStore) -> str:
+    """Flip one pin's status, as a pin event would, and rebuild the message."""
+    row = store.row(1)
+    store.put(1, row.lat, row.lng, row.name, row.category, "draft" if row.status == "confirmed" else "confirmed", None)
+    store.version += 1
+    return store.map_state_message()
+
+
+def make_messages(n: int) -> list[dict]:
+    roles = ("user", "assistant", "system")
+    return [{"role": roles[i % 3], "content": f"message {i} " * 8} for i in range(n)]
+
+
+def measure(fn: Callable[[], object], repeat: int) -> dict:
+    """Best/median wall time over ``repeat`` runs plus peak traced allocation."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "best_ms": round(min(times) * 1000, 4),
+        "median_ms": round(statistics.median(times) * 1000, 4),
+        "peak_kib": round(peak / 1024, 1),
+    }
+
+
+def run(sizes: list[int], repeat: int) -> dict:
+    results: dict[str, dict] = {}
+    for size in sizes:
+        for variant in ("plain", "fenced", "no_action"):
+            content = make_response(size, variant)
+            results[f"parse_response/{variant}/{size}"] = measure(lambda: llm._parse_response(content), repeat)
+        prefix = make_response(size, "no_action") + "\n\n```json  \n"
+        results[f"clean_content/{size}"] = measure(lambda: llm._clean_content(prefix), repeat)
+
+        pins = make_pins(size)
+        results[f"build_map_state/{size}"] = measure(lambda: llm._build_map_state_message(pins), repeat)
+        store = make_store(pins)
+        store.map_state_message()
+        results[f"map_state_cached/{size}"] = measure(store.map_state_message, repeat)
+        results[f"map_state_one_change/{size}"] = measure(lambda: change_one(store), repeat)
+
+        messages = make_messages(min(size, 20000))
+        results[f"to_langchain/{len(messages)}"] = measure(lambda: llm._to_langchain_messages(messages), repeat)
+    return results
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1000,10000,100000", type=lambda s: [int(x) for x in s.split(",")],
+                        help="response length in chars / pin count / message count")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", type=Path)
+    args = parser.parse_args(argv)
+
+    report = {"commit": git_revision(), "repeat": args.repeat, "results": run(args.sizes, args.repeat)}
+    text = json.dumps(report, indent=2)
+    if args.output:
+        args.output.write_text(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""Per-row cost of ORM reads against the Core read models in app/services/read_models.py.
+
+Seeds a fresh SQLite database per size with that many pins and chat
+messages, then times each way of reading them in a new session per run:
+the ORM ``select(Pin)`` / ``select(ChatMessage)`` the routes used to do
+(copying attributes into dicts where they did), ``read_models.pins`` /
+``read_models.messages``, and the raw ``read_models.pin_tuples``. Reports
+best/median time and best time per row. Prints a JSON report.
+
+    python -m benchmarks.orm_reads
+    python -m benchmarks.orm_reads --sizes 10000,100000 --repeat 7 --output reads.json
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import tempfile
+import time
+from collections.abc import Awaitable, Callable
+from pathlib import Path
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.models import Base, ChatMessage, Pin
+from app.services import read_models
+from benchmarks.loadtest import git_revision, seed
+
+
+async def orm_pins(db: AsyncSession) -> list[dict]:
+    result = await db.execute(select(Pin))
+    return [
+        {
+            "id": p.id,
+            "lat": p.lat,
+            "lng": p.lng,
+            "name": p.name,
+            "category": p.category,
+            "status": p.status.value,
+            "confidence": p.confidence,
+        }
+        for p in result.scalars().all()
+    ]
+
+
+async def read_model_pins(db: AsyncSession) -> list[dict]:
+    return [p.to_dict() for p in await read_models.pins(db)]
+
+
+async def orm_messages(db: AsyncSession) -> list:
+    result = await db.execute(select(ChatMessage).order_by(ChatMessage.created_at))
+    return result.scalars().all()
+
+
+READERS: dict[str, Callable[[AsyncSession], Awaitable[list]]] = {
+    "pins/orm": orm_pins,
+    "pins/read_model": read_model_pins,
+    "pins/tuples": read_models.pin_tuples,
+    "messages/orm": orm_messages,
+    "messages/read_model": read_models.messages,
+}
+
+
+async def run_size(size: int, repeat: int, workdir: Path) -> dict:
+    engine = create_async_engine(f"sqlite+aiosqlite:///{workdir / f'reads_{size}.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    session_factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    await seed(session_factory, pins=size, messages=size, rng=random.Random(size))
+
+    results = {}
+    try:
+        for name, reader in READERS.items():
+            times = []
+            for _ in range(repeat):
+                async with session_factory() as db:
+                    start = time.perf_counter()
+                    rows = await reader(db)
+                    times.append(time.perf_counter() - start)
+            assert len(rows) == size
+            results[name] = {
+                "best_ms": round(min(times) * 1000, 3),
+                "median_ms": round(statistics.median(times) * 1000, 3),
+                "per_row_us": round(min(times) / size * 1e6, 3),
+            }
+    finally:
+        await engine.dispose()
+    return {"rows": size, "readers": results}
+
+
+async def main(args: argparse.Namespace) -> dict:
+    report = {"commit": git_revision(), "repeat": args.repeat, "runs": []}
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in args.sizes:
+            report["runs"].append(await run_size(size, args.repeat, Path(tmp)))
+    return report
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10000,100000", type=lambda s: [int(x) for x in s.split(",")])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", type=Path)
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    text = json.dumps(asyncio.run(main(args)), indent=2)
+    if args.output:
+        args.output.write_text(text + "\n")
+    else:
+        print(text)
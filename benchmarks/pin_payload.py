@@ -0,0 +1,105 @@
+"""Compare the /map/pins payload formats: json (default), columns and binary.
+
+Seeds a fresh SQLite database per size. For each format it reports the
+request time through the app, the payload size raw and gzipped, and the
+time to parse the payload back into columns: ``json.loads`` for the JSON
+formats, ``pin_formats.decode_binary`` for the buffer. The browser uses
+typed array views instead, which is cheaper still. Prints a JSON report.
+
+    python -m benchmarks.pin_payload
+    python -m benchmarks.pin_payload --sizes 1000,100000 --repeat 7 --output payload.json
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import gzip
+import json
+import random
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.db.session import get_db
+from app.main import app
+from app.models import Base
+from app.services import pin_formats
+from benchmarks.loadtest import git_revision, seed
+
+
+def parse(fmt: str, content: bytes) -> object:
+    if fmt == "binary":
+        return pin_formats.decode_binary(content)
+    return json.loads(content)
+
+
+def timings(times: list[float]) -> dict:
+    return {"best_ms": round(min(times) * 1000, 3), "median_ms": round(statistics.median(times) * 1000, 3)}
+
+
+async def run_size(size: int, repeat: int, workdir: Path) -> dict:
+    engine = create_async_engine(f"sqlite+aiosqlite:///{workdir / f'payload_{size}.db'}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    session_factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    await seed(session_factory, pins=size, messages=0, rng=random.Random(size))
+
+    async def _get_db():
+        async with session_factory() as session:
+            yield session
+
+    app.dependency_overrides[get_db] = _get_db
+    results = {}
+    try:
+        transport = ASGITransport(app=app)
+        async with AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            for fmt in pin_formats.FORMATS:
+                request_times, parse_times = [], []
+                for _ in range(repeat):
+                    start = time.perf_counter()
+                    resp = await client.get("/map/pins", params={"format": fmt})
+                    request_times.append(time.perf_counter() - start)
+                    resp.raise_for_status()
+
+                    start = time.perf_counter()
+                    parse(fmt, resp.content)
+                    parse_times.append(time.perf_counter() - start)
+                results[fmt] = {
+                    "request": timings(request_times),
+                    "parse": timings(parse_times),
+                    "bytes": len(resp.content),
+                    "gzip_bytes": len(gzip.compress(resp.content, compresslevel=6)),
+                }
+    finally:
+        app.dependency_overrides.clear()
+        await engine.dispose()
+    return {"pins": size, "formats": results}
+
+
+async def main(args: argparse.Namespace) -> dict:
+    report = {"commit": git_revision(), "repeat": args.repeat, "runs": []}
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in args.sizes:
+            report["runs"].append(await run_size(size, args.repeat, Path(tmp)))
+    return report
+
+
+def parse_args(argv: list[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1000,10000,100000", type=lambda s: [int(x) for x in s.split(",")])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--output", type=Path)
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    text = json.dumps(asyncio.run(main(args)), indent=2)
+    if args.output:
+        args.output.write_text(text + "\n")
+    else:
+        print(text)
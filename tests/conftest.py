@@ -1,5 +1,8 @@
 from __future__ import annotations
 
+import asyncio
+import os
+
 import pytest
 from httpx import ASGITransport, AsyncClient
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
@@ -7,19 +10,89 @@ from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_asyn
 from app.db.session import get_db
 from app.main import app
 from app.models import Base
+from app.services import clusters, jobs, mvt, pin_store
+
+# Set TEST_DATABASE_URL (e.g. postgresql+asyncpg://localhost/karte_test, a
+# database the user may create extensions in) to run against PostgreSQL +
+# PostGIS. Without it, or if that server can't be reached, every test gets
+# its own SQLite file.
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL", "")
+postgres_url: str | None = None
+
+
+def _reachable(url: str) -> bool:
+    async def connect():
+        engine = create_async_engine(url)
+        try:
+            async with engine.connect():
+                return True
+        finally:
+            await engine.dispose()
+
+    try:
+        return asyncio.run(connect())
+    except Exception:  # no server, no driver, bad credentials
+        return False
+
+
+def pytest_configure(config):
+    global postgres_url
+    if TEST_DATABASE_URL:
+        postgres_url = TEST_DATABASE_URL if _reachable(TEST_DATABASE_URL) else None
+
+
+def pytest_report_header(config):
+    if postgres_url:
+        return f"database: {postgres_url}"
+    if TEST_DATABASE_URL:
+        return f"database: sqlite ({TEST_DATABASE_URL} unreachable)"
+    return "database: sqlite"
+
+
+def pytest_collection_modifyitems(config, items):
+    if postgres_url:
+        skip = pytest.mark.skip(reason="SQLite-specific")
+        for item in items:
+            if "sqlite_only" in item.keywords:
+                item.add_marker(skip)
+
+
+@pytest.fixture(autouse=True)
+def cluster_index(monkeypatch):
+    """A fresh cluster index per test; it would otherwise outlive the test's database."""
+    index = clusters.ClusterIndex()
+    monkeypatch.setattr(clusters, "index", index)
+    return index
+
+
+@pytest.fixture(autouse=True)
+def memory_store(monkeypatch):
+    store = pin_store.PinStore()
+    monkeypatch.setattr(pin_store, "store", store)
+    return store
+
 
-TEST_DATABASE_URL = "sqlite+aiosqlite:///:memory:"
+@pytest.fixture(autouse=True)
+def tile_cache(tmp_path, monkeypatch):
+    cache = mvt.TileCache(tmp_path / "tiles")
+    monkeypatch.setattr(mvt, "cache", cache)
+    return cache
 
 
 @pytest.fixture
-async def db_session():
-    engine = create_async_engine(TEST_DATABASE_URL)
+async def db_engine(tmp_path):
+    if postgres_url:
+        engine = create_async_engine(postgres_url)
+        async with engine.begin() as conn:
+            # Leftovers of an interrupted run
+            await conn.run_sync(Base.metadata.drop_all)
+    else:
+        # A file database (not :memory:) so background jobs get their own connection
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'test.db'}")
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
 
-    session_factory = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
-    async with session_factory() as session:
-        yield session
+    yield engine
 
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.drop_all)
@@ -27,7 +100,36 @@ async def db_session():
 
 
 @pytest.fixture
-async def client(db_session):
+async def db_session(db_engine):
+    session_factory = async_sessionmaker(db_engine, class_=AsyncSession, expire_on_commit=False)
+    async with session_factory() as session:
+        yield session
+
+
+@pytest.fixture
+async def job_queue(db_engine, monkeypatch):
+    queue = jobs.JobQueue(
+        async_sessionmaker(db_engine, class_=AsyncSession, expire_on_commit=False), workers=1
+    )
+    monkeypatch.setattr(jobs, "queue", queue)
+    await queue.start()
+    yield queue
+    await queue.stop()
+
+
+@pytest.fixture
+def run_jobs(job_queue, db_session):
+    """Wait for queued background jobs, then drop stale objects from the test session."""
+
+    async def _run():
+        await job_queue.join()
+        db_session.expire_all()
+
+    return _run
+
+
+@pytest.fixture
+async def client(db_session, job_queue):
     async def _override_get_db():
         yield db_session
 
@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+import asyncio
+from datetime import datetime
+from unittest.mock import patch
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.models import ChatArchive, ChatMessage
+from app.services import archive, conversations, read_models
+
+
+def _old(day: int) -> datetime:
+    return datetime(2024, 1, day, 12, 0, 0)
+
+
+async def _seed(db_session, old: int, new: int = 2) -> None:
+    db_session.add_all([ChatMessage(role="user", content=f"old {i}", created_at=_old(1 + i % 20)) for i in range(old)])
+    db_session.add_all([ChatMessage(role="user", content=f"new {i}") for i in range(new)])
+    await db_session.commit()
+
+
+def test_pack_round_trip():
+    rows = [read_models.MessageRow(1, "user", "héllo\nthere", _old(1)), read_models.MessageRow(2, "assistant", "hi", _old(2))]
+    assert archive.unpack(archive.pack(rows)) == [
+        {"id": 1, "role": "user", "content": "héllo\nthere", "created_at": "2024-01-01T12:00:00"},
+        {"id": 2, "role": "assistant", "content": "hi", "created_at": "2024-01-02T12:00:00"},
+    ]
+
+
+async def test_batches_leave_one_summary_message(db_session):
+    await _seed(db_session, old=5)
+    cutoff = datetime(2024, 6, 1)
+
+    assert await archive.archive_batch(db_session, cutoff, limit=3) == 3
+    assert await archive.archive_batch(db_session, cutoff, limit=3) == 2
+    assert await archive.archive_batch(db_session, cutoff, limit=3) == 0
+
+    messages = await read_models.messages(db_session)
+    assert [m.content for m in messages[1:]] == ["new 0", "new 1"]
+    summary = messages[0]
+    assert summary.role == "system" and summary.content.startswith("5 earlier message(s) from 2024-01-01 to 2024-01-05")
+
+    archives = (await db_session.execute(select(ChatArchive).order_by(ChatArchive.id))).scalars().all()
+    assert [a.message_count for a in archives] == [3, 2]
+    assert {a.summary_message_id for a in archives} == {summary.id}
+    unpacked = [m["content"] for a in archives for m in await archive.archived_messages(db_session, a.id)]
+    assert unpacked == [f"old {i}" for i in range(5)]
+
+
+async def test_archiver_runs_bounded_batches(db_engine, db_session):
+    await _seed(db_session, old=7)
+    archiver = archive.Archiver(async_sessionmaker(db_engine, class_=AsyncSession, expire_on_commit=False))
+
+    assert await archiver.run_once(before=datetime(2024, 6, 1), batch=3) == 7
+    assert await db_session.scalar(select(func.count()).select_from(ChatArchive)) == 3
+    assert await db_session.scalar(select(func.count()).select_from(ChatMessage)) == 3  # summary + 2 new
+    # Recent messages are left alone
+    assert await archiver.run_once(batch=3) == 0
+
+
+async def test_archive_routes(client, db_session):
+    await _seed(db_session, old=2)
+    await archive.archive_batch(db_session, datetime(2024, 6, 1))
+
+    listing = (await client.get("/chat/archives")).json()
+    assert [a["message_count"] for a in listing] == [2]
+    resp = await client.get(f"/chat/archives/{listing[0]['id']}")
+    assert [m["content"] for m in resp.json()["messages"]] == ["old 0", "old 1"]
+    assert (await client.get("/chat/archives/999")).status_code == 404
+
+
+async def test_concurrent_archivers_archive_each_message_once(db_engine, db_session):
+    await _seed(db_session, old=6)
+    factory = async_sessionmaker(db_engine, class_=AsyncSession, expire_on_commit=False)
+    workers = [archive.Archiver(factory), archive.Archiver(factory)]
+
+    await asyncio.gather(*(w.run_once(before=datetime(2024, 6, 1), batch=2) for w in workers))
+    await asyncio.gather(*(w.run_once(before=datetime(2024, 6, 1), batch=2) for w in workers))
+
+    archives = (await db_session.execute(select(ChatArchive))).scalars().all()
+    archived = [m["content"] for a in archives for m in await archive.archived_messages(db_session, a.id)]
+    assert sorted(archived) == [f"old {i}" for i in range(6)]
+
+
+async def test_cleared_conversations_are_archived_by_conversation(db_session):
+    cutoff = datetime(2024, 6, 1)
+    await _seed(db_session, old=3, new=0)
+    assert await archive.archive_batch(db_session, cutoff, limit=2) == 2  # leaves a summary
+    await conversations.start_new(db_session)
+    await db_session.commit()
+    db_session.add_all([ChatMessage(role="user", content=f"current {i}", created_at=_old(25)) for i in range(2)])
+    await db_session.commit()
+
+    # The cleared conversation first; the summary no one sees any more is dropped on its own
+    assert await archive.archive_batch(db_session, cutoff) == 1
+    assert await archive.archive_batch(db_session, cutoff) == 2
+    assert await archive.archive_batch(db_session, cutoff) == 0
+    assert await archive.drop_stale_summaries(db_session) == 1
+
+    archives = (await db_session.execute(select(ChatArchive).order_by(ChatArchive.id))).scalars().all()
+    assert [(a.conversation_id, a.message_count) for a in archives] == [(0, 2), (0, 1), (1, 2)]
+    remaining = (await db_session.execute(select(ChatMessage.content))).scalars().all()
+    assert remaining == ["2 earlier message(s) from 2024-01-25 to 2024-01-25 were moved to the chat archive."]
+
+
+async def test_fully_archived_conversation_loses_its_summary_once_cleared(db_engine, db_session):
+    await _seed(db_session, old=3, new=0)
+    archiver = archive.Archiver(async_sessionmaker(db_engine, class_=AsyncSession, expire_on_commit=False))
+    assert await archiver.run_once(before=datetime(2024, 6, 1)) == 3
+    assert [m.role for m in await read_models.messages(db_session)] == ["system"]
+
+    await conversations.start_new(db_session)
+    await db_session.commit()
+    # Nothing is due, but the cleared conversation's summary still goes
+    assert await archiver.run_once(before=datetime(2024, 6, 1)) == 0
+    assert await db_session.scalar(select(func.count()).select_from(ChatMessage)) == 0
+    assert await db_session.scalar(select(ChatArchive.message_count)) == 3
+
+
+async def test_clearing_keeps_the_archive(client, db_session):
+    await _seed(db_session, old=2)
+    await archive.archive_batch(db_session, datetime(2024, 6, 1))
+    result = {"content": "Cleared", "clear_chat": True}
+    with patch("app.routes.chat.get_assistant_response", return_value=result):
+        await client.post("/chat/send", data={"message": "clear"})
+
+    assert await read_models.messages(db_session) == []
+    listing = (await client.get("/chat/archives?conversation=0")).json()
+    assert [(a["conversation_id"], a["message_count"]) for a in listing] == [(0, 2)]
+    assert (await client.get("/chat/archives?conversation=1")).json() == []
@@ -0,0 +1,66 @@
+from __future__ import annotations
+
+import pytest
+
+from benchmarks import loadtest, micro_llm, orm_reads, pin_payload
+from benchmarks.fakes import FakeChatModel, FakeGeocoder
+
+
+def test_percentile_nearest_rank():
+    values = [float(i) for i in range(1, 101)]
+    assert loadtest.percentile(values, 50) == 50.0
+    assert loadtest.percentile(values, 95) == 95.0
+    assert loadtest.percentile(values, 99) == 99.0
+    assert loadtest.percentile([], 50) == 0.0
+
+
+@pytest.mark.asyncio
+async def test_fake_geocoder_is_deterministic():
+    geo = FakeGeocoder()
+    assert await geo("Av Paulista 1000") == await geo("Av Paulista 1000")
+    assert await geo("Av Paulista 1000") != await geo("Rua Augusta 1")
+    assert await FakeGeocoder(miss_rate=1.0)("anything") is None
+
+
+def test_fake_llm_emits_actions():
+    from langchain_core.messages import HumanMessage
+
+    llm = FakeChatModel()
+    assert '"place_pin"' in llm.invoke([HumanMessage(content="add bakery on rua x")]).content
+    assert '"action"' not in llm.invoke([HumanMessage(content="how many pins?")]).content
+
+
+@pytest.mark.asyncio
+async def test_loadtest_smoke(tmp_path):
+    """The harness runs end to end and reports every endpoint."""
+    args = loadtest.parse_args(["--sizes", "10", "--requests", "4", "--concurrency", "2"])
+    run = await loadtest.run_size(10, args, tmp_path)
+
+    assert set(run["endpoints"]) == set(loadtest.ENDPOINTS)
+    for stats in run["endpoints"].values():
+        assert stats["requests"] == 4
+        assert stats["errors"] == 0
+        assert stats["p50_ms"] <= stats["p95_ms"] <= stats["p99_ms"]
+    assert run["llm_calls"] > 0
+
+
+def test_micro_llm_smoke():
+    results = micro_llm.run([200], repeat=1)
+    assert "parse_response/fenced/200" in results
+    assert "build_map_state/200" in results
+    assert "map_state_cached/200" in results
+    assert all(r["best_ms"] >= 0 and r["peak_kib"] >= 0 for r in results.values())
+
+
+@pytest.mark.asyncio
+async def test_pin_payload_smoke(tmp_path):
+    run = await pin_payload.run_size(20, repeat=1, workdir=tmp_path)
+    assert set(run["formats"]) == {"json", "columns", "binary"}
+    assert run["formats"]["binary"]["bytes"] < run["formats"]["json"]["bytes"]
+
+
+@pytest.mark.asyncio
+async def test_orm_reads_smoke(tmp_path):
+    run = await orm_reads.run_size(20, repeat=1, workdir=tmp_path)
+    assert set(run["readers"]) == set(orm_reads.READERS)
+    assert all(r["per_row_us"] >= 0 for r in run["readers"].values())
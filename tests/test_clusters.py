@@ -0,0 +1,225 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import random
+import threading
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from app.models import Pin, PinStatus
+from app.services import clusters, events, metrics
+from app.services.clusters import CLUSTER_MAX_ZOOM, ClusterIndex, project, unproject
+
+# Two pins ~100 m apart near Av. Paulista, and one in Rio
+ROWS = [
+    (1, -23.5614, -46.6559, "Padaria A", "bakery", "confirmed"),
+    (2, -23.5614, -46.6549, "Drogaria B", "pharmacy", "draft"),
+    (3, -22.9068, -43.1729, "Rio Cafe", "cafe", "confirmed"),
+]
+
+
+def tile_of(lat: float, lng: float, z: int) -> tuple[int, int, int]:
+    x, y = project(lat, lng)
+    return z, int(x * 2**z), int(y * 2**z)
+
+
+def decode(index: ClusterIndex, z: int, x: int, y: int) -> dict:
+    return json.loads(index.tile(z, x, y))
+
+
+def loaded(rows=ROWS) -> ClusterIndex:
+    index = ClusterIndex()
+    index.load(rows)
+    return index
+
+
+def test_project_roundtrip_and_clamping():
+    lat, lng = unproject(*project(-23.5614, -46.6559))
+    assert lat == pytest.approx(-23.5614) and lng == pytest.approx(-46.6559)
+    assert project(0, 0) == (0.5, 0.5)
+    x, y = project(90, 180)
+    assert 0 <= x < 1 and 0 <= y < 1
+
+
+def test_world_tile_clusters_everything():
+    tile = decode(loaded(), 0, 0, 0)
+    assert tile["pins"] == []
+    assert [c["count"] for c in tile["clusters"]] == [3]
+    assert tile["clusters"][0]["drafts"] == 1
+
+
+def test_clusters_split_as_zoom_grows():
+    index = loaded()
+    z, x, y = tile_of(-23.5614, -46.6559, 8)
+    tile = decode(index, z, x, y)
+    assert [c["count"] for c in tile["clusters"]] == [2]
+    cluster = tile["clusters"][0]
+    assert cluster["lat"] == pytest.approx(-23.5614)
+    assert cluster["lng"] == pytest.approx(-46.6554)
+
+    # At its expansion zoom the two pins come apart
+    tile = decode(index, *tile_of(-23.5614, -46.6559, cluster["expand"]))
+    assert tile["clusters"] == []
+    assert sorted(p["name"] for p in tile["pins"]) == ["Drogaria B", "Padaria A"]
+
+
+def test_tiles_past_cluster_zoom_list_pins():
+    index = loaded()
+    tile = decode(index, *tile_of(-23.5614, -46.6549, CLUSTER_MAX_ZOOM + 1))
+    assert tile["clusters"] == [] and len(tile["pins"]) == 2
+    tile = decode(index, *tile_of(-23.5614, -46.6549, 20))
+    assert tile == {
+        "clusters": [],
+        "pins": [{"id": 2, "lat": -23.5614, "lng": -46.6549, "name": "Drogaria B",
+                  "category": "pharmacy", "status": "draft"}],
+    }
+
+
+def test_coincident_pins_never_split():
+    index = loaded([(1, 10.0, 10.0, "A", "other", "draft"), (2, 10.0, 10.0, "B", "other", "draft")])
+    tile = decode(index, *tile_of(10.0, 10.0, CLUSTER_MAX_ZOOM))
+    assert tile["clusters"][0]["expand"] == CLUSTER_MAX_ZOOM + 1
+    tile = decode(index, *tile_of(10.0, 10.0, CLUSTER_MAX_ZOOM + 1))
+    assert sorted(p["name"] for p in tile["pins"]) == ["A", "B"]
+
+
+def test_add_remove_update_keep_cells_and_cache_current():
+    index = loaded()
+    key = tile_of(-23.5614, -46.6559, 12)
+    assert len(decode(index, *key)["clusters"]) == 1
+
+    index.remove(2)
+    assert decode(index, *key) == {
+        "clusters": [],
+        "pins": [{"id": 1, "lat": -23.5614, "lng": -46.6559, "name": "Padaria A",
+                  "category": "bakery", "status": "confirmed"}],
+    }
+    index.remove(2)  # idempotent
+
+    index.add(1, -23.5614, -46.6559, "Padaria A", "bakery", "draft")
+    assert decode(index, *key)["pins"][0]["status"] == "draft"
+    assert decode(index, 0, 0, 0)["clusters"][0]["drafts"] == 1
+
+    # Moving a pin evicts both its old and its new tiles
+    index.add(1, -22.9068, -43.1730, "Padaria A", "bakery", "draft")
+    assert decode(index, *key) == {"clusters": [], "pins": []}
+    assert decode(index, *tile_of(-22.9068, -43.1729, 12))["clusters"][0]["count"] == 2
+
+
+def test_incremental_matches_full_rebuild():
+    rng = random.Random(7)
+    rows = [
+        (i, -23.55 + rng.uniform(-0.5, 0.5), -46.63 + rng.uniform(-0.5, 0.5), None, "other",
+         rng.choice(("draft", "confirmed")))
+        for i in range(1, 400)
+    ]
+    index = loaded(rows)
+    for pin_id in range(1, 400, 3):
+        index.remove(pin_id)
+    rebuilt = loaded([r for r in rows if r[0] % 3 != 1])
+    for z in range(CLUSTER_MAX_ZOOM + 1):
+        assert {k: (c.count, c.drafts, c.id_sum) for k, c in index.levels[z].items()} == {
+            k: (c.count, c.drafts, c.id_sum) for k, c in rebuilt.levels[z].items()
+        }
+    assert index.leaves == rebuilt.leaves
+
+
+def test_tile_cache_is_lru_and_counts_hits():
+    index = ClusterIndex(cache_size=2)
+    index.load(ROWS)
+    hits = metrics.CLUSTER_TILES.value(outcome="hit")
+    index.tile(0, 0, 0)
+    index.tile(1, 0, 1)
+    index.tile(0, 0, 0)
+    assert metrics.CLUSTER_TILES.value(outcome="hit") == hits + 1
+    index.tile(1, 1, 1)
+    assert list(index._tiles) == [(0, 0, 0), (1, 1, 1)]
+
+
+def test_broker_events_update_the_index(cluster_index):
+    cluster_index.load(ROWS)
+    pin = Pin(id=4, lat=-23.5614, lng=-46.6569, name="New", category="other", status=PinStatus.draft)
+    events.publish_pin("created", pin)
+    assert decode(cluster_index, 0, 0, 0)["clusters"][0]["count"] == 4
+    events.publish_pins_deleted([1, 2, 4])
+    assert decode(cluster_index, 0, 0, 0) == {
+        "clusters": [],
+        "pins": [{"id": 3, "lat": -22.9068, "lng": -43.1729, "name": "Rio Cafe",
+                  "category": "cafe", "status": "confirmed"}],
+    }
+
+
+def test_events_before_loading_are_ignored(cluster_index):
+    events.publish_pins_deleted([1])
+    assert not cluster_index.loaded and len(cluster_index) == 0
+
+
+async def test_clusters_route_loads_from_db(client, db_session, run_jobs):
+    db_session.add_all([
+        Pin(lat=lat, lng=lng, name=name, category=category, status=PinStatus(status))
+        for _, lat, lng, name, category, status in ROWS
+    ])
+    await db_session.commit()
+
+    resp = await client.get("/map/clusters/0/0/0")
+    assert resp.status_code == 200
+    assert resp.json()["clusters"][0]["count"] == 3
+    assert len(clusters.index) == 3
+
+    # Later changes arrive through pin events, not a reload
+    llm_result = {"content": "Not sure what this is.", "classification": None}
+    with patch("app.services.pin_tasks.get_assistant_response", return_value=llm_result):
+        resp = await client.post("/map/click", data={"lat": "10.0", "lng": "10.0"})
+        await run_jobs()
+    assert resp.status_code == 200
+    tile = (await client.get("/map/clusters/0/0/0")).json()
+    assert [p["lat"] for p in tile["pins"]] == [10.0]
+
+
+@pytest.mark.parametrize("path", ["/map/clusters/1/2/0", "/map/clusters/0/0/1"])
+async def test_clusters_route_rejects_tiles_outside_the_grid(client, path):
+    assert (await client.get(path)).status_code == 404
+
+
+async def test_clusters_route_rejects_bad_zoom(client):
+    assert (await client.get("/map/clusters/21/0/0")).status_code == 422
+
+
+async def test_index_switches_to_clusters_for_large_maps(client, db_session, monkeypatch):
+    db_session.add_all([Pin(lat=1.0, lng=float(i), category="other") for i in range(3)])
+    await db_session.commit()
+    monkeypatch.setattr("app.core.config.CLUSTER_THRESHOLD", 2)
+    resp = await client.get("/")
+    assert "const pins = null;" in resp.text
+
+
+async def test_reload_swaps_in_a_complete_index(cluster_index, db_session):
+    cluster_index.load(ROWS, version=-1)  # stale against the database
+    halfway, resume = threading.Event(), threading.Event()
+    paulista = tile_of(-23.5614, -46.6559, CLUSTER_MAX_ZOOM + 1)
+
+    def slow_project(lat, lng):
+        if lat == 2.0:
+            halfway.set()
+            resume.wait(5)
+        return project(lat, lng)
+
+    rows = [(4, 1.0, 1.0, None, "other", "draft", None), (5, 2.0, 2.0, None, "other", "draft", None)]
+    with (
+        patch("app.services.read_models.pin_tuples", AsyncMock(return_value=rows)),
+        patch("app.services.clusters.project", slow_project),
+    ):
+        load = asyncio.create_task(cluster_index.ensure_loaded(db_session))
+        try:
+            await asyncio.to_thread(halfway.wait, 5)
+            # Mid-build, tiles are still cut from the old index whole
+            assert len(cluster_index) == 3
+            assert decode(cluster_index, 0, 0, 0)["clusters"][0]["count"] == 3
+            assert sorted(p["id"] for p in decode(cluster_index, *paulista)["pins"]) == [1, 2]
+        finally:
+            resume.set()
+        await load
+
+    assert sorted(cluster_index.pins) == [4, 5]
@@ -0,0 +1,120 @@
+from __future__ import annotations
+
+from datetime import datetime, timedelta, timezone
+from unittest.mock import patch
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.models import ChatMessage
+from app.services import archive, conversations, read_models
+
+
+def _llm_result(content: str, **overrides) -> dict:
+    result = {
+        "content": content, "request_click": False, "classification": None, "place_pin": None,
+        "delete_pins": None, "list_pins": False, "move_map": None, "nearby": None, "clear_chat": False,
+        "usage": {"input_tokens": 500, "output_tokens": 20, "cached_tokens": 256, "latency_ms": 800},
+    }
+    result.update(overrides)
+    return result
+
+
+def _reply(tokens: int, latency_ms: int, **fields) -> ChatMessage:
+    return ChatMessage(
+        role="assistant", content="ok", input_tokens=tokens, output_tokens=10,
+        cached_tokens=0, latency_ms=latency_ms, **fields,
+    )
+
+
+async def test_assistant_reply_stores_usage(client, db_session):
+    with patch("app.routes.chat.get_assistant_response", return_value=_llm_result("Hi there")):
+        await client.post("/chat/send", data={"message": "hello"})
+
+    reply = await db_session.scalar(select(ChatMessage).where(ChatMessage.role == "assistant"))
+    assert (reply.input_tokens, reply.output_tokens, reply.cached_tokens, reply.latency_ms) == (500, 20, 256, 800)
+    user = await db_session.scalar(select(ChatMessage).where(ChatMessage.role == "user"))
+    assert user.latency_ms is None and user.input_tokens is None
+
+
+async def test_clear_starts_a_new_conversation(client, db_session):
+    with patch("app.routes.chat.get_assistant_response", return_value=_llm_result("Hi")):
+        await client.post("/chat/send", data={"message": "hello"})
+    with patch("app.routes.chat.get_assistant_response", return_value=_llm_result("Cleared", clear_chat=True)):
+        await client.post("/chat/send", data={"message": "clear"})
+    assert await read_models.messages(db_session) == []
+
+    with patch("app.routes.chat.get_assistant_response", return_value=_llm_result("Hi again")):
+        await client.post("/chat/send", data={"message": "hello again"})
+    assert [m.content for m in await read_models.messages(db_session)] == ["hello again", "Hi again"]
+
+    usage = (await client.get("/chat/usage/conversations")).json()
+    assert [(c["conversation_id"], c["current"], c["messages"], c["llm_calls"]) for c in usage] == [
+        (1, True, 2, 1),
+        (0, False, 3, 1),  # hello, reply, clear (the clear's own reply isn't kept)
+    ]
+    assert usage[0]["input_tokens"] == 500 and usage[0]["avg_latency_ms"] == 800
+
+
+async def test_usage_by_day(db_session):
+    today = datetime.now(timezone.utc).replace(tzinfo=None, hour=12)
+    db_session.add_all([
+        _reply(100, 300, created_at=today - timedelta(days=1)),
+        _reply(200, 500, created_at=today - timedelta(days=1)),
+        ChatMessage(role="user", content="hi", created_at=today),
+        _reply(50, 1000, created_at=today),
+        _reply(999, 999, created_at=today - timedelta(days=40)),
+    ])
+    await db_session.commit()
+
+    days = await conversations.usage_by_day(db_session, days=7)
+    assert [d["day"] for d in days] == [f"{today - timedelta(days=1):%Y-%m-%d}", f"{today:%Y-%m-%d}"]
+    assert [(d["messages"], d["llm_calls"], d["input_tokens"], d["latency_ms"]) for d in days] == [
+        (2, 2, 300, 800),
+        (2, 1, 50, 1000),
+    ]
+    assert days[0]["avg_latency_ms"] == 400 and days[0]["max_latency_ms"] == 500
+
+
+async def test_usage_routes_validate(client):
+    assert (await client.get("/chat/usage/daily")).json() == []
+    assert (await client.get("/chat/usage/daily?days=0")).status_code == 422
+    assert (await client.get("/chat/usage/conversations?limit=0")).status_code == 422
+
+
+
+async def test_usage_survives_archiving(db_engine, db_session):
+    today = datetime.now(timezone.utc).replace(tzinfo=None, hour=12)
+    long_ago = today - timedelta(days=40)
+    db_session.add_all([
+        ChatMessage(role="user", content="hi", created_at=long_ago),
+        _reply(100, 300, created_at=long_ago),
+        _reply(200, 900, created_at=long_ago + timedelta(minutes=1)),
+    ])
+    await db_session.commit()
+    await conversations.start_new(db_session)
+    await db_session.commit()
+    db_session.add_all([_reply(50, 500, created_at=long_ago + timedelta(minutes=2)), _reply(70, 700, created_at=today)])
+    await db_session.commit()
+
+    async def usage():
+        return (
+            await conversations.usage_by_day(db_session, days=60),
+            await conversations.usage_by_conversation(db_session),
+        )
+
+    before = await usage()
+    archiver = archive.Archiver(async_sessionmaker(db_engine, class_=AsyncSession, expire_on_commit=False))
+    # Two batches of the cleared conversation, then one of the current
+    assert await archiver.run_once(before=today - timedelta(days=30), batch=2) == 4
+    assert await db_session.scalar(select(func.count()).select_from(ChatMessage)) == 2  # summary + today's reply
+    after = await usage()
+
+    # The summary message left in the chat (dated like the last message it
+    # replaces) now counts as one of the current conversation's messages
+    by_day, by_conversation = before
+    by_day[0]["messages"] += 1
+    by_conversation[0]["messages"] += 1
+    assert after[0] == by_day
+    assert after[1] == by_conversation
+    assert [(d["llm_calls"], d["input_tokens"], d["max_latency_ms"]) for d in after[0]] == [(3, 350, 900), (1, 70, 700)]
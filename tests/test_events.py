@@ -0,0 +1,119 @@
+from __future__ import annotations
+
+import json
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from app.models import Pin, PinStatus
+from app.routes.events import event_stream
+from app.services import events, read_models
+from app.services.events import Broker, Event, broker
+
+
+def _drain(q) -> list[Event]:
+    out = []
+    while not q.empty():
+        out.append(q.get_nowait())
+    return out
+
+
+def test_event_encode_is_sse_frame():
+    frame = Event("pins", {"action": "deleted", "ids": [1]}, origin="tab1").encode()
+    assert frame.startswith("event: pins\ndata: ")
+    assert frame.endswith("\n\n")
+    data = json.loads(frame.split("data: ", 1)[1])
+    assert data == {"action": "deleted", "ids": [1], "origin": "tab1"}
+
+
+def test_broker_fans_out_to_subscribers_and_listeners():
+    b = Broker()
+    q1, q2 = b.subscribe(), b.subscribe()
+    seen = []
+    b.add_listener(seen.append)
+
+    b.publish("messages", {"action": "cleared"})
+
+    assert [e.name for e in _drain(q1)] == ["messages"]
+    assert [e.name for e in _drain(q2)] == ["messages"]
+    assert len(seen) == 1
+
+    b.unsubscribe(q1)
+    b.publish("messages", {"action": "cleared"})
+    assert _drain(q1) == []
+
+
+def test_broker_drops_oldest_for_slow_subscriber():
+    b = Broker(maxsize=2)
+    q = b.subscribe()
+    for i in range(3):
+        b.publish("pins", {"n": i})
+    assert [e.data["n"] for e in _drain(q)] == [1, 2]
+
+
+def test_failing_listener_does_not_block_publish():
+    b = Broker()
+    q = b.subscribe()
+    b.add_listener(MagicMock(side_effect=RuntimeError("boom")))
+    b.publish("pins", {})
+    assert len(_drain(q)) == 1
+
+
+@pytest.mark.asyncio
+async def test_event_stream_yields_published_events():
+    request = MagicMock()
+    request.is_disconnected = AsyncMock(return_value=False)
+    stream = event_stream(request)
+
+    assert (await anext(stream)).startswith("retry:")
+    pending = anext(stream)
+    broker.publish("pins", {"action": "deleted", "ids": [7]})
+    frame = await pending
+    assert frame.startswith("event: pins")
+    await stream.aclose()
+
+
+@pytest.mark.asyncio
+async def test_chat_send_publishes_message_events(client):
+    q = broker.subscribe()
+    mock = {"content": "Hi!", "request_click": False, "classification": None, "place_pin": None,
+            "delete_pins": None, "list_pins": False, "move_map": None, "clear_chat": False}
+    try:
+        with patch("app.routes.chat.get_assistant_response", return_value=mock):
+            await client.post("/chat/send", data={"message": "Hello"}, headers={"X-Karte-Client": "tab1"})
+        received = _drain(q)
+    finally:
+        broker.unsubscribe(q)
+
+    assert [(e.name, e.data["role"], e.origin) for e in received] == [
+        ("messages", "user", "tab1"),
+        ("messages", "assistant", "tab1"),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_chat_delete_publishes_deleted_ids(client, db_session):
+    pin = Pin(lat=1.0, lng=2.0, category="cafe", status=PinStatus.draft)
+    db_session.add(pin)
+    await db_session.commit()
+
+    q = broker.subscribe()
+    mock = {"content": "Gone.", "request_click": False, "classification": None, "place_pin": None,
+            "delete_pins": {"which": "drafts", "names": []}, "list_pins": False, "move_map": None,
+            "clear_chat": False}
+    try:
+        with patch("app.routes.chat.get_assistant_response", return_value=mock):
+            await client.post("/chat/send", data={"message": "delete drafts"})
+        received = [e for e in _drain(q) if e.name == "pins"]
+    finally:
+        broker.unsubscribe(q)
+
+    assert len(received) == 1
+    assert received[0].data == {"action": "deleted", "ids": [pin.id]}
+
+
+async def test_pin_events_match_the_json_api(db_session):
+    pin = Pin(lat=1.5, lng=2.5, name="Cafe", category="cafe", status=PinStatus.confirmed, confidence=0.8)
+    db_session.add(pin)
+    await db_session.commit()
+    assert events.pin_data(pin) == (await read_models.pins(db_session))[0].to_dict()
@@ -0,0 +1,71 @@
+from __future__ import annotations
+
+
+import pytest
+
+from app.services.gazetteer import MAX_CANDIDATES, Gazetteer, normalize
+
+ROWS = [
+    ("Padaria Real", "Av. Paulista 1000, São Paulo", -23.5613, -46.6565),
+    ("Museu de Arte de São Paulo", "Av. Paulista 1578, São Paulo", -23.5614, -46.6559),
+    ("Mercado Municipal", "Rua da Cantareira 306, São Paulo", -23.5417, -46.6297),
+]
+
+
+@pytest.fixture
+def gazetteer():
+    return Gazetteer.from_rows(ROWS)
+
+
+def test_lookup_matches_name_and_address_words(gazetteer):
+    geo = gazetteer.lookup("padaria real, paulista")
+    assert geo == {"lat": -23.5613, "lng": -46.6565, "formatted_address": "Padaria Real, Av. Paulista 1000, São Paulo"}
+
+
+def test_lookup_ignores_accents_and_case(gazetteer):
+    assert gazetteer.lookup("MUSEU DE ARTE DE SAO PAULO")["lat"] == -23.5614
+
+
+def test_lookup_requires_every_word(gazetteer):
+    assert gazetteer.lookup("Mercado Municipal Rio de Janeiro") is None
+    assert gazetteer.lookup("   ") is None
+
+
+def test_lookup_prefers_name_matches(gazetteer):
+    # "Paulista" appears in two addresses; the name match wins
+    assert gazetteer.lookup("Museu Paulista")["formatted_address"].startswith("Museu de Arte")
+
+
+def test_from_csv(tmp_path):
+    path = tmp_path / "places.csv"
+    path.write_text(
+        "name,address,lat,lon\n"
+        "Padaria Real,Av. Paulista 1000,-23.5613,-46.6565\n"
+        "Broken,Nowhere,,\n"
+    )
+    gazetteer = Gazetteer.from_file(path)
+    assert len(gazetteer) == 1
+    assert gazetteer.lookup("padaria real") is not None
+
+
+@pytest.mark.asyncio
+async def test_geocode_is_async(gazetteer):
+    assert (await gazetteer.geocode("Padaria Real"))["lat"] == -23.5613
+
+
+def test_exact_key_lookup_and_save(tmp_path, gazetteer):
+    assert normalize("Av. São João") == "av sao joao"
+    # Exact name/address keys resolve without going through full-text search
+    key_hit = gazetteer.conn.execute("SELECT place_id FROM place_keys WHERE key = ?", ("padaria real",)).fetchone()
+    assert key_hit == (1,)
+
+    path = tmp_path / "saved.db"
+    gazetteer.save(path)
+    assert Gazetteer.from_file(path).lookup("PADARIA REAL")["lat"] == -23.5613
+
+
+def test_vague_queries_are_left_to_the_next_backend():
+    rows = [(f"Padaria {i}", "Rua Augusta, São Paulo", -23.55, -46.65) for i in range(MAX_CANDIDATES + 1)]
+    gazetteer = Gazetteer.from_rows(rows)
+    assert gazetteer.lookup("padaria augusta") is None
+    assert gazetteer.lookup("padaria 7 augusta") is not None
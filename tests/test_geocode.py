@@ -0,0 +1,289 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import pytest
+
+from app.services import geocode as geocode_module
+from app.services import metrics
+from app.services.geocode import (
+    ChainGeocoder,
+    GeocodeCache,
+    GeocodeError,
+    GeocodeScheduler,
+    OverQueryLimit,
+    TokenBucket,
+    build_geocoder,
+    geocode,
+    geocode_many,
+    google_lookup,
+)
+
+GEO = {"lat": -23.56, "lng": -46.65, "formatted_address": "Av. Paulista, São Paulo"}
+
+
+def make_lookup(*outcomes, delay: float = 0.0):
+    """An async lookup that returns (or raises) the given outcomes in order."""
+    calls = []
+
+    async def _lookup(address):
+        calls.append(address)
+        if delay:
+            await asyncio.sleep(delay)
+        outcome = outcomes[min(len(calls), len(outcomes)) - 1]
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+    return _lookup, calls
+
+
+@pytest.mark.asyncio
+async def test_identical_inflight_lookups_are_coalesced():
+    lookup, calls = make_lookup(GEO, delay=0.05)
+    scheduler = GeocodeScheduler(lookup, qps=0, burst=1)
+    before = metrics.GEOCODE_REQUESTS.value(outcome="coalesced")
+
+    results = await asyncio.gather(
+        scheduler.geocode("Av Paulista"),
+        scheduler.geocode("av  paulista "),
+        scheduler.geocode("AV PAULISTA"),
+    )
+
+    assert results == [GEO, GEO, GEO]
+    assert calls == ["Av Paulista"]
+    assert metrics.GEOCODE_REQUESTS.value(outcome="coalesced") - before == 2
+    # Once settled, the next lookup goes upstream again
+    await scheduler.geocode("Av Paulista")
+    assert len(calls) == 2
+
+
+@pytest.mark.asyncio
+async def test_cancelled_caller_does_not_cancel_shared_lookup():
+    lookup, calls = make_lookup(GEO, delay=0.05)
+    scheduler = GeocodeScheduler(lookup, qps=0, burst=1)
+
+    first = asyncio.ensure_future(scheduler.geocode("Rua Augusta"))
+    second = asyncio.ensure_future(scheduler.geocode("Rua Augusta"))
+    await asyncio.sleep(0)
+    first.cancel()
+
+    assert await second == GEO
+    assert len(calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_token_bucket_queues_bursts():
+    bucket = TokenBucket(rate=20, burst=2)
+    start = time.monotonic()
+    for _ in range(4):
+        await bucket.acquire()
+    # Two tokens are free, the next two wait 1/20s each
+    assert time.monotonic() - start >= 0.09
+
+
+@pytest.mark.asyncio
+async def test_over_query_limit_is_retried():
+    lookup, calls = make_lookup(OverQueryLimit(), OverQueryLimit(), GEO)
+    scheduler = GeocodeScheduler(lookup, qps=0, burst=1, max_retries=3, backoff=0.001)
+
+    assert await scheduler.geocode("Av Paulista") == GEO
+    assert len(calls) == 3
+
+
+@pytest.mark.asyncio
+async def test_over_query_limit_gives_up_after_max_retries():
+    lookup, calls = make_lookup(OverQueryLimit())
+    scheduler = GeocodeScheduler(lookup, qps=0, burst=1, max_retries=2, backoff=0.001)
+
+    with pytest.raises(OverQueryLimit):
+        await scheduler.geocode("Av Paulista")
+    assert len(calls) == 3
+
+
+@pytest.mark.asyncio
+async def test_lookup_errors_are_not_retried():
+    lookup, calls = make_lookup(RuntimeError("network down"))
+    scheduler = GeocodeScheduler(lookup, qps=0, burst=1, max_retries=3)
+
+    with pytest.raises(GeocodeError, match="network down"):
+        await scheduler.geocode("Av Paulista")
+    assert len(calls) == 1
+
+
+def google_response(status: str) -> AsyncMock:
+    resp = MagicMock()
+    resp.json.return_value = {"status": status, "results": []}
+    return AsyncMock(return_value=resp)
+
+
+@pytest.mark.asyncio
+async def test_google_lookup_not_found():
+    with patch("httpx.AsyncClient.get", google_response("ZERO_RESULTS")):
+        assert await google_lookup("Av Paulista") is None
+
+
+@pytest.mark.asyncio
+async def test_google_lookup_raises_on_quota_error():
+    with patch("httpx.AsyncClient.get", google_response("OVER_QUERY_LIMIT")):
+        with pytest.raises(OverQueryLimit):
+            await google_lookup("Av Paulista")
+
+
+@pytest.mark.asyncio
+async def test_google_lookups_share_one_client():
+    with patch("httpx.AsyncClient.get", google_response("ZERO_RESULTS")):
+        await google_lookup("Av Paulista")
+        client = geocode_module._client
+        await google_lookup("Rua Augusta")
+        assert geocode_module._client is client and not client.is_closed
+    await geocode_module.close()
+    assert client.is_closed and geocode_module._client is None
+
+
+class StubGeocoder:
+    def __init__(self, name, result=None, error=None):
+        self.name = name
+        self.result = result
+        self.error = error
+        self.calls = 0
+
+    async def geocode(self, address):
+        self.calls += 1
+        if self.error:
+            raise self.error
+        return self.result
+
+
+@pytest.mark.asyncio
+async def test_chain_returns_first_hit():
+    local = StubGeocoder("gazetteer", result=GEO)
+    remote = StubGeocoder("google", result={"lat": 0, "lng": 0, "formatted_address": "x"})
+    before = metrics.GEOCODE_RESOLVED.value(backend="gazetteer")
+
+    assert await ChainGeocoder([local, remote]).geocode("Av Paulista") == GEO
+    assert remote.calls == 0
+    assert metrics.GEOCODE_RESOLVED.value(backend="gazetteer") - before == 1
+
+
+@pytest.mark.asyncio
+async def test_chain_falls_through_misses_and_errors():
+    broken = StubGeocoder("gazetteer", error=RuntimeError("disk gone"))
+    empty = StubGeocoder("other")
+    remote = StubGeocoder("google", result=GEO)
+
+    assert await ChainGeocoder([broken, empty, remote]).geocode("Av Paulista") == GEO
+    assert await ChainGeocoder([empty]).geocode("Av Paulista") is None
+    with pytest.raises(GeocodeError, match="disk gone"):
+        await ChainGeocoder([broken, empty]).geocode("Av Paulista")
+
+
+def test_build_geocoder_defaults_to_google():
+    chain = build_geocoder("", gazetteer_file="")
+    assert [b.name for b in chain.backends] == ["google"]
+
+
+def test_build_geocoder_puts_gazetteer_first(tmp_path):
+    path = tmp_path / "places.csv"
+    path.write_text("name,address,lat,lng\nPadaria Real,Av. Paulista 1000,-23.5613,-46.6565\n")
+    chain = build_geocoder("", gazetteer_file=str(path))
+    assert [b.name for b in chain.backends] == ["gazetteer", "google"]
+
+
+def test_build_geocoder_rejects_unknown_and_missing_file():
+    with pytest.raises(ValueError, match="Unknown geocoder"):
+        build_geocoder("nominatim", gazetteer_file="")
+    with pytest.raises(ValueError, match="GAZETTEER_FILE"):
+        build_geocoder("gazetteer", gazetteer_file="")
+
+
+@pytest.fixture
+def stub_chain(monkeypatch):
+    """Route the module-level geocode()/geocode_many() to a stub backend with a fresh cache."""
+
+    def _install(*backends):
+        monkeypatch.setattr(geocode_module, "geocoder", ChainGeocoder(list(backends)))
+        monkeypatch.setattr(geocode_module, "cache", GeocodeCache(size=100, ttl=60, miss_ttl=60))
+
+    return _install
+
+
+class RecordingGeocoder(StubGeocoder):
+    """Resolves addresses containing "paulista", fails on "boom", misses the rest."""
+
+    def __init__(self, delay=0.0):
+        super().__init__("google")
+        self.addresses = []
+        self.delay = delay
+        self.active = self.peak = 0
+
+    async def geocode(self, address):
+        self.addresses.append(address)
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            await asyncio.sleep(self.delay)
+            if "boom" in address:
+                raise GeocodeError("upstream exploded")
+            return GEO if "paulista" in address.lower() else None
+        finally:
+            self.active -= 1
+
+
+@pytest.mark.asyncio
+async def test_geocode_caches_hits_and_misses_but_not_errors(stub_chain):
+    backend = RecordingGeocoder()
+    stub_chain(backend)
+
+    assert await geocode("Av Paulista") == GEO
+    assert await geocode("av paulista") == GEO
+    assert await geocode("Nowhere") is None
+    assert await geocode("nowhere") is None
+    assert await geocode("boom") is None
+    assert await geocode("boom") is None
+    assert backend.addresses == ["Av Paulista", "Nowhere", "boom", "boom"]
+
+
+def test_cache_expires_and_evicts(monkeypatch):
+    cache = GeocodeCache(size=2, ttl=10, miss_ttl=1)
+    now = [1000.0]
+    monkeypatch.setattr(geocode_module.time, "monotonic", lambda: now[0])
+
+    cache.put("a", GEO)
+    cache.put("b", None)
+    assert cache.get("b") == (True, None)
+    now[0] += 2
+    assert cache.get("b") == (False, None)  # misses expire sooner
+    assert cache.get("a") == (True, GEO)
+
+    cache.put("c", GEO)
+    cache.put("d", GEO)
+    assert len(cache) == 2
+    assert cache.get("a") == (False, None)  # least recently used
+
+
+@pytest.mark.asyncio
+async def test_geocode_many_dedupes_and_keeps_input_order(stub_chain):
+    backend = RecordingGeocoder()
+    stub_chain(backend)
+    await geocode("Rua Paulista 1")  # warm the cache
+
+    results = await geocode_many(["Av Paulista", "Nowhere", "AV  PAULISTA", "boom", "Rua Paulista 1"])
+
+    assert [r.address for r in results] == ["Av Paulista", "Nowhere", "AV  PAULISTA", "boom", "Rua Paulista 1"]
+    assert [r.result for r in results] == [GEO, None, GEO, None, GEO]
+    assert [r.error for r in results] == [None, "not_found", None, "upstream exploded", None]
+    assert sorted(backend.addresses) == ["Av Paulista", "Nowhere", "Rua Paulista 1", "boom"]
+
+
+@pytest.mark.asyncio
+async def test_geocode_many_bounds_concurrency(stub_chain):
+    backend = RecordingGeocoder(delay=0.01)
+    stub_chain(backend)
+
+    results = await geocode_many([f"Paulista {i}" for i in range(10)], concurrency=3)
+
+    assert all(r.result == GEO for r in results)
+    assert backend.peak == 3
@@ -0,0 +1,140 @@
+from __future__ import annotations
+
+import asyncio
+from datetime import datetime
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.core import config
+from app.models import Job, JobStatus
+from app.services import jobs
+
+
+@pytest.fixture
+def session_factory(db_engine):
+    return async_sessionmaker(db_engine, class_=AsyncSession, expire_on_commit=False)
+
+
+@pytest.fixture
+def echo_handler(monkeypatch):
+    calls = []
+
+    async def _echo(db, payload):
+        calls.append(payload)
+        if payload.get("fail"):
+            raise RuntimeError("boom")
+        return {"echo": payload["value"]}
+
+    monkeypatch.setitem(jobs._handlers, "echo", _echo)
+    return calls
+
+
+@pytest.mark.asyncio
+async def test_enqueue_runs_job_and_stores_result(session_factory, db_session, echo_handler):
+    queue = jobs.JobQueue(session_factory, workers=2)
+    await queue.start()
+    job = await queue.enqueue(db_session, "echo", {"value": 42})
+    await queue.join()
+    await queue.stop()
+
+    await db_session.refresh(job)
+    assert job.status == JobStatus.done
+    assert job.result == {"echo": 42}
+    assert job.attempts == 1
+
+
+@pytest.mark.asyncio
+async def test_unknown_kind_rejected(session_factory, db_session):
+    queue = jobs.JobQueue(session_factory)
+    with pytest.raises(ValueError, match="No job handler"):
+        await queue.enqueue(db_session, "nope", {})
+
+
+@pytest.mark.asyncio
+async def test_pending_jobs_recovered_on_start(session_factory, db_session, echo_handler):
+    """Jobs left pending or running by a previous process are resumed."""
+    db_session.add(Job(kind="echo", payload={"value": 1}, status=JobStatus.pending))
+    db_session.add(Job(kind="echo", payload={"value": 2}, status=JobStatus.running, attempts=1))
+    await db_session.commit()
+
+    queue = jobs.JobQueue(session_factory)
+    await queue.start()
+    await queue.join()
+    await queue.stop()
+
+    assert sorted(p["value"] for p in echo_handler) == [1, 2]
+    assert await jobs.pending_job_ids(db_session) == []
+
+
+@pytest.mark.asyncio
+async def test_failing_job_retried_then_marked_failed(session_factory, db_session, echo_handler, monkeypatch):
+    monkeypatch.setattr(config, "JOB_MAX_ATTEMPTS", 2)
+    queue = jobs.JobQueue(session_factory)
+    await queue.start()
+    job = await queue.enqueue(db_session, "echo", {"value": 0, "fail": True})
+    await queue.join()
+    await queue.stop()
+
+    await db_session.refresh(job)
+    assert len(echo_handler) == 2
+    assert job.status == JobStatus.failed
+    assert "boom" in job.error
+
+
+@pytest.mark.asyncio
+async def test_job_claimed_by_one_worker_process(session_factory, db_session, echo_handler):
+    """Queues in two processes may both hold a job id; only one runs it."""
+    job = Job(kind="echo", payload={"value": 1}, status=JobStatus.pending)
+    db_session.add(job)
+    await db_session.commit()
+
+    first, second = jobs.JobQueue(session_factory), jobs.JobQueue(session_factory)
+    await asyncio.gather(first.run(job.id), second.run(job.id))
+
+    await db_session.refresh(job)
+    assert echo_handler == [{"value": 1}]
+    assert job.status == JobStatus.done and job.attempts == 1
+
+
+@pytest.mark.asyncio
+async def test_recover_after_leaves_fresh_running_jobs(session_factory, db_session, echo_handler, monkeypatch):
+    """With JOB_RECOVER_AFTER, a job another process just started is not taken over."""
+    monkeypatch.setattr(config, "JOB_RECOVER_AFTER", 300)
+    old = datetime(2024, 1, 1)
+    db_session.add_all([
+        Job(kind="echo", payload={"value": 1}, status=JobStatus.running, attempts=1, updated_at=old),
+        Job(kind="echo", payload={"value": 2}, status=JobStatus.running, attempts=1),
+    ])
+    await db_session.commit()
+
+    queue = jobs.JobQueue(session_factory)
+    await queue.start()
+    await queue.join()
+    await queue.stop()
+
+    assert echo_handler == [{"value": 1}]
+    assert len(await jobs.pending_job_ids(db_session)) == 1
+
+
+@pytest.mark.asyncio
+async def test_slow_job_keeps_its_lease(session_factory, db_session, monkeypatch):
+    """A job running longer than JOB_RECOVER_AFTER is renewed, not recovered and run again."""
+    monkeypatch.setattr(config, "JOB_RECOVER_AFTER", 0.3)
+    calls = []
+
+    async def _slow(db, payload):
+        calls.append(payload)
+        await asyncio.sleep(1.0)
+        return {"slept": True}
+
+    monkeypatch.setitem(jobs._handlers, "slow", _slow)
+    queue = jobs.JobQueue(session_factory)
+    await queue.start()
+    job = await queue.enqueue(db_session, "slow", {"value": 1})
+    await queue.join()
+    await queue.stop()
+
+    await db_session.refresh(job)
+    assert calls == [{"value": 1}]
+    assert job.status == JobStatus.done and job.attempts == 1
@@ -75,6 +75,22 @@ def test_parse_json_with_backtick_artifacts():
     assert "json" not in result["content"]
 
 
+def test_parse_json_in_code_fence_with_trailing_text():
+    content = 'Moving there.\n```json\n{"action": "move_map", "target": "fit_all"}\n```\nAnything else?'
+    result = _parse_response(content)
+    assert result["move_map"]["target"] == "fit_all"
+    assert result["content"] == "Moving there.\nAnything else?"
+
+
+def test_parse_nearby():
+    content = 'Let me check.\n{"action": "nearby", "lat": -23.56, "lng": -46.65, "radius": 500, "category": "pharmacy"}'
+    result = _parse_response(content)
+    assert result["nearby"] == {
+        "lat": -23.56, "lng": -46.65, "address": None, "radius": 500, "k": 5, "category": "pharmacy",
+    }
+    assert result["content"] == "Let me check."
+
+
 def test_parse_move_map_fit_all():
     content = 'Adjusting the map! {"action": "move_map", "target": "fit_all"}'
     result = _parse_response(content)
@@ -343,6 +359,7 @@ def test_get_assistant_response_llm_error_returns_fallback():
     assert result["request_click"] is False
     assert result["classification"] is None
     assert result["place_pin"] is None
+    assert result["list_pins"] is False
 
 
 def test_get_assistant_response_empty_content():
@@ -404,3 +421,37 @@ def test_get_chat_model_missing_api_key():
                         LLM_TEMPERATURE=0.3, LLM_BASE_URL="", LLM_API_KEY=""):
         with pytest.raises(ValueError, match="LLM_API_KEY is required"):
             get_chat_model()
+
+
+def test_get_assistant_response_reports_usage():
+    """Reported tokens and the model call's latency come back as ChatMessage usage columns."""
+    mock_response = MagicMock()
+    mock_response.content = "Hello!"
+    mock_response.usage_metadata = {
+        "input_tokens": 1200, "output_tokens": 40, "input_token_details": {"cache_read": 1024},
+    }
+    mock_model = MagicMock()
+    mock_model.invoke.return_value = mock_response
+
+    with patch("app.services.llm.get_chat_model", return_value=mock_model):
+        usage = get_assistant_response([{"role": "user", "content": "Hi"}])["usage"]
+
+    assert {k: usage[k] for k in ("input_tokens", "output_tokens", "cached_tokens")} == {
+        "input_tokens": 1200, "output_tokens": 40, "cached_tokens": 1024,
+    }
+    assert isinstance(usage["latency_ms"], int) and usage["latency_ms"] >= 0
+
+
+def test_get_assistant_response_usage_without_report():
+    """Without usage_metadata only the latency is known; a failed call reports latency too."""
+    mock_response = MagicMock(spec=["content"])
+    mock_response.content = "Hello!"
+    mock_model = MagicMock()
+    mock_model.invoke.return_value = mock_response
+
+    with patch("app.services.llm.get_chat_model", return_value=mock_model):
+        assert set(get_assistant_response([{"role": "user", "content": "Hi"}])["usage"]) == {"latency_ms"}
+
+    mock_model.invoke.side_effect = RuntimeError("timeout")
+    with patch("app.services.llm.get_chat_model", return_value=mock_model):
+        assert set(get_assistant_response([{"role": "user", "content": "Hi"}])["usage"]) == {"latency_ms"}
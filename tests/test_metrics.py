@@ -0,0 +1,87 @@
+from __future__ import annotations
+
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from app.core import config
+from app.models import Pin, PinStatus
+from app.services import metrics
+from app.services.llm import get_assistant_response
+from app.services.metrics import Counter, Histogram, Registry
+
+
+def test_counter_and_histogram_render_prometheus_text():
+    reg = Registry()
+    c = reg.register(Counter("t_total", "A counter.", ("kind",)))
+    h = reg.register(Histogram("t_seconds", "A histogram.", buckets=(0.1, 1.0)))
+    c.inc(kind="a")
+    c.inc(2, kind="a")
+    h.observe(0.05)
+    h.observe(0.5)
+
+    text = reg.render()
+    assert "# TYPE t_total counter" in text
+    assert 't_total{kind="a"} 3' in text
+    assert 't_seconds_bucket{le="0.1"} 1' in text
+    assert 't_seconds_bucket{le="1"} 2' in text
+    assert 't_seconds_bucket{le="+Inf"} 2' in text
+    assert "t_seconds_count 2" in text
+
+
+def test_wrong_labels_rejected():
+    c = Counter("x_total", "x", ("kind",))
+    with pytest.raises(ValueError):
+        c.inc(other="y")
+
+
+def test_server_timing_aggregates_spans():
+    header = metrics.server_timing([("db", 0.001), ("db", 0.002), ("llm", 0.5)], total=0.6)
+    assert 'db;dur=3.0;desc="2x"' in header
+    assert "llm;dur=500.0" in header
+    assert header.endswith("total;dur=600.0")
+
+
+def test_llm_usage_counted():
+    response = MagicMock()
+    response.content = "Hi"
+    response.usage_metadata = {
+        "input_tokens": 100, "output_tokens": 7, "input_token_details": {"cache_read": 60},
+    }
+    model = MagicMock()
+    model.invoke.return_value = response
+    before = {k: metrics.LLM_TOKENS.value(kind=k) for k in ("input", "output", "cached")}
+    llm_before = metrics.SPAN_SECONDS.count(span="llm")
+
+    with patch("app.services.llm.get_chat_model", return_value=model):
+        get_assistant_response([{"role": "user", "content": "Hi"}])
+
+    assert metrics.LLM_TOKENS.value(kind="input") - before["input"] == 100
+    assert metrics.LLM_TOKENS.value(kind="output") - before["output"] == 7
+    assert metrics.LLM_TOKENS.value(kind="cached") - before["cached"] == 60
+    assert metrics.SPAN_SECONDS.count(span="llm") == llm_before + 1
+
+
+@pytest.mark.asyncio
+async def test_metrics_endpoint(client, db_session):
+    db_session.add(Pin(lat=1.0, lng=2.0, category="cafe", status=PinStatus.confirmed))
+    await db_session.commit()
+    await client.get("/map/pins")
+
+    resp = await client.get("/metrics")
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/plain")
+    assert 'karte_pins{status="confirmed"} 1' in resp.text
+    assert 'karte_http_request_duration_seconds_count{method="GET",route="/map/pins",status="200"}' in resp.text
+    assert 'karte_span_duration_seconds_count{span="db"}' in resp.text
+
+
+@pytest.mark.asyncio
+async def test_server_timing_header(client, monkeypatch):
+    resp = await client.get("/map/pins")
+    assert "server-timing" not in resp.headers
+
+    monkeypatch.setattr(config, "SERVER_TIMING", True)
+    resp = await client.get("/map/pins")
+    assert "db;dur=" in resp.headers["server-timing"]
+    assert "total;dur=" in resp.headers["server-timing"]
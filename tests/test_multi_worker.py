@@ -0,0 +1,164 @@
+from __future__ import annotations
+
+import asyncio
+from datetime import datetime
+
+import pytest
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy import func, select, text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.db.session import get_db
+from app.main import app
+from app.models import ChatMessage, Pin
+from app.services import archive, conversations, events, pin_store, pin_tasks, watcher
+
+
+@pytest.fixture
+def session_factory(db_engine):
+    return async_sessionmaker(db_engine, class_=AsyncSession, expire_on_commit=False)
+
+
+@pytest.fixture
+async def parallel_client(session_factory):
+    """A client whose requests each get their own session, as on separate workers."""
+
+    async def _override_get_db():
+        async with session_factory() as session:
+            yield session
+
+    app.dependency_overrides[get_db] = _override_get_db
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as ac:
+        yield ac
+    app.dependency_overrides.clear()
+
+
+async def _live_pins(db_session) -> int:
+    return await db_session.scalar(select(func.count()).select_from(Pin).where(Pin.deleted_at.is_(None)))
+
+
+@pytest.fixture
+def stale_store(monkeypatch):
+    """Every in-memory duplicate check misses, as in workers that haven't seen each other's pins yet."""
+    monkeypatch.setattr(pin_store.store, "in_box", lambda *args, **kwargs: iter(()))
+
+
+async def test_parallel_clicks_create_one_pin(parallel_client, db_session, stale_store):
+    # Clicks a few centimetres apart, all inside the duplicate tolerance
+    clicks = [{"lat": str(48.8584 + i * 1e-7), "lng": "2.2945"} for i in range(8)]
+    responses = await asyncio.gather(*(parallel_client.post("/map/click", data=c) for c in clicks))
+
+    assert all(r.status_code == 200 for r in responses)
+    assert await _live_pins(db_session) == 1
+    duplicates = select(func.count()).where(ChatMessage.content.endswith("No duplicate created."))
+    assert await db_session.scalar(duplicates) == 7
+
+
+async def test_parallel_create_pin_across_sessions(session_factory, db_session, stale_store):
+    async def create(lat: float, lng: float) -> Pin | None:
+        async with session_factory() as db:
+            return await pin_tasks.create_pin(db, lat, lng)
+
+    near = [create(10.0 + i * 1e-5, 10.0) for i in range(5)]
+    far = [create(20.0, 20.0 + i) for i in range(3)]
+    results = await asyncio.gather(*near, *far)
+
+    assert sum(pin is not None for pin in results[:5]) == 1
+    assert all(pin is not None for pin in results[5:])
+    assert await _live_pins(db_session) == 4
+
+
+async def test_create_pin_ignores_deleted_pins(db_session):
+    db_session.add(Pin(lat=1.0, lng=1.0, category="cafe"))
+    await db_session.commit()
+    assert await pin_tasks.create_pin(db_session, 1.0, 1.0) is None
+
+    await db_session.execute(text("UPDATE pins SET deleted_at = CURRENT_TIMESTAMP"))
+    await db_session.commit()
+    pin = await pin_tasks.create_pin(db_session, 1.0, 1.0, name="Cafe", category="cafe")
+    assert pin is not None and (pin.name, pin.category, pin.status.value) == ("Cafe", "cafe", "draft")
+
+
+async def test_cluster_index_reloads_after_foreign_write(cluster_index, db_session):
+    db_session.add(Pin(lat=1.0, lng=1.0, category="cafe"))
+    await db_session.commit()
+    await cluster_index.ensure_loaded(db_session)
+    assert len(cluster_index) == 1
+
+    # Published events keep it current without a reload
+    pin = Pin(lat=2.0, lng=2.0, category="bar")
+    db_session.add(pin)
+    await db_session.commit()
+    events.publish_pin("created", pin)
+    version = cluster_index.version
+    await cluster_index.ensure_loaded(db_session)
+    assert cluster_index.version == version and len(cluster_index) == 2
+
+    # A write by another worker publishes nothing here
+    await db_session.execute(text("UPDATE pins SET deleted_at = CURRENT_TIMESTAMP WHERE id = :id"), {"id": pin.id})
+    await db_session.commit()
+    await cluster_index.ensure_loaded(db_session)
+    assert len(cluster_index) == 1
+
+
+async def test_watcher_republishes_foreign_changes(session_factory, db_session):
+    db_session.add(Pin(lat=1.0, lng=1.0, category="cafe"))
+    await db_session.commit()
+    await pin_store.store.sync(db_session)
+    watch = watcher.VersionWatcher(session_factory, interval=1)
+    received = []
+    events.broker.add_listener(received.append)
+    try:
+        assert await watch.check(db_session) == []
+
+        # Changes made in this process are already published
+        msg = ChatMessage(role="user", content="hi")
+        db_session.add(msg)
+        await db_session.commit()
+        watch._on_event(events.Event("messages", {"action": "created", "id": msg.id}))
+        assert await watch.check(db_session) == []
+
+        await db_session.execute(text("INSERT INTO pins (lat, lng, category, status) VALUES (2, 2, 'bar', 'draft')"))
+        await db_session.execute(text("INSERT INTO chat_messages (role, content) VALUES ('user', 'elsewhere')"))
+        await db_session.commit()
+        assert await watch.check(db_session) == ["pins", "messages"]
+    finally:
+        events.broker.remove_listener(received.append)
+
+    assert [(e.name, e.data) for e in received] == [
+        ("pins", {"action": "reloaded"}),
+        ("messages", {"action": "reloaded"}),
+    ]
+    assert len(pin_store.store) == 2
+
+
+async def test_watcher_republishes_foreign_clears_and_archiving(session_factory, db_session):
+    db_session.add_all([ChatMessage(role="user", content=f"old {i}", created_at=datetime(2024, 1, 1)) for i in range(2)])
+    await db_session.commit()
+    assert await archive.archive_batch(db_session, datetime(2024, 6, 1), limit=1) == 1
+    await pin_store.store.sync(db_session)
+    watch = watcher.VersionWatcher(session_factory, interval=1)
+    assert await watch.check(db_session) == []
+
+    # Neither adds a message (this batch updates the existing summary),
+    # but both change what the chat shows
+    assert await archive.archive_batch(db_session, datetime(2024, 6, 1), limit=1) == 1
+    assert await watch.check(db_session) == ["messages"]
+    assert await watch.check(db_session) == []
+    await conversations.start_new(db_session)
+    await db_session.commit()
+    assert await watch.check(db_session) == ["messages"]
+    assert await watch.check(db_session) == []
+
+
+async def test_duplicates_are_a_circle(db_session):
+    db_session.add_all([Pin(lat=60.0, lng=10.0, category="cafe"), Pin(lat=0.0, lng=0.0, category="bar")])
+    await db_session.commit()
+
+    # 8 m east at 60°N: inside the radius, though 1.5x the tolerance in degrees of longitude
+    assert (await pin_tasks.find_duplicate(db_session, 60.0, 10.00015)).lat == 60.0
+    assert await pin_tasks.create_pin(db_session, 60.0, 10.00015) is None
+    # 14 m diagonally at the equator: inside the tolerance box, beyond the radius
+    assert await pin_tasks.find_duplicate(db_session, 0.00009, 0.00009) is None
+    assert await pin_tasks.create_pin(db_session, 0.00009, 0.00009) is not None
+    assert await _live_pins(db_session) == 3
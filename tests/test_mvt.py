@@ -0,0 +1,178 @@
+from __future__ import annotations
+
+import pytest
+from sqlalchemy import delete, update
+
+from app.models import Pin, PinStatus
+from app.services import mvt, read_models
+from app.services.clusters import project
+
+
+def read_varint(data: bytes, pos: int) -> tuple[int, int]:
+    value = shift = 0
+    while True:
+        b = data[pos]
+        pos += 1
+        value |= (b & 0x7F) << shift
+        shift += 7
+        if b < 0x80:
+            return value, pos
+
+
+def read_fields(data: bytes) -> list[tuple[int, int | bytes]]:
+    fields, pos = [], 0
+    while pos < len(data):
+        key, pos = read_varint(data, pos)
+        if key & 7 == 2:
+            length, pos = read_varint(data, pos)
+            fields.append((key >> 3, data[pos:pos + length]))
+            pos += length
+        else:
+            value, pos = read_varint(data, pos)
+            fields.append((key >> 3, value))
+    return fields
+
+
+def read_packed(data: bytes) -> list[int]:
+    values, pos = [], 0
+    while pos < len(data):
+        value, pos = read_varint(data, pos)
+        values.append(value)
+    return values
+
+
+def decode(data: bytes) -> dict:
+    """Decode a one-layer point tile into {name, extent, features: [(id, x, y, props)]}."""
+    (field, layer_bytes), = read_fields(data)
+    assert field == 3
+    layer = read_fields(layer_bytes)
+    keys = [v.decode() for f, v in layer if f == 3]
+    values = [read_fields(v)[0][1].decode() for f, v in layer if f == 4]
+    features = []
+    for f, v in layer:
+        if f != 2:
+            continue
+        feature = dict(read_fields(v))
+        assert feature[3] == 1  # POINT
+        command, x, y = read_packed(feature[4])
+        assert command == 9  # MoveTo, one point
+        tags = read_packed(feature.get(2, b""))
+        props = {keys[tags[i]]: values[tags[i + 1]] for i in range(0, len(tags), 2)}
+        unzig = lambda n: n >> 1 if n % 2 == 0 else -((n + 1) >> 1)  # noqa: E731
+        features.append((feature[1], unzig(x), unzig(y), props))
+    fields = dict(layer)
+    return {"version": fields[15], "name": fields[1].decode(), "extent": fields[5], "features": features}
+
+
+def tile_of(lat: float, lng: float, z: int) -> tuple[int, int, int]:
+    x, y = project(lat, lng)
+    return z, int(x * 2**z), int(y * 2**z)
+
+
+def test_encode_points_roundtrip():
+    data = mvt.encode_points([
+        (1, 10, 20, {"status": "draft", "category": "bakery", "name": "Padaria Ção"}),
+        (300, -5, 4100, {"status": "draft", "category": "other", "name": None}),
+    ])
+    tile = decode(data)
+    assert tile["version"] == 2 and tile["name"] == "pins" and tile["extent"] == 4096
+    assert tile["features"] == [
+        (1, 10, 20, {"status": "draft", "category": "bakery", "name": "Padaria Ção"}),
+        (300, -5, 4100, {"status": "draft", "category": "other"}),
+    ]
+    # Keys and values are shared between features
+    assert data.count(b"draft") == 1 and data.count(b"status") == 1
+
+
+def test_empty_tile_is_empty():
+    assert mvt.encode_points([]) == b""
+
+
+def test_encode_tile_positions_pins_in_tile_units():
+    z, x, y = tile_of(-23.5614, -46.6559, 14)
+    tile = decode(mvt.encode_tile([(5, -23.5614, -46.6559, None, "other", "confirmed")], z, x, y))
+    (_, px, py, props), = tile["features"]
+    assert 0 <= px < mvt.EXTENT and 0 <= py < mvt.EXTENT
+    assert props == {"status": "confirmed", "category": "other"}
+
+
+def test_tile_bounds():
+    south, north, west, east = mvt.tile_bounds(0, 0, 0)
+    assert (west, east) == (-180, 180)
+    assert north == pytest.approx(85.0511, abs=1e-4) and south == pytest.approx(-85.0511, abs=1e-4)
+    south, north, west, east = mvt.tile_bounds(1, 1, 0, buffer=0.5)
+    assert south < 0 < north and west < 0 and east == 180
+
+
+async def test_pin_writes_bump_the_version(db_session):
+    assert await read_models.pins_version(db_session) == 0
+    pin = Pin(lat=1.0, lng=2.0, category="other")
+    db_session.add(pin)
+    await db_session.commit()
+    first = await read_models.pins_version(db_session)
+    assert first > 0
+
+    await db_session.execute(update(Pin).values(category="cafe"))
+    await db_session.execute(delete(Pin))
+    await db_session.commit()
+    assert await read_models.pins_version(db_session) == first + 2
+
+
+async def test_tile_route_serves_and_caches_pins(client, db_session, tile_cache):
+    db_session.add_all([
+        Pin(lat=-23.5614, lng=-46.6559, name="Padaria", category="bakery", status=PinStatus.draft),
+        Pin(lat=-22.9068, lng=-43.1729, name="Rio", category="cafe", status=PinStatus.confirmed),
+    ])
+    await db_session.commit()
+    version = await read_models.pins_version(db_session)
+    z, x, y = tile_of(-23.5614, -46.6559, 12)
+
+    resp = await client.get(f"/map/tiles/{z}/{x}/{y}.mvt")
+    assert resp.status_code == 200
+    assert resp.headers["content-type"] == mvt.MEDIA_TYPE
+    assert resp.headers["etag"] == f'"{version}"'
+    features = decode(resp.content)["features"]
+    assert [f[3] for f in features] == [{"status": "draft", "category": "bakery", "name": "Padaria"}]
+    assert (tile_cache.directory / str(version) / str(z) / str(x) / f"{y}.mvt").read_bytes() == resp.content
+
+    resp = await client.get(f"/map/tiles/{z}/{x}/{y}.mvt", headers={"If-None-Match": f'"{version}"'})
+    assert resp.status_code == 304
+
+    # Low zooms leave names out
+    world = decode((await client.get("/map/tiles/0/0/0.mvt")).content)
+    assert [f[3] for f in world["features"]] == [
+        {"status": "draft", "category": "bakery"}, {"status": "confirmed", "category": "cafe"},
+    ]
+
+
+async def test_tile_cache_follows_the_pin_version(client, db_session, tile_cache):
+    db_session.add(Pin(lat=10.0, lng=10.0, category="other"))
+    await db_session.commit()
+    old = await read_models.pins_version(db_session)
+    assert len(decode((await client.get("/map/tiles/0/0/0.mvt")).content)["features"]) == 1
+
+    db_session.add(Pin(lat=10.5, lng=10.5, category="other"))
+    await db_session.commit()
+    resp = await client.get("/map/tiles/0/0/0.mvt")
+    assert len(decode(resp.content)["features"]) == 2
+    assert resp.headers["etag"] != f'"{old}"'
+    # Tiles of older versions are dropped once a newer one is written
+    assert [p.name for p in tile_cache.directory.iterdir()] == [str(await read_models.pins_version(db_session))]
+
+
+async def test_unwritable_tile_cache_still_serves_tiles(client, db_session, tile_cache):
+    db_session.add(Pin(lat=10.0, lng=10.0, category="other"))
+    await db_session.commit()
+    # A file where the cache directory should be: every write fails
+    tile_cache.directory.write_bytes(b"")
+
+    resp = await client.get("/map/tiles/0/0/0.mvt")
+    assert resp.status_code == 200
+    assert len(decode(resp.content)["features"]) == 1
+
+
+async def test_empty_and_out_of_range_tiles(client):
+    resp = await client.get("/map/tiles/3/1/1.mvt")
+    assert resp.status_code == 200 and resp.content == b""
+    assert (await client.get("/map/tiles/1/2/0.mvt")).status_code == 404
+    assert (await client.get("/map/tiles/21/0/0.mvt")).status_code == 422
@@ -0,0 +1,94 @@
+from __future__ import annotations
+
+import pytest
+
+from app.models import Pin, PinStatus
+from app.services import pin_formats
+from app.services.pin_formats import PinColumns
+
+
+@pytest.fixture
+async def pins(db_session):
+    rows = [
+        Pin(lat=-23.5614, lng=-46.6559, name="Padaria São João", category="bakery",
+            status=PinStatus.confirmed, confidence=0.9),
+        Pin(lat=1.5, lng=2.5, name=None, category="other", status=PinStatus.draft, confidence=None),
+        Pin(lat=-1.0, lng=-2.0, name="Pão", category="bakery", status=PinStatus.draft, confidence=0.25),
+    ]
+    db_session.add_all(rows)
+    await db_session.commit()
+    return rows
+
+
+def test_binary_roundtrip():
+    cols = PinColumns(
+        id=[1, 2, 70000],
+        lat=[1.5, -2.25, 3.0],
+        lng=[4.0, 5.0, 6.0],
+        name=["Ção", None, "b"],
+        category=["bakery", "other", "bakery"],
+        status=["draft", "confirmed", "draft"],
+        confidence=[0.5, None, 1.0],
+    )
+    data = pin_formats.encode_binary(cols)
+    assert data[:4] == b"KPN1"
+    assert pin_formats.decode_binary(data) == cols
+
+
+def test_binary_columns_are_aligned_for_typed_arrays():
+    for n in range(4):
+        cols = PinColumns(list(range(n)), [0.0] * n, [0.0] * n, ["x"] * n, ["a"] * n, ["draft"] * n, [None] * n)
+        data = pin_formats.encode_binary(cols)
+        header = pin_formats._HEADER.size
+        assert header % 8 == 0
+        uint16_start = header + 24 * n + 4 * n + 4 * (n + 1)
+        assert uint16_start % 2 == 0
+        assert pin_formats.decode_binary(data) == PinColumns(
+            list(range(n)), [0.0] * n, [0.0] * n, ["x"] * n, ["a"] * n, ["draft"] * n, [None] * n
+        )
+
+
+def test_empty_binary():
+    cols = pin_formats.decode_binary(pin_formats.encode_binary(PinColumns((), (), (), (), (), (), ())))
+    assert len(cols) == 0
+
+
+async def test_load_columns_skips_orm(db_session, pins):
+    db_session.expunge_all()
+    cols = await pin_formats.load_columns(db_session)
+    assert list(cols.name) == ["Padaria São João", None, "Pão"]
+    assert list(cols.status) == ["confirmed", "draft", "draft"]
+    assert len(db_session.identity_map) == 0
+
+
+async def test_pins_formats_agree(client, pins):
+    objects = (await client.get("/map/pins")).json()
+
+    columns = (await client.get("/map/pins", params={"format": "columns"})).json()
+    assert columns["count"] == 3
+    assert columns["categories"] == ["bakery", "other"]
+    rebuilt = [
+        {
+            "id": columns["id"][i],
+            "lat": columns["lat"][i],
+            "lng": columns["lng"][i],
+            "name": columns["name"][i],
+            "category": columns["categories"][columns["category"][i]],
+            "status": columns["statuses"][columns["status"][i]],
+            "confidence": columns["confidence"][i],
+        }
+        for i in range(columns["count"])
+    ]
+    assert rebuilt == objects
+
+    resp = await client.get("/map/pins", params={"format": "binary"})
+    assert resp.headers["content-type"] == pin_formats.BINARY_MEDIA_TYPE
+    cols = pin_formats.decode_binary(resp.content)
+    assert [
+        dict(zip(("id", "lat", "lng", "name", "category", "status", "confidence"), row))
+        for row in zip(cols.id, cols.lat, cols.lng, cols.name, cols.category, cols.status, cols.confidence)
+    ] == objects
+
+
+async def test_unknown_format_rejected(client):
+    assert (await client.get("/map/pins", params={"format": "xml"})).status_code == 422
@@ -0,0 +1,134 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+from unittest.mock import AsyncMock, patch
+
+from sqlalchemy import delete
+
+from app.models import Pin, PinStatus
+from app.services import events, llm, metrics
+from app.services.pin_store import PinStore
+from app.services.pin_tasks import find_duplicate, load_llm_context
+
+ROWS = [
+    (1, -23.5614, -46.6559, "Padaria A", "bakery", "confirmed", 0.9),
+    (2, -23.5614, -46.6549, "Drogaria B", "pharmacy", "draft", None),
+    (3, -22.9068, -43.1729, "Rio Cafe", "cafe", "confirmed", None),
+]
+
+
+def loaded(rows=ROWS, version=1) -> PinStore:
+    store = PinStore()
+    store.load(rows, version)
+    return store
+
+
+def test_box_queries_use_the_grid_and_filter():
+    store = loaded()
+    assert sorted(i for i, _, _ in store.in_box(-23.6, -23.5, -46.7, -46.6)) == [1, 2]
+    assert [i for i, _, _ in store.in_box(-23.6, -23.5, -46.7, -46.6, "pharmacy")] == [2]
+    # A box wider than the pin count falls back to a scan
+    assert sorted(i for i, _, _ in store.in_box(-90, 90, -180, 180)) == [1, 2, 3]
+
+
+def test_put_moves_and_remove_compacts():
+    store = loaded()
+    store.put(3, -23.5615, -46.6559, "Rio Cafe", "cafe", "draft", None)
+    assert sorted(i for i, _, _ in store.in_box(-23.6, -23.5, -46.7, -46.6)) == [1, 2, 3]
+    assert not list(store.in_box(-23.0, -22.8, -43.2, -43.1))
+
+    store.load([(i, 0.001 * i, 0.0, None, "other", "draft", None) for i in range(1, 201)], 1)
+    for i in range(1, 200):
+        store.remove(i)
+    store.remove(1)  # idempotent
+    assert len(store.ids) < 200 and len(store) == 1
+    assert store.row(200).lat == 0.2
+    assert store.map_state_message() == (
+        "Current map state: 1 pin(s) total (0 confirmed, 1 draft).\n- [draft] unnamed (other) at (0.20000, 0.00000)"
+    )
+
+
+def test_events_track_the_version(memory_store):
+    memory_store.load(ROWS, 10)
+    pin = Pin(id=4, lat=1.0, lng=1.0, name=None, category="other", status=PinStatus.draft)
+    events.publish_pin("created", pin)
+    assert memory_store.row(4).lat == 1.0 and memory_store.version == 11
+
+    # An update that changed nothing issued no UPDATE, so the version stays
+    events.publish_pin("updated", pin)
+    assert memory_store.version == 11
+
+    events.publish_pins_deleted([1, 4])
+    assert memory_store.row(1) is None and len(memory_store) == 2 and memory_store.version == 13
+
+
+def test_map_state_is_cached_per_version_and_matches_a_full_build():
+    store = loaded()
+    pins = [
+        {"lat": lat, "lng": lng, "name": name, "category": category, "status": status}
+        for _, lat, lng, name, category, status, _ in ROWS
+    ]
+    misses = metrics.MAP_STATE.value(outcome="miss")
+    first = store.map_state_message()
+    assert first == llm._build_map_state_message(pins)
+    assert store.map_state_message() is first
+    assert metrics.MAP_STATE.value(outcome="miss") == misses + 1
+
+    store.put(2, -23.5614, -46.6549, "Drogaria B", "pharmacy", "confirmed", None)
+    store.remove(3)
+    store.version += 2
+    pins[1]["status"] = "confirmed"
+    assert store.map_state_message() == llm._build_map_state_message(pins[:2])
+    assert metrics.MAP_STATE.value(outcome="miss") == misses + 2
+
+    store.load([], 20)
+    assert store.map_state_message() == llm._build_map_state_message([])
+
+
+async def test_local_writes_do_not_reload_but_other_writers_do(client, db_session, memory_store, run_jobs):
+    llm_result = {"content": "A cafe.", "classification": {"category": "cafe", "name": "Cafe", "confidence": 0.7}}
+    with patch("app.services.pin_tasks.get_assistant_response", return_value=llm_result):
+        await client.post("/map/click", data={"lat": "10.0", "lng": "10.0"})
+        await run_jobs()
+        loads = metrics.PIN_STORE_LOADS.value()
+
+        # A click, then its classification: an insert and an update, both seen through events
+        await client.post("/map/click", data={"lat": "11.0", "lng": "11.0"})
+        await run_jobs()
+    history, map_state = await load_llm_context(db_session)
+    assert map_state.splitlines()[1:] == [
+        "- [draft] Cafe (cafe) at (10.00000, 10.00000)",
+        "- [draft] Cafe (cafe) at (11.00000, 11.00000)",
+    ]
+    assert metrics.PIN_STORE_LOADS.value() == loads
+
+    # A write that publishes no event (as from another worker) is caught by the version
+    await db_session.execute(delete(Pin).where(Pin.lat == 10.0))
+    await db_session.commit()
+    assert await find_duplicate(db_session, 10.0, 10.0) is None
+    assert (await find_duplicate(db_session, 11.00005, 11.0)).lat == 11.0
+    assert metrics.PIN_STORE_LOADS.value() == loads + 1
+
+
+async def test_reload_swaps_in_a_complete_store(db_session, memory_store):
+    memory_store.load(ROWS, 1)
+    halfway, resume = threading.Event(), threading.Event()
+
+    def rows():
+        yield 4, 1.0, 1.0, None, "other", "draft", None
+        halfway.set()
+        resume.wait(5)
+
+    with patch("app.services.read_models.pin_tuples", AsyncMock(return_value=rows())):
+        sync = asyncio.create_task(memory_store.sync(db_session))
+        try:
+            await asyncio.to_thread(halfway.wait, 5)
+            # Mid-build, queries still see the old store whole
+            assert len(memory_store) == 3 and memory_store.row(1).name == "Padaria A"
+            assert sorted(i for i, _, _ in memory_store.in_box(-23.6, -23.5, -46.7, -46.6)) == [1, 2]
+        finally:
+            resume.set()
+        assert await sync
+
+    assert memory_store.row(1) is None and memory_store.row(4).lat == 1.0
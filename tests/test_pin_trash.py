@@ -0,0 +1,138 @@
+from __future__ import annotations
+
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy import func, select, text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.models import Pin, PinStatus
+from app.services import events, pin_store, pin_trash, read_models, search, spatial
+
+
+async def _pins(db_session, n: int) -> list[Pin]:
+    pins = [Pin(lat=float(i), lng=float(i), name=f"Cafe {i}", category="cafe") for i in range(n)]
+    db_session.add_all(pins)
+    await db_session.commit()
+    return pins
+
+
+async def _count(db_session) -> int:
+    return await db_session.scalar(select(func.count()).select_from(Pin))
+
+
+async def test_deleted_pins_are_hidden_everywhere(db_session):
+    pins = await _pins(db_session, 3)
+    ids = await pin_trash.soft_delete(db_session, Pin.id == pins[1].id)
+    await db_session.commit()
+
+    assert ids == [pins[1].id]
+    assert await _count(db_session) == 3  # still in the table until purged
+    assert [p.id for p in await read_models.pins(db_session)] == [pins[0].id, pins[2].id]
+    assert pins[1].id not in [p.id for p in await search.search_pins(db_session, "Cafe 1")]
+    assert await search.resolve_pin_names(db_session, ["cafe 1"]) == []
+    assert [p.id for p, _ in await spatial.pins_in_box(db_session, 0.5, 1.5, 0.5, 1.5)] == []
+
+
+async def test_soft_delete_skips_already_deleted(db_session):
+    await _pins(db_session, 2)
+    assert len(await pin_trash.soft_delete(db_session)) == 2
+    await db_session.commit()
+    assert await pin_trash.soft_delete(db_session) == []
+
+
+async def test_restore_last_undoes_only_the_latest_delete(db_session):
+    pins = await _pins(db_session, 3)
+    await pin_trash.soft_delete(db_session, Pin.id == pins[0].id)
+    await db_session.commit()
+    await pin_trash.soft_delete(db_session, Pin.id != pins[0].id)
+    await db_session.commit()
+
+    restored = await pin_trash.restore_last(db_session)
+    assert sorted(r.id for r in restored) == [pins[1].id, pins[2].id]
+    assert [p.id for p in await read_models.pins(db_session)] == [pins[1].id, pins[2].id]
+    assert [r.id for r in await pin_trash.restore_last(db_session)] == [pins[0].id]
+    assert await pin_trash.restore_last(db_session) == []
+
+
+async def test_restore_merges_pins_that_would_be_duplicates(db_session):
+    pins = await _pins(db_session, 3)
+    await pin_trash.soft_delete(db_session, Pin.id == pins[0].id)
+    await db_session.commit()
+    await pin_trash.soft_delete(db_session, Pin.id != pins[0].id)
+    await db_session.commit()
+    # A newer pin now stands where pins[1] was
+    newer = Pin(lat=1.00001, lng=1.0, name="Cafe 1 again", category="cafe")
+    db_session.add(newer)
+    await db_session.commit()
+
+    assert [r.id for r in await pin_trash.restore_last(db_session)] == [pins[2].id]
+    assert await db_session.get(Pin, pins[1].id) is None
+    assert sorted(p.id for p in await read_models.pins(db_session)) == [pins[2].id, newer.id]
+    # The merged pin doesn't hold up undoing the earlier delete
+    assert [r.id for r in await pin_trash.restore_last(db_session)] == [pins[0].id]
+
+
+async def test_purger_removes_due_pins_in_batches(db_engine, db_session):
+    pins = await _pins(db_session, 5)
+    await pin_trash.soft_delete(db_session, Pin.id != pins[0].id)
+    await db_session.commit()
+    purger = pin_trash.Purger(async_sessionmaker(db_engine, class_=AsyncSession, expire_on_commit=False))
+
+    # Still inside the undo window
+    assert await purger.run_once(before=datetime(2000, 1, 1), batch=2) == 0
+    assert await purger.run_once(before=datetime.now() + timedelta(days=1), batch=2) == 4
+    assert await _count(db_session) == 1
+
+
+@pytest.mark.sqlite_only
+async def test_purge_clears_search_and_spatial_indexes(db_session):
+    pins = await _pins(db_session, 3)
+    await pin_trash.soft_delete(db_session, Pin.id != pins[0].id)
+    await db_session.commit()
+    await pin_trash.purge_batch(db_session, datetime.now() + timedelta(days=1))
+    assert await db_session.scalar(text("SELECT count(*) FROM pins_rtree")) == 1
+    assert await db_session.scalar(text("SELECT count(*) FROM pins_fts WHERE pins_fts MATCH '\"Cafe\"'")) == 1
+
+
+async def test_purge_leaves_pin_version_alone(db_engine, db_session):
+    await _pins(db_session, 2)
+    before = await read_models.pins_version(db_session)
+    ids = await pin_trash.soft_delete(db_session)
+    await db_session.commit()
+    assert await read_models.pins_version(db_session) == before + len(ids)
+
+    await pin_trash.purge_batch(db_session, datetime.now() + timedelta(days=1))
+    assert await read_models.pins_version(db_session) == before + len(ids)
+
+
+async def test_store_follows_delete_and_restore_without_reloading(db_session):
+    pins = await _pins(db_session, 2)
+    store = pin_store.store
+    await store.sync(db_session)
+    version = store.version
+
+    ids = await pin_trash.soft_delete(db_session)
+    await db_session.commit()
+    events.publish_pins_deleted(ids)
+    events.publish_pins_restored(await pin_trash.restore_last(db_session))
+
+    assert store.version == await read_models.pins_version(db_session) == version + 4
+    assert sorted(store.slots) == [p.id for p in pins]
+
+
+async def test_chat_delete_offers_undo(client, db_session):
+    await _pins(db_session, 2)
+    db_session.add(Pin(lat=9.0, lng=9.0, category="bank", status=PinStatus.confirmed))
+    await db_session.commit()
+
+    mock = {"content": "Drafts removed.", "delete_pins": {"which": "drafts", "names": []}}
+    with patch("app.routes.chat.get_assistant_response", return_value=mock):
+        resp = await client.post("/chat/send", data={"message": "delete drafts"})
+    assert 'hx-post="/pins/restore"' in resp.text and "Undo delete (2 pins)" in resp.text
+    assert len(await read_models.pins(db_session)) == 1
+
+    resp = await client.post("/pins/restore")
+    assert "Restored 2 pin(s)." in resp.text
+    assert len(await read_models.pins(db_session)) == 3
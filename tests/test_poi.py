@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy import select
+
+from app.models import ChatMessage, Pin
+from app.services import poi
+from app.services.poi import PoiIndex
+
+# Around Av. Paulista, São Paulo; 0.0001° of latitude is ~11 m
+ROWS = [
+    ("Padaria Real", "bakery", -23.56100, -46.65600),
+    ("Drogaria Sul", "pharmacy", -23.56120, -46.65600),
+    ("Parque Trianon", "park", -23.56300, -46.65700),
+    ("Far Away Cafe", "cafe", -22.90000, -43.20000),
+]
+
+
+@pytest.fixture
+def places(monkeypatch):
+    index = PoiIndex(ROWS)
+    monkeypatch.setattr(poi, "index", index)
+    return index
+
+
+def test_nearest_orders_by_distance_within_radius():
+    index = PoiIndex(ROWS)
+    found = index.nearest(-23.56101, -46.65600, k=5, radius_m=100)
+    assert [p.name for p in found] == ["Padaria Real", "Drogaria Sul"]
+    assert found[0].distance_m < 2
+    assert 20 < found[1].distance_m < 25
+
+
+def test_nearest_respects_k_and_empty_index():
+    index = PoiIndex(ROWS)
+    assert len(index.nearest(-23.5611, -46.656, k=1, radius_m=1000)) == 1
+    assert index.nearest(0.0, 0.0) == []
+    assert PoiIndex().nearest(-23.5611, -46.656) == []
+
+
+def test_nearest_crosses_cell_boundaries():
+    # Points on either side of a grid line are both found
+    index = PoiIndex([("North", "bank", 0.00001, 0.0), ("South", "bank", -0.00001, 0.0)])
+    assert {p.name for p in index.nearest(0.0, 0.0, radius_m=10)} == {"North", "South"}
+
+
+def test_from_csv_maps_osm_categories_and_skips_bad_rows(tmp_path):
+    path = tmp_path / "places.csv"
+    path.write_text(
+        "name,category,lat,lon\n"
+        "Clinica Boa,doctors,-23.5,-46.6\n"
+        "Bar do Zé,bar,-23.5,-46.6\n"
+        ",bakery,-23.5,-46.6\n"
+        "Broken,bakery,north,-46.6\n"
+    )
+    index = PoiIndex.from_csv(path)
+    assert len(index) == 2
+    assert {(p.name, p.category) for p in index.nearest(-23.5, -46.6)} == {
+        ("Clinica Boa", "health_clinic"),
+        ("Bar do Zé", "other"),
+    }
+
+
+def test_load_index_without_file_keeps_current(monkeypatch):
+    monkeypatch.setattr(poi, "index", PoiIndex(ROWS))
+    assert len(poi.load_index("")) == len(ROWS)
+
+
+@pytest.mark.asyncio
+async def test_map_click_on_known_place_skips_llm(client, db_session, run_jobs, places):
+    with patch("app.services.pin_tasks.get_assistant_response") as llm:
+        resp = await client.post("/map/click", data={"lat": "-23.56101", "lng": "-46.65600"})
+        await run_jobs()
+
+    assert resp.status_code == 200
+    llm.assert_not_called()
+    pin = (await db_session.execute(select(Pin))).scalar_one()
+    assert pin.category == "bakery"
+    assert pin.name == "Padaria Real"
+    assert pin.confidence == 0.9
+    messages = (await db_session.execute(select(ChatMessage).where(ChatMessage.role == "assistant"))).scalars().all()
+    assert "Padaria Real" in messages[-1].content
+
+
+@pytest.mark.asyncio
+async def test_map_click_near_places_adds_them_to_prompt(client, db_session, run_jobs, places):
+    result = {"content": "Probably a park.", "classification": {"category": "park", "name": "Parque Trianon"}}
+    with patch("app.services.pin_tasks.get_assistant_response", return_value=result) as llm:
+        await client.post("/map/click", data={"lat": "-23.56200", "lng": "-46.65650"})
+        await run_jobs()
+
+    history = llm.call_args[0][0]
+    assert history[-1]["role"] == "system"
+    assert "Padaria Real (bakery)" in history[-1]["content"]
+    assert "Parque Trianon (park)" in history[-1]["content"]
+    pin = (await db_session.execute(select(Pin))).scalar_one()
+    assert pin.category == "park"
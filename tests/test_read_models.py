@@ -0,0 +1,98 @@
+from __future__ import annotations
+
+from datetime import datetime
+
+import pytest
+from sqlalchemy import select, text, tuple_
+from sqlalchemy.orm import aliased
+
+from app.models import ChatMessage, Pin, PinStatus
+from app.models.chat import current_conversation
+from app.services import read_models
+
+
+async def test_pins_are_plain_rows_in_id_order(db_session):
+    db_session.add_all([
+        Pin(lat=1.0, lng=2.0, name="B", category="cafe", status=PinStatus.confirmed, confidence=0.5),
+        Pin(lat=3.0, lng=4.0, category="other"),
+    ])
+    await db_session.commit()
+    db_session.expunge_all()
+
+    rows = await read_models.pins(db_session)
+    assert [type(r) for r in rows] == [read_models.PinRow] * 2
+    assert rows[0].to_dict() == {
+        "id": rows[0].id, "lat": 1.0, "lng": 2.0, "name": "B",
+        "category": "cafe", "status": "confirmed", "confidence": 0.5,
+    }
+    assert rows[1].status == "draft" and rows[1].name is None
+    assert rows[0].id < rows[1].id
+    # Nothing was loaded into the session
+    assert not db_session.identity_map
+
+
+async def test_pin_tuples_follow_pin_columns(db_session):
+    db_session.add(Pin(lat=1.0, lng=2.0, name="A", category="bakery"))
+    await db_session.commit()
+    (row,) = await read_models.pin_tuples(db_session)
+    assert row[1:] == (1.0, 2.0, "A", "bakery", "draft", None)
+    assert len(row) == len(read_models.PIN_COLUMNS)
+
+
+async def test_messages_oldest_first(db_session):
+    db_session.add_all([ChatMessage(role="user", content="hi"), ChatMessage(role="assistant", content="hello")])
+    await db_session.commit()
+    db_session.expunge_all()
+
+    rows = await read_models.messages(db_session)
+    assert [(m.role, m.content) for m in rows] == [("user", "hi"), ("assistant", "hello")]
+    assert all(isinstance(m, read_models.MessageRow) and m.created_at for m in rows)
+    assert not db_session.identity_map
+
+
+async def test_message_pages_chain_without_gaps(db_session):
+    # Same-second timestamps: the id breaks ties
+    same = datetime(2024, 1, 1, 12, 0, 0)
+    db_session.add_all([ChatMessage(role="user", content=str(i), created_at=same) for i in range(7)])
+    await db_session.commit()
+
+    page, more = await read_models.message_page(db_session, limit=3)
+    assert [m.content for m in page] == ["4", "5", "6"] and more
+    seen = [m.content for m in page]
+    while more:
+        page, more = await read_models.message_page(db_session, before=page[0].id, limit=3)
+        seen = [m.content for m in page] + seen
+    assert seen == [str(i) for i in range(7)]
+    assert [m.content for m in await read_models.messages(db_session)] == seen
+
+    assert await read_models.message_page(db_session, before=999) == ([], False)
+
+
+async def test_message_timestamps_strictly_increase(db_session):
+    msgs = [ChatMessage(role="user", content=str(i)) for i in range(50)]
+    db_session.add_all(msgs)
+    await db_session.commit()
+    stamps = [m.created_at for m in msgs]
+    assert stamps == sorted(stamps) and len(set(stamps)) == len(stamps)
+    assert [m.content for m in await read_models.messages(db_session)] == [str(i) for i in range(50)]
+
+
+@pytest.mark.sqlite_only
+async def test_history_reads_scan_the_order_index(db_session):
+    anchor = aliased(ChatMessage)
+    cursor = select(anchor.created_at, anchor.id).where(anchor.id == 1).scalar_subquery()
+    conversation = ChatMessage.conversation_id == current_conversation()
+    latest = (
+        select(ChatMessage.id)
+        .where(conversation)
+        .order_by(ChatMessage.created_at.desc(), ChatMessage.id.desc())
+        .limit(5)
+    )
+    for stmt in (
+        select(ChatMessage.id).where(conversation).order_by(ChatMessage.created_at, ChatMessage.id),
+        latest,
+        latest.where(tuple_(ChatMessage.created_at, ChatMessage.id) < cursor),
+    ):
+        sql = str(stmt.compile(db_session.bind, compile_kwargs={"literal_binds": True}))
+        plan = " ".join(row[3] for row in await db_session.execute(text("EXPLAIN QUERY PLAN " + sql)))
+        assert "ix_chat_messages_conversation_created_at_id" in plan and "TEMP B-TREE" not in plan
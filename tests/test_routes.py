@@ -1,11 +1,13 @@
 from __future__ import annotations
 
+import threading
 from unittest.mock import patch
 
 import pytest
 from sqlalchemy import select
 
-from app.models import ChatMessage, Pin, PinStatus
+from app.models import ChatMessage, Job, JobStatus, Pin, PinStatus
+from app.services import read_models
 
 
 def _llm_result(**overrides):
@@ -62,13 +64,14 @@ async def test_get_pins_returns_existing(client, db_session):
 
 
 @pytest.mark.asyncio
-async def test_map_click_creates_draft_pin(client, db_session):
+async def test_map_click_creates_draft_pin(client, db_session, run_jobs):
     mock = _llm_result(
         content="I see a location. Let me classify it.",
         classification={"category": "restaurant", "name": "Test Place", "confidence": 0.8, "reasoning": "test"},
     )
-    with patch("app.routes.map.get_assistant_response", return_value=mock):
+    with patch("app.services.pin_tasks.get_assistant_response", return_value=mock):
         resp = await client.post("/map/click", data={"lat": "1.5", "lng": "2.5"})
+        await run_jobs()
 
     assert resp.status_code == 200
 
@@ -142,12 +145,41 @@ async def test_chat_send(client, db_session):
     assert messages[1].role == "assistant"
 
 
+@pytest.mark.asyncio
+async def test_chat_messages_renders_history(client, db_session):
+    db_session.add(ChatMessage(role="user", content="from another tab"))
+    await db_session.commit()
+
+    resp = await client.get("/chat/messages")
+    assert resp.status_code == 200
+    assert "from another tab" in resp.text
+
+
+@pytest.mark.asyncio
+async def test_chat_messages_pages_older_history(client, db_session):
+    db_session.add_all([ChatMessage(role="user", content=f"msg {i}") for i in range(5)])
+    await db_session.commit()
+
+    resp = await client.get("/chat/messages", params={"limit": 2, "format": "json"})
+    body = resp.json()
+    assert [m["content"] for m in body["messages"]] == ["msg 3", "msg 4"] and body["has_more"]
+
+    # HTML pages carry the cursor for the page before them
+    resp = await client.get("/chat/messages", params={"limit": 2})
+    assert f'data-before="{body["messages"][0]["id"]}"' in resp.text
+    resp = await client.get("/chat/messages", params={"before": body["messages"][0]["id"], "limit": 3})
+    assert "msg 0" in resp.text and "msg 3" not in resp.text
+    assert "chat-older" not in resp.text
+
+    assert (await client.get("/chat/messages", params={"limit": 0})).status_code == 422
+
+
 # --- Chat clear ---
 
 
 @pytest.mark.asyncio
 async def test_chat_clear_returns_empty(client, db_session):
-    """clear_chat should wipe messages and return empty — no assistant reply persisted."""
+    """clear_chat should empty the history and return empty — no assistant reply persisted."""
     # Seed a message so there's something to clear
     db_session.add(ChatMessage(role="user", content="hi"))
     await db_session.commit()
@@ -158,9 +190,11 @@ async def test_chat_clear_returns_empty(client, db_session):
 
     assert resp.status_code == 200
 
+    assert await read_models.messages(db_session) == []  # a new, empty conversation
+
+    # The old conversation stays behind for its usage accounting, without an assistant msg
     result = await db_session.execute(select(ChatMessage))
-    messages = result.scalars().all()
-    assert len(messages) == 0  # everything wiped, no assistant msg saved
+    assert [m.role for m in result.scalars().all()] == ["user", "user"]
 
 
 # --- Delete pins via chat ---
@@ -178,7 +212,7 @@ async def test_chat_delete_pins_all(client, db_session):
 
     assert resp.status_code == 200
 
-    result = await db_session.execute(select(Pin))
+    result = await db_session.execute(select(Pin).where(Pin.deleted_at.is_(None)))
     assert len(result.scalars().all()) == 0
 
 
@@ -194,7 +228,7 @@ async def test_chat_delete_pins_drafts_only(client, db_session):
 
     assert resp.status_code == 200
 
-    result = await db_session.execute(select(Pin))
+    result = await db_session.execute(select(Pin).where(Pin.deleted_at.is_(None)))
     pins = result.scalars().all()
     assert len(pins) == 1
     assert pins[0].status == PinStatus.confirmed
@@ -212,7 +246,7 @@ async def test_chat_delete_pins_named(client, db_session):
 
     assert resp.status_code == 200
 
-    result = await db_session.execute(select(Pin))
+    result = await db_session.execute(select(Pin).where(Pin.deleted_at.is_(None)))
     pins = result.scalars().all()
     assert len(pins) == 1
     assert pins[0].name == "Bakery B"
@@ -222,7 +256,7 @@ async def test_chat_delete_pins_named(client, db_session):
 
 
 @pytest.mark.asyncio
-async def test_chat_place_pin_creates_draft(client, db_session):
+async def test_chat_place_pin_creates_draft(client, db_session, run_jobs):
     mock = _llm_result(
         content="Placing it!",
         place_pin={"address": "Av Paulista 1000", "category": "restaurant", "name": "Burger Place", "confidence": 0.9},
@@ -231,9 +265,10 @@ async def test_chat_place_pin_creates_draft(client, db_session):
 
     with (
         patch("app.routes.chat.get_assistant_response", return_value=mock),
-        patch("app.routes.chat.geocode", return_value=geo_result),
+        patch("app.services.pin_tasks.geocode", return_value=geo_result),
     ):
         resp = await client.post("/chat/send", data={"message": "add burger place on paulista"})
+        await run_jobs()
 
     assert resp.status_code == 200
 
@@ -246,7 +281,7 @@ async def test_chat_place_pin_creates_draft(client, db_session):
 
 
 @pytest.mark.asyncio
-async def test_chat_place_pin_geocode_fails_requests_click(client, db_session):
+async def test_chat_place_pin_geocode_fails_requests_click(client, db_session, run_jobs):
     mock = _llm_result(
         content="Let me find that.",
         place_pin={"address": "unknown place xyz", "category": "other", "name": None, "confidence": None},
@@ -254,19 +289,23 @@ async def test_chat_place_pin_geocode_fails_requests_click(client, db_session):
 
     with (
         patch("app.routes.chat.get_assistant_response", return_value=mock),
-        patch("app.routes.chat.geocode", return_value=None),
+        patch("app.services.pin_tasks.geocode", return_value=None),
     ):
         resp = await client.post("/chat/send", data={"message": "add pin at unknown place xyz"})
+        await run_jobs()
 
     assert resp.status_code == 200
-    assert "couldn't find" in resp.text.lower() or "click on the map" in resp.text.lower()
+    job_id = resp.text.split('hx-get="/jobs/')[1].split('"')[0]
+    job_resp = await client.get(f"/jobs/{job_id}")
+    assert "click on the map" in job_resp.text.lower()
+    assert "data-request-click" in job_resp.text
 
     result = await db_session.execute(select(Pin))
     assert len(result.scalars().all()) == 0
 
 
 @pytest.mark.asyncio
-async def test_chat_place_pin_duplicate_skipped(client, db_session):
+async def test_chat_place_pin_duplicate_skipped(client, db_session, run_jobs):
     """If a pin already exists at the geocoded location, no duplicate is created."""
     db_session.add(Pin(lat=-23.56, lng=-46.65, name="Existing", category="cafe", status=PinStatus.confirmed))
     await db_session.commit()
@@ -279,12 +318,14 @@ async def test_chat_place_pin_duplicate_skipped(client, db_session):
 
     with (
         patch("app.routes.chat.get_assistant_response", return_value=mock),
-        patch("app.routes.chat.geocode", return_value=geo_result),
+        patch("app.services.pin_tasks.geocode", return_value=geo_result),
     ):
         resp = await client.post("/chat/send", data={"message": "add place on paulista"})
+        await run_jobs()
 
     assert resp.status_code == 200
-    assert "already exists" in resp.text.lower()
+    messages = (await db_session.execute(select(ChatMessage).where(ChatMessage.role == "assistant"))).scalars().all()
+    assert any("already exists" in m.content.lower() for m in messages)
 
     result = await db_session.execute(select(Pin))
     assert len(result.scalars().all()) == 1  # no duplicate
@@ -388,11 +429,12 @@ async def test_chat_move_map_center(client, db_session):
 
 
 @pytest.mark.asyncio
-async def test_map_click_no_classification(client, db_session):
+async def test_map_click_no_classification(client, db_session, run_jobs):
     """Map click with no classification from LLM still creates a draft pin."""
     mock = _llm_result(content="I'm not sure what's here.")
-    with patch("app.routes.map.get_assistant_response", return_value=mock):
+    with patch("app.services.pin_tasks.get_assistant_response", return_value=mock):
         resp = await client.post("/map/click", data={"lat": "10.0", "lng": "20.0"})
+        await run_jobs()
 
     assert resp.status_code == 200
 
@@ -404,6 +446,44 @@ async def test_map_click_no_classification(client, db_session):
     assert pins[0].name is None
 
 
+# --- Background jobs ---
+
+
+@pytest.mark.asyncio
+async def test_chat_place_pin_returns_before_geocoding(client, db_session, run_jobs):
+    """The chat reply is returned with a job poller; the draft pin follows later."""
+    mock = _llm_result(
+        content="Placing it!",
+        place_pin={"address": "Av Paulista 1000", "category": "cafe", "name": "Cafe", "confidence": 0.7},
+    )
+    geo_result = {"lat": -23.56, "lng": -46.65, "formatted_address": "Av. Paulista, 1000"}
+
+    with (
+        patch("app.routes.chat.get_assistant_response", return_value=mock),
+        patch("app.services.pin_tasks.geocode", return_value=geo_result),
+    ):
+        resp = await client.post("/chat/send", data={"message": "add a cafe on paulista"})
+        assert 'hx-get="/jobs/' in resp.text
+        await run_jobs()
+
+    job_id = resp.text.split('hx-get="/jobs/')[1].split('"')[0]
+    job_resp = await client.get(f"/jobs/{job_id}")
+    assert job_resp.status_code == 200
+    assert "Found at" in job_resp.text
+    assert "pin-confirm" in job_resp.text
+    assert 'hx-get="/jobs/' not in job_resp.text  # polling stops once done
+
+
+@pytest.mark.asyncio
+async def test_job_status_pending_returns_204(client, db_session):
+    job = Job(kind="place_pin", payload={"address": "x"}, status=JobStatus.pending)
+    db_session.add(job)
+    await db_session.commit()
+
+    resp = await client.get(f"/jobs/{job.id}")
+    assert resp.status_code == 204
+
+
 # --- Chat message persistence ---
 
 
@@ -431,3 +511,17 @@ async def test_chat_send_request_click_flag(client, db_session):
 
     assert resp.status_code == 200
     assert "data-request-click" in resp.text
+
+
+async def test_send_runs_the_llm_off_the_event_loop(client):
+    loop_thread = threading.get_ident()
+    threads = []
+
+    def _respond(*args, **kwargs):
+        threads.append(threading.get_ident())
+        return _llm_result(content="Hi")
+
+    with patch("app.routes.chat.get_assistant_response", side_effect=_respond):
+        resp = await client.post("/chat/send", data={"message": "hello"})
+    assert resp.status_code == 200
+    assert threads and threads[0] != loop_thread
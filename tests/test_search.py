@@ -0,0 +1,116 @@
+from __future__ import annotations
+
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy import select
+
+from app.models import Pin, PinStatus
+from app.services.read_models import PinRow
+from app.services.search import resolve_pin_names, search_pins, similarity
+
+
+@pytest.fixture
+async def pins(db_session):
+    rows = [
+        Pin(lat=1.0, lng=1.0, name="Padaria Real", category="bakery", status=PinStatus.confirmed),
+        Pin(lat=2.0, lng=2.0, name="Padaria Sul", category="bakery", status=PinStatus.draft),
+        Pin(lat=3.0, lng=3.0, name="Drogaria São Paulo", category="pharmacy", status=PinStatus.confirmed),
+        Pin(lat=4.0, lng=4.0, name="Clínica 100%", category="health_clinic", status=PinStatus.draft),
+        Pin(lat=5.0, lng=5.0, name=None, category="bakery", status=PinStatus.draft),
+    ]
+    db_session.add_all(rows)
+    await db_session.commit()
+    return rows
+
+
+def names(found):
+    return [p.name for p in found]
+
+
+@pytest.mark.asyncio
+async def test_substring_search_ranks_name_prefix_first(db_session, pins):
+    assert names(await search_pins(db_session, "aria")) == ["Padaria Sul", "Padaria Real", "Drogaria São Paulo"]
+    assert names(await search_pins(db_session, "padaria r")) == ["Padaria Real"]
+
+
+@pytest.mark.asyncio
+async def test_search_matches_category(db_session, pins):
+    found = await search_pins(db_session, "bakery")
+    assert {p.id for p in found} == {pins[0].id, pins[1].id, pins[4].id}
+    assert (await search_pins(db_session, "clinic"))[0].id == pins[3].id
+
+
+@pytest.mark.asyncio
+async def test_search_returns_plain_rows(db_session, pins):
+    db_session.expunge_all()
+    found = await search_pins(db_session, "padaria")
+    assert [type(p) for p in found] == [PinRow] * 2
+    assert found[0].status == "draft"
+    # Nothing was loaded into the session
+    assert not db_session.identity_map
+
+
+@pytest.mark.asyncio
+async def test_short_queries_match_name_prefix(db_session, pins):
+    assert names(await search_pins(db_session, "dr")) == ["Drogaria São Paulo"]
+    assert await search_pins(db_session, "%") == []  # wildcards are literal
+
+
+@pytest.mark.asyncio
+async def test_fuzzy_fallback_tolerates_typos(db_session, pins):
+    assert names(await search_pins(db_session, "Drogaria Sao Paulo")) == ["Drogaria São Paulo"]
+    assert await search_pins(db_session, "xyzzy") == []
+
+
+@pytest.mark.asyncio
+async def test_index_follows_updates_and_deletes(db_session, pins):
+    pins[0].name = "Mercado Central"
+    await db_session.delete(pins[1])
+    await db_session.commit()
+
+    assert names(await search_pins(db_session, "central")) == ["Mercado Central"]
+    assert names(await search_pins(db_session, "padaria")) == []
+
+
+@pytest.mark.asyncio
+async def test_resolve_pin_names(db_session, pins):
+    extra = Pin(lat=6.0, lng=6.0, name="padaria real", category="bakery", status=PinStatus.draft)
+    db_session.add(extra)
+    await db_session.commit()
+
+    # Exact (case-insensitive) matches select every pin with that name
+    assert sorted(await resolve_pin_names(db_session, ["Padaria Real"])) == sorted([pins[0].id, extra.id])
+    # Partial and misspelt names select one best match
+    assert await resolve_pin_names(db_session, ["Padaria S"]) == [pins[1].id]
+    assert await resolve_pin_names(db_session, ["Drogaria Sao Paulo"]) == [pins[2].id]
+    # Category words and unknown names select nothing
+    assert await resolve_pin_names(db_session, ["bakery", "Nowhere", ""]) == []
+
+
+def test_similarity():
+    assert similarity("padaria", "padaria") == 1.0
+    assert similarity("padaria", "Padaria Real") > 0.4
+    assert similarity("ab", "abc") == 0.0
+
+
+@pytest.mark.asyncio
+async def test_search_endpoint(client, pins):
+    resp = await client.get("/pins/search", params={"q": "padaria", "limit": 1})
+    assert resp.status_code == 200
+    assert resp.json() == [
+        {"id": pins[1].id, "lat": 2.0, "lng": 2.0, "name": "Padaria Sul", "category": "bakery",
+         "status": "draft", "confidence": None},
+    ]
+    assert (await client.get("/pins/search", params={"q": ""})).status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_chat_delete_named_uses_resolver(client, db_session, pins):
+    result = {"content": "Removed.", "delete_pins": {"which": "named", "names": ["drogaria sao paulo"]}}
+    with patch("app.routes.chat.get_assistant_response", return_value=result):
+        await client.post("/chat/send", data={"message": "delete the drugstore"})
+
+    remaining = (await db_session.execute(select(Pin.name).where(Pin.deleted_at.is_(None)))).scalars().all()
+    assert "Drogaria São Paulo" not in remaining
+    assert len(remaining) == 4
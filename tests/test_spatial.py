@@ -0,0 +1,108 @@
+from __future__ import annotations
+
+from unittest.mock import patch
+
+import pytest
+
+from app.models import Pin, PinStatus
+from app.services.spatial import bounding_box, describe_nearby, haversine_m, nearby_pins
+
+# Around Av. Paulista, São Paulo
+ORIGIN = (-23.5614, -46.6559)
+
+
+@pytest.fixture
+async def pins(db_session):
+    rows = [
+        Pin(lat=-23.5614, lng=-46.6549, name="Drogaria A", category="pharmacy", status=PinStatus.confirmed),  # ~100 m
+        Pin(lat=-23.5650, lng=-46.6559, name="Padaria B", category="bakery", status=PinStatus.confirmed),  # ~400 m
+        Pin(lat=-23.5614, lng=-46.6459, name="Drogaria C", category="pharmacy", status=PinStatus.draft),  # ~1 km
+        Pin(lat=-22.9068, lng=-43.1729, name="Rio Pharmacy", category="pharmacy", status=PinStatus.draft),  # ~360 km
+    ]
+    db_session.add_all(rows)
+    await db_session.commit()
+    return rows
+
+
+def test_haversine():
+    # São Paulo to Rio de Janeiro is ~360 km
+    assert 355_000 < haversine_m(*ORIGIN, -22.9068, -43.1729) < 365_000
+    assert haversine_m(*ORIGIN, *ORIGIN) == 0
+
+
+def test_bounding_box_contains_circle_and_handles_edges():
+    south, north, west, east = bounding_box(*ORIGIN, 1000)
+    assert south < ORIGIN[0] < north and west < ORIGIN[1] < east
+    assert haversine_m(*ORIGIN, north, ORIGIN[1]) == pytest.approx(1000, rel=1e-3)
+    # Near the antimeridian or a pole the whole longitude range is searched
+    assert bounding_box(0.0, 179.9999, 1000)[2:] == (-180.0, 180.0)
+    assert bounding_box(89.999, 0.0, 1000)[2:] == (-180.0, 180.0)
+
+
+@pytest.mark.asyncio
+async def test_radius_query_nearest_first(db_session, pins):
+    found = await nearby_pins(db_session, *ORIGIN, radius_m=500)
+    assert [p.name for p, _ in found] == ["Drogaria A", "Padaria B"]
+    assert 90 < found[0][1] < 110
+
+
+@pytest.mark.asyncio
+async def test_k_nearest_widens_until_found(db_session, pins):
+    found = await nearby_pins(db_session, *ORIGIN, k=3, category="pharmacy")
+    assert [p.name for p, _ in found] == ["Drogaria A", "Drogaria C", "Rio Pharmacy"]
+    assert len(await nearby_pins(db_session, *ORIGIN, k=10)) == 4
+
+
+@pytest.mark.asyncio
+async def test_index_follows_moves_and_deletes(db_session, pins):
+    pins[3].lat, pins[3].lng = -23.5615, -46.6559  # move Rio Pharmacy next door
+    await db_session.delete(pins[0])
+    await db_session.commit()
+
+    found = await nearby_pins(db_session, *ORIGIN, radius_m=200)
+    assert [p.name for p, _ in found] == ["Rio Pharmacy"]
+
+
+def test_describe_nearby():
+    pin = Pin(name=None, category="health_clinic")
+    assert describe_nearby([(pin, 1234.0)]) == "- unnamed (health clinic), 1.2 km"
+    assert describe_nearby([]) == "No matching pins found nearby."
+
+
+@pytest.mark.asyncio
+async def test_nearby_endpoint(client, pins):
+    resp = await client.get("/pins/nearby", params={"lat": ORIGIN[0], "lng": ORIGIN[1], "k": 2, "category": "pharmacy"})
+    assert resp.status_code == 200
+    body = resp.json()
+    assert [p["name"] for p in body] == ["Drogaria A", "Drogaria C"]
+    assert body[0]["distance_m"] == pytest.approx(102, abs=2)
+
+    assert (await client.get("/pins/nearby", params={"lat": 91, "lng": 0})).status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_chat_nearby_action_appends_results(client, db_session, pins):
+    result = {
+        "content": "Here's what's close by:",
+        "nearby": {"lat": ORIGIN[0], "lng": ORIGIN[1], "radius": 500, "k": 5, "category": None, "address": None},
+    }
+    with patch("app.routes.chat.get_assistant_response", return_value=result):
+        resp = await client.post("/chat/send", data={"message": "what's within 500 m of MASP?"})
+
+    assert "Drogaria A (pharmacy), 102 m" in resp.text
+    assert "Padaria B" in resp.text
+    assert "Drogaria C" not in resp.text
+
+
+@pytest.mark.asyncio
+async def test_chat_nearby_action_geocodes_address(client, pins):
+    result = {"content": "Closest pharmacy:", "nearby": {"address": "MASP", "k": 1, "category": "pharmacy"}}
+    geo = {"lat": ORIGIN[0], "lng": ORIGIN[1], "formatted_address": "MASP"}
+    with (
+        patch("app.routes.chat.get_assistant_response", return_value=result),
+        patch("app.routes.chat.geocode", return_value=geo),
+    ):
+        resp = await client.post("/chat/send", data={"message": "nearest pharmacy to MASP?"})
+
+    assert "Drogaria A" in resp.text
+    assert "Drogaria C" not in resp.text
@@ -0,0 +1,49 @@
+from __future__ import annotations
+
+from datetime import datetime
+
+from jinja2 import FileSystemBytecodeCache
+
+from app.core import config
+from app.core.templates import FragmentCache, fragments, render_messages, templates
+from app.services import metrics
+from app.services.read_models import MessageRow, PinRow
+
+
+def message(msg_id: int, content: str, role: str = "user") -> MessageRow:
+    return MessageRow(msg_id, role, content, datetime(2024, 1, 1))
+
+
+def test_messages_render_once_per_id_and_content():
+    fragments.clear()
+    msgs = [message(1, "a <b>\nb"), message(2, "hi", "assistant")]
+    first = render_messages(msgs)
+    assert '<span class="chat-text">a &lt;b&gt;<br>\nb</span>' in first
+    assert 'chat-msg--assistant' in first
+
+    hits = metrics.FRAGMENTS.value(outcome="hit")
+    assert render_messages(msgs) == first
+    assert metrics.FRAGMENTS.value(outcome="hit") == hits + 2
+
+    # An id reused after the chat was cleared renders its new content
+    assert "again" in render_messages([message(1, "again")])
+
+
+def test_fragment_cache_is_bounded():
+    cache = FragmentCache(maxsize=2)
+    for i in range(3):
+        cache.put((i,), f"<p>{i}</p>")
+    assert cache.get((0,)) is None and len(cache) == 2
+    FragmentCache(maxsize=0).put((1,), "x")
+
+
+def test_confirm_form_lists_every_category():
+    pin = PinRow(1, 1.0, 2.0, None, "health_clinic", "draft", None)
+    html = templates.get_template("partials/pin_confirm.html").render(draft_pin=pin)
+    assert html.count("<option") == len(config.PIN_CATEGORIES)
+    assert '<option value="health_clinic" selected>Health Clinic</option>' in html
+
+
+def test_bytecode_cache_is_on_when_configured():
+    assert config.TEMPLATE_CACHE_DIR
+    assert isinstance(templates.env.bytecode_cache, FileSystemBytecodeCache)